@@ -309,20 +309,42 @@ def hosta_analyze(frame=None, function_pointer=None) -> AnalyzedFunction:
     )
 
 
+# Snippets of encode_function_parameter_values: the only ones depending on the call, not on the signature
+CALL_VALUE_KEYS = frozenset(("variables_initialization", "function_call_arguments"))
+
 def encode_function(analyse: AnalyzedFunction, model_capability=set([ModelCapabilities.TEXT2TEXT])):
     """
     Encode the function signature and docstring into a format suitable for the model.
     """
+    snippets  = encode_function_signature(analyse)
+    snippets |= encode_function_parameter_values(analyse)
+    
+    return snippets
+
+def encode_function_signature(analyse: AnalyzedFunction):
+    """
+    Encode what does not depend on the argument values: documentation, types and names.
+    """
     snippets  = {}
     snippets |= encode_function_documentation(analyse)
     snippets |= encode_function_parameter_types(analyse)
-    snippets |= encode_function_parameter_values(analyse)
     snippets |= encode_function_parameter_names(analyse)
     snippets |= encode_function_return_type(analyse)
     snippets |= encode_function_return_type_definition(analyse)
     
     return snippets
 
+def signature_key(analyse: AnalyzedFunction):
+    """
+    Hashable identity of what encode_function_signature reads, or None if a type is not hashable.
+    """
+    key = (analyse.name, analyse.doc, tuple((a.name, a.type) for a in analyse.args), analyse.type)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
 def encode_function_documentation(analyse: AnalyzedFunction):
         return {
             "function_name" : analyse.name, 
@@ -4,10 +4,24 @@ from typing import Any, Dict, List, Set
 import abc
 import time 
 import asyncio
+import threading
+import weakref
 
 from enum import Enum
 
-from ..core.errors import RateLimitError
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..core.errors import ApiKeyError, RateLimitError, RequestError
+from ..core.rate_limiter import RateLimiter
+from ..core.retry_policy import RetryPolicy, parse_duration, parse_retry_after
+from ..core.single_flight import SingleFlight
+from ..core.micro_batcher import EmbeddingBatcher
+from ..core.cache import CACHE_HIT_KEY, EmbeddingCache, ResponseCache, get_default_embedding_cache, make_cache_key
+from ..core.load_balancer import LoadBalancer, get_current_endpoint, _current_endpoint
+from ..core.hedging import HedgePolicy
+from ..core.circuit_breaker import CircuitBreaker
+from ..core.json_codec import JSON_CONTENT_TYPE, get_json_codec
 
 from  concurrent.futures import ThreadPoolExecutor
 
@@ -22,23 +36,61 @@ class ModelCapabilities(Enum):
     JSON_OUTPUT = "JSON_OUTPUT"  # API supports native JSON mode
     STREAMING = "STREAMING"      # API supports token-by-token streaming
 
+# Per-call options read by the model or the pipeline from force_llm_args. They are never sent to the API.
+CALL_OPTIONS = ("retry_policy", "response_cache", "routing_policy")
+
 class Model:
     def __init__(self,
                 max_async_calls = 7,
                 additionnal_headers: Dict[str, Any] = {},
                 api_parameters:Dict[str, Any] = {},
-                retry_delay:int = 60
+                retry_delay:int = 60,
+                http_pool_maxsize:int|None = None,
+                http_pool_connections:int = 4,
+                max_concurrent_async_requests:int = 256,
+                rate_limiter:RateLimiter|None = None,
+                retry_policy:RetryPolicy|None = None,
+                response_cache:ResponseCache|None = None,
+                embedding_cache:EmbeddingCache|None = None,
+                embedding_batch_size:int = 512,
+                embedding_batch_tokens:int = 200_000,
+                single_flight:SingleFlight|None = None,
+                embedding_batcher:EmbeddingBatcher|None = None,
+                load_balancer:LoadBalancer|None = None,
+                hedge_policy:HedgePolicy|None = None,
+                circuit_breaker:CircuitBreaker|None = None,
                 ):
+        """
+        Options shared by every model. Adapters only declare their own arguments and pass the
+        others on (`**kwargs`), so that a new option is only added here.
+        """
         self.capabilities: Set[ModelCapabilities] = set()
         
         self.max_async_calls = max_async_calls
         self.async_executor = None
+
+        # Models with a native asyncio transport are not bound to the thread pool:
+        # in-flight requests on each event loop are only limited by this semaphore.
+        self.max_concurrent_async_requests = max_concurrent_async_requests
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+        # Keep-alive HTTP connection pool, shared by every thread using this model.
+        # Defaults to one connection per possible concurrent call.
+        self.http_pool_maxsize = http_pool_maxsize
+        # Number of hosts (base_url, image servers...) whose connections are kept
+        self.http_pool_connections = http_pool_connections
+        self._http_session: requests.Session|None = None
+        self._http_session_lock = threading.Lock()
         
         self.additionnal_headers = additionnal_headers
         self.api_parameters = api_parameters
         
         self.preferred_image_format = "png"
+        # Optional ImageEncoder (format, quality, max edge, detail) of the images sent to this model
+        self.image_encoder = None
         self.embedding_similarity_min = 0.30  # Default min similarity for clustering
+        # Tokens of prompt and answer accepted by the model, used to size packed calls (see execute_packed)
+        self.context_window:int = 8192
         
         self.model_name:str = "undefined"
         self.base_url:str = "undefined"
@@ -46,30 +98,384 @@ class Model:
         # Rate limiting
         self.retry_delay = retry_delay
         self.delay_next_api_call_until = 0
+        # Optional proactive RPM/TPM budgets, e.g. RateLimiter(requests_per_minute=500)
+        self.rate_limiter: RateLimiter|None = rate_limiter
+        # Retries of failed calls. None derives a policy from retry_delay (see get_retry_policy)
+        self.retry_policy: RetryPolicy|None = retry_policy
+        self._default_retry_policy: RetryPolicy|None = None
+        self._default_retry_policy_delay = None
+
+        # Optional cache of deterministic responses, e.g. ResponseCache(DiskCache("responses.sqlite"))
+        self.response_cache: ResponseCache|None = response_cache
+        # Embeddings cache. None uses the process-wide one, see set_default_embedding_cache()
+        self.embedding_cache: EmbeddingCache|None = embedding_cache
+        # Optional de-duplication of identical calls in flight, e.g. SingleFlight()
+        self.single_flight: SingleFlight|None = single_flight
+        # Optional grouping of small concurrent embed() calls, e.g. EmbeddingBatcher(max_wait=0.005)
+        self.embedding_batcher: EmbeddingBatcher|None = embedding_batcher
+        # Large embed() inputs are split in chunks of at most this many texts and
+        # (estimated) tokens, sent in parallel on up to max_async_calls threads.
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_batch_tokens = embedding_batch_tokens
+        # Optional spreading of the calls over several replicas, e.g. LoadBalancer([url1, url2])
+        self.load_balancer: LoadBalancer|None = load_balancer
+        # Optional second request racing slow generate calls, e.g. HedgePolicy(budget=0.05)
+        self.hedge_policy: HedgePolicy|None = hedge_policy
+        # Optional fail-fast of a failing provider, e.g. CircuitBreaker(cooldown=30). See is_available()
+        self.circuit_breaker: CircuitBreaker|None = circuit_breaker
 
     def get_executor(self):
         if self.async_executor is None:
             self.async_executor = ThreadPoolExecutor(max_workers=self.max_async_calls)
         return self.async_executor
 
-    def __exit__(self):
+    def get_http_session(self) -> requests.Session:
+        """
+        Return the keep-alive HTTP session used for every API call of this model.
+
+        The session is created on first use. Its connection pool holds
+        `http_pool_maxsize` connections per host (`max_async_calls` if not set)
+        for `http_pool_connections` hosts, so that concurrent calls reuse TCP/TLS
+        connections instead of opening a new one each time.
+        """
+        if self._http_session is None:
+            with self._http_session_lock:
+                if self._http_session is None:
+                    pool_maxsize = self.http_pool_maxsize or self.max_async_calls
+                    pool_connections = self.http_pool_connections
+                    if self.load_balancer is not None:
+                        # Keep the connections of every replica
+                        pool_connections = max(pool_connections, len(self.load_balancer.endpoints) + 1)
+                    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._http_session = session
+        return self._http_session
+
+    def _post_json(self, url: str, body: Any, headers: Dict[str, str]|None = None, **kwargs) -> requests.Response:
+        """POST `body` encoded by the JSON codec (see `core.json_codec`) on the HTTP session."""
+        headers = dict(headers or {})
+        if not any(key.lower() == "content-type" for key in headers):
+            headers["Content-Type"] = JSON_CONTENT_TYPE
+        return self.get_http_session().post(url, headers=headers, data=get_json_codec().dumps(body),
+                                            timeout=self.timeout, **kwargs)
+
+    @staticmethod
+    def _json_response(response) -> Any:
+        """Body of a JSON response, decoded by the JSON codec."""
+        return get_json_codec().loads(response.content)
+
+    def http_pool_stats(self) -> Dict[str, int]:
+        """
+        Connection pool counters of the HTTP session.
+
+        Returns:
+            dict: `requests` sent, `misses` (new connections opened) and `hits` (requests sent on a reused connection).
+        """
+        nb_requests, nb_connections = 0, 0
+        if self._http_session is not None:
+            for adapter in set(self._http_session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        nb_requests += pool.num_requests
+                        nb_connections += pool.num_connections
+        return {
+            "requests": nb_requests,
+            "hits": max(nb_requests - nb_connections, 0),
+            "misses": nb_connections,
+        }
+
+    def close(self):
+        """Release the HTTP connections and the thread pool of this model."""
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
         if self.async_executor is not None:
             self.async_executor.shutdown()
-    
+            self.async_executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_async_semaphore(self) -> asyncio.Semaphore:
+        """Semaphore bounding in-flight native async requests on the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrent_async_requests)
+            self._async_semaphores[loop] = semaphore
+        return semaphore
+
+    def supports_native_async(self) -> bool:
+        """
+        True when the model implements `_generate_async_without_retry` and
+        `_generate_stream_async_without_retry` without blocking the event loop.
+
+        Otherwise async calls are run on the thread pool (`max_async_calls` threads).
+        """
+        return False
+
+    def _raise_for_status(self, response, where: str):
+        """Raise the OpenHosta error matching a failed HTTP response (requests or httpx)."""
+        self._handle_rate_limit_headers(response)
+        status_code = response.status_code
+        if 200 <= status_code < 300:
+            return
+        retry_after = parse_retry_after(response.headers)
+        if status_code == 429:
+            raise RateLimitError(f"[{where}] Rate limit exceeded. {response.text}", status_code=status_code, retry_after=retry_after)
+        if status_code == 401:
+            raise ApiKeyError(f"[{where}] Unauthorized. {response.text}", status_code=status_code)
+        raise RequestError(f"[{where}] Request failed ({status_code}):\n{response.text}", status_code=status_code, retry_after=retry_after)
+
+    def _handle_rate_limit_headers(self, response):
+        """Delay every following call of this model when the API says its quota is exhausted."""
+        headers = response.headers
+        exhausted = response.status_code == 429 or \
+            str(headers.get("x-ratelimit-remaining-requests", "")).strip() == "0"
+        if not exhausted:
+            return
+        retry_after = parse_retry_after(headers)
+        endpoint = get_current_endpoint()
+        if retry_after is not None and self.load_balancer is not None and endpoint is not None:
+            # Only this replica is out of quota: the others keep serving
+            self.load_balancer.eject(endpoint, retry_after)
+        elif retry_after is not None:
+            # Do not stall every caller longer than the policy would let one call wait
+            self.set_next_rate_limit(str(min(retry_after, self.get_retry_policy().max_delay)))
+
     def set_next_rate_limit(self, next_authorized_api_call_time:str):
-        if next_authorized_api_call_time.isdigit():
-            next_authorized_api_call_time = int(next_authorized_api_call_time)
-        elif next_authorized_api_call_time.endswith("s") and next_authorized_api_call_time[:-1].isdigit():
-            next_authorized_api_call_time = int(next_authorized_api_call_time[:-1])
-        elif next_authorized_api_call_time.endswith("ms"):
-            next_authorized_api_call_time = int(next_authorized_api_call_time[:-2]) / 1000
-        else:
-            print(f"Invalid next_authorized_api_call_time: {next_authorized_api_call_time}. Seto to 0")
-            next_authorized_api_call_time = 0
+        delay = parse_duration(next_authorized_api_call_time)
+        if delay is None:
+            print(f"Invalid next_authorized_api_call_time: {next_authorized_api_call_time}. Set to 0")
+            delay = 0
             
-        if next_authorized_api_call_time > 1:
-            print(f"Set some delay before new API call. Waiting for {next_authorized_api_call_time}")
-        self.delay_next_api_call_until = next_authorized_api_call_time + time.time()
+        if delay > 1:
+            print(f"Set some delay before new API call. Waiting for {delay}")
+        self.delay_next_api_call_until = max(self.delay_next_api_call_until, delay + time.time())
+
+    def is_available(self) -> bool:
+        """False while the circuit breaker of the model is open: calls would fail at once."""
+        return self.circuit_breaker is None or self.circuit_breaker.is_available()
+
+    def _get_circuit_breaker(self) -> CircuitBreaker|None:
+        breaker = self.circuit_breaker
+        if breaker is not None and breaker.name is None:
+            breaker.name = self.model_name
+        return breaker
+
+    def _call_with_circuit_breaker(self, call):
+        """Run `call` (all its attempts) if the circuit breaker lets it through, and record its outcome."""
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            return call()
+        breaker.before_call()
+        start = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        except BaseException:
+            breaker.record_cancel()
+            raise
+        breaker.record_success(time.perf_counter() - start)
+        return result
+
+    async def _call_with_circuit_breaker_async(self, call):
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            return await call()
+        breaker.before_call()
+        start = time.perf_counter()
+        try:
+            result = await call()
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        except BaseException:
+            breaker.record_cancel()
+            raise
+        breaker.record_success(time.perf_counter() - start)
+        return result
+
+    def _stream_with_circuit_breaker(self, start_stream):
+        """Streaming version of `_call_with_circuit_breaker`. The outcome is known at the first chunk."""
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            yield from start_stream()
+            return
+        breaker.before_call()
+        start = time.perf_counter()
+        recorded = False
+        try:
+            for chunk in start_stream():
+                if not recorded:
+                    recorded = True
+                    breaker.record_success(time.perf_counter() - start)
+                yield chunk
+            if not recorded:
+                recorded = True
+                breaker.record_success(time.perf_counter() - start)
+        except Exception as e:
+            if not recorded:
+                recorded = True
+                breaker.record_failure(e)
+            raise
+        finally:
+            if not recorded:
+                # Closed before its first chunk
+                breaker.record_cancel()
+
+    async def _stream_with_circuit_breaker_async(self, start_stream):
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            async for chunk in start_stream():
+                yield chunk
+            return
+        breaker.before_call()
+        start = time.perf_counter()
+        recorded = False
+        try:
+            async for chunk in start_stream():
+                if not recorded:
+                    recorded = True
+                    breaker.record_success(time.perf_counter() - start)
+                yield chunk
+            if not recorded:
+                recorded = True
+                breaker.record_success(time.perf_counter() - start)
+        except Exception as e:
+            if not recorded:
+                recorded = True
+                breaker.record_failure(e)
+            raise
+        finally:
+            if not recorded:
+                breaker.record_cancel()
+
+    def get_base_url(self) -> str:
+        """Base URL of the request being sent: `base_url` on the endpoint picked by the load balancer, if any."""
+        endpoint = get_current_endpoint()
+        if self.load_balancer is None or endpoint is None:
+            return self.base_url
+        return endpoint.resolve(self.base_url)
+
+    def _balanced(self, func):
+        """Wrap one attempt of `func` so that it is sent to an endpoint of the load balancer."""
+        if self.load_balancer is None:
+            return func
+
+        def call(*args, **kwargs):
+            endpoint = self.load_balancer.acquire()
+            token = _current_endpoint.set(endpoint)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.load_balancer.release(endpoint, error=e)
+                raise
+            except BaseException:
+                # Cancelled
+                self.load_balancer.release(endpoint)
+                raise
+            finally:
+                _current_endpoint.reset(token)
+            self.load_balancer.release(endpoint, latency=time.perf_counter() - start)
+            return result
+        return call
+
+    def _balanced_async(self, func):
+        if self.load_balancer is None:
+            return func
+
+        async def call(*args, **kwargs):
+            endpoint = self.load_balancer.acquire()
+            token = _current_endpoint.set(endpoint)
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                self.load_balancer.release(endpoint, error=e)
+                raise
+            except BaseException:
+                # Cancelled
+                self.load_balancer.release(endpoint)
+                raise
+            finally:
+                _current_endpoint.reset(token)
+            self.load_balancer.release(endpoint, latency=time.perf_counter() - start)
+            return result
+        return call
+
+    def _balanced_stream(self, func):
+        """
+        Streaming version of `_balanced`. The request stays in flight until the stream ends;
+        its latency is the time to the first chunk.
+        """
+        if self.load_balancer is None:
+            return func
+
+        def stream(*args, **kwargs):
+            endpoint = self.load_balancer.acquire()
+            start = time.perf_counter()
+            latency, error = None, None
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    # Only set while the generator runs: the caller code between chunks is not part of the request
+                    token = _current_endpoint.set(endpoint)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current_endpoint.reset(token)
+                    if latency is None:
+                        latency = time.perf_counter() - start
+                    yield item
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                gen.close()
+                self.load_balancer.release(endpoint, latency=latency, error=error)
+        return stream
+
+    def _balanced_stream_async(self, func):
+        if self.load_balancer is None:
+            return func
+
+        async def stream(*args, **kwargs):
+            endpoint = self.load_balancer.acquire()
+            start = time.perf_counter()
+            latency, error = None, None
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _current_endpoint.set(endpoint)
+                    try:
+                        item = await gen.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current_endpoint.reset(token)
+                    if latency is None:
+                        latency = time.perf_counter() - start
+                    yield item
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                await gen.aclose()
+                self.load_balancer.release(endpoint, latency=latency, error=error)
+        return stream
     
     async def generate_async(
         self,
@@ -77,11 +483,39 @@ class Model:
         **kwargs
     ) -> Dict:
         """High-level async text generation."""
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            self.get_executor(),
-            lambda: self.generate(messages, **kwargs)
-        )
+        if not self.supports_native_async():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.get_executor(),
+                lambda: self.generate(messages, **kwargs)
+            )
+
+        options = self._pop_call_options(kwargs)
+        cache_key = self._response_cache_key(messages, kwargs, options.get("response_cache"))
+        response = self._cached_response(cache_key)
+        if response is not None:
+            return response
+
+        async def send():
+            async with self.get_async_semaphore():
+                return await self._retry_wrapper_async(self._balanced_async(self._generate_async_without_retry), messages,
+                                                       retry_policy=options.get("retry_policy"), **kwargs)
+
+        async def hedged():
+            alternate = self.hedge_policy.alternate
+            hedge = send if alternate is None else lambda: alternate.generate_async(
+                messages, retry_policy=options.get("retry_policy"), **kwargs)
+            return await self.hedge_policy.run_async(send, hedge)
+
+        async def call():
+            response = await self._call_with_circuit_breaker_async(send if self.hedge_policy is None else hedged)
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response)
+            return response
+
+        if self.single_flight is None:
+            return await call()
+        return await self.single_flight.do_async(self._request_key(messages, kwargs), call)
 
     def generate_stream(
         self,
@@ -89,39 +523,135 @@ class Model:
         **kwargs
     ):
         """High-level token streaming with retry logic."""
-        return self._retry_wrapper_stream(self._generate_stream_without_retry, messages, **kwargs)
+        options = self._pop_call_options(kwargs)
+        cache_key = self._response_cache_key(messages, kwargs, options.get("response_cache"), kind="stream")
+        start_stream = lambda: self._stream_with_circuit_breaker(
+            lambda: self._retry_wrapper_stream(self._balanced_stream(self._generate_stream_without_retry), messages,
+                                               retry_policy=options.get("retry_policy"), **kwargs))
+        if cache_key is None:
+            return start_stream()
+        return self._cached_stream(cache_key, start_stream)
+
+    def _request_key(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any], kind: str = "generate") -> str:
+        """Identity of a call: the model, the messages and the effective API parameters."""
+        params = self.api_parameters | {k: v for k, v in kwargs.items() if k not in CALL_OPTIONS}
+        return make_cache_key(kind, type(self).__name__, self.model_name, self.base_url, messages, params)
+
+    def _response_cache_key(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any], force: bool|None = None,
+                            kind: str = "generate") -> str|None:
+        """Cache key of a call, or None if it is not cached. `force` is the `response_cache` call option."""
+        if self.response_cache is None:
+            return None
+        params = self.api_parameters | {k: v for k, v in kwargs.items() if k not in CALL_OPTIONS}
+        return self.response_cache.lookup_key(self, messages, params, force, kind)
+
+    @staticmethod
+    def _pop_call_options(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Remove the call options (see CALL_OPTIONS) from the call arguments and return them: they are never sent to the API."""
+        return {name: kwargs.pop(name) for name in CALL_OPTIONS if name in kwargs}
+
+    def _cached_response(self, cache_key: str|None) -> Dict|None:
+        if cache_key is None:
+            return None
+        response = self.response_cache.get(cache_key)
+        if isinstance(response, dict):
+            response[CACHE_HIT_KEY] = True
+        return response
+
+    def _cached_stream(self, cache_key: str, start_stream):
+        """Replay a cached stream, or record the chunks of a new one. Incomplete streams are not stored."""
+        chunks = self.response_cache.get(cache_key)
+        if chunks is not None:
+            yield from chunks
+            return
+        chunks = []
+        for chunk in start_stream():
+            chunks.append(chunk)
+            yield chunk
+        self.response_cache.set(cache_key, chunks)
+
+    def _acquire_rate_limit(self, args, kwargs) -> int:
+        """Wait for the rate limiter budgets. Returns the estimated token cost of the call."""
+        if self.rate_limiter is None:
+            return 0
+        estimated_tokens = self.rate_limiter.estimate_tokens(args[0] if args else None, self.api_parameters | kwargs)
+        self.rate_limiter.acquire(estimated_tokens)
+        return estimated_tokens
+
+    async def _acquire_rate_limit_async(self, args, kwargs) -> int:
+        if self.rate_limiter is None:
+            return 0
+        estimated_tokens = self.rate_limiter.estimate_tokens(args[0] if args else None, self.api_parameters | kwargs)
+        await self.rate_limiter.acquire_async(estimated_tokens)
+        return estimated_tokens
+
+    def _record_rate_limit_usage(self, estimated_tokens: int, result):
+        if self.rate_limiter is not None and isinstance(result, dict):
+            self.rate_limiter.record_usage(estimated_tokens, result.get("usage"))
+
+    def _refund_rate_limit(self, estimated_tokens: int):
+        # A failed attempt did not consume its tokens: do not keep the bucket in debt for them
+        if self.rate_limiter is not None:
+            self.rate_limiter.refund(estimated_tokens)
+
+    def _record_streamed_rate_limit_usage(self, estimated_tokens: int, args, streamed_chars: int):
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_streamed_usage(estimated_tokens, args[0] if args else None, streamed_chars)
+
+    def _call_rate_limited(self, func, *args, **kwargs):
+        estimated_tokens = self._acquire_rate_limit(args, kwargs)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._refund_rate_limit(estimated_tokens)
+            raise
+        self._record_rate_limit_usage(estimated_tokens, result)
+        return result
+
+    async def _call_rate_limited_async(self, func, *args, **kwargs):
+        estimated_tokens = await self._acquire_rate_limit_async(args, kwargs)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._refund_rate_limit(estimated_tokens)
+            raise
+        self._record_rate_limit_usage(estimated_tokens, result)
+        return result
 
     def _retry_wrapper_stream(self, func, *args, **kwargs):
-        """Internal helper for rate-limit retries for generators."""
-        import time
-        now = time.time()
-        time_to_wait = self.delay_next_api_call_until - now
-        if time_to_wait > 0:
-            time.sleep(time_to_wait)
+        """
+        Internal helper retrying generators with the retry policy of the call.
 
-        gen = func(*args, **kwargs)
+        A stream is only retried before its first item: once data was yielded to the caller it cannot be replayed.
+        """
+        policy = self._pop_retry_policy(kwargs)
+        attempt, delay = 1, 0.0
+        while True:
+            self._wait_for_api_availability(policy)
+            estimated_tokens = self._acquire_rate_limit(args, kwargs)
+            gen = func(*args, **kwargs)
+            try:
+                first_item = next(gen)
+                break
+            except StopIteration:
+                return
+            except Exception as e:
+                self._refund_rate_limit(estimated_tokens)
+                delay = policy.next_delay(e, attempt, delay)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+        streamed_chars = 0
         try:
-            first_item = next(gen)
-        except StopIteration:
-            return
-        except RateLimitError as e:
-            if self.retry_delay == 0:
-                raise e
-            
-            now = time.time()
-            time_to_wait = self.delay_next_api_call_until - now
-            if time_to_wait <= 0:
-                self.delay_next_api_call_until = now + self.retry_delay
-            
-            time_to_wait = self.delay_next_api_call_until - now
-            if time_to_wait > 0:
-                time.sleep(time_to_wait)
-                
-            yield from func(*args, **kwargs)
-            return
-
-        yield first_item
-        yield from gen
+            streamed_chars += len(first_item) if isinstance(first_item, str) else 0
+            yield first_item
+            for item in gen:
+                streamed_chars += len(item) if isinstance(item, str) else 0
+                yield item
+        finally:
+            self._record_streamed_rate_limit_usage(estimated_tokens, args, streamed_chars)
 
 
     async def generate_stream_async(
@@ -131,9 +661,30 @@ class Model:
     ):
         """Async token streaming. Async-yields str delta chunks.
 
-        Default implementation wraps generate_stream() in a thread executor
+        Models with a native async transport read the stream on the event loop.
+        Otherwise generate_stream() is wrapped in a thread executor
         so that synchronous streaming models get async support for free.
         """
+        if self.supports_native_async():
+            options = self._pop_call_options(kwargs)
+            cache_key = self._response_cache_key(messages, kwargs, options.get("response_cache"), kind="stream")
+            chunks = self.response_cache.get(cache_key) if cache_key is not None else None
+            if chunks is not None:
+                for chunk in chunks:
+                    yield chunk
+                return
+
+            chunks = []
+            async with self.get_async_semaphore():
+                async for chunk in self._stream_with_circuit_breaker_async(
+                        lambda: self._retry_wrapper_stream_async(self._balanced_stream_async(self._generate_stream_async_without_retry), messages,
+                                                                 retry_policy=options.get("retry_policy"), **kwargs)):
+                    chunks.append(chunk)
+                    yield chunk
+            if cache_key is not None:
+                self.response_cache.set(cache_key, chunks)
+            return
+
         import asyncio as _asyncio
         loop = _asyncio.get_running_loop()
         queue: asyncio.Queue = _asyncio.Queue()
@@ -159,7 +710,31 @@ class Model:
         **kwargs
     ) -> Dict:
         """High-level text generation with retry logic."""
-        return self._retry_wrapper(self._generate_without_retry, messages, **kwargs)
+        options = self._pop_call_options(kwargs)
+        cache_key = self._response_cache_key(messages, kwargs, options.get("response_cache"))
+        response = self._cached_response(cache_key)
+        if response is not None:
+            return response
+
+        def send():
+            return self._retry_wrapper(self._balanced(self._generate_without_retry), messages,
+                                       retry_policy=options.get("retry_policy"), **kwargs)
+
+        def hedged():
+            alternate = self.hedge_policy.alternate
+            hedge = send if alternate is None else lambda: alternate.generate(
+                messages, retry_policy=options.get("retry_policy"), **kwargs)
+            return self.hedge_policy.run(send, hedge)
+
+        def call():
+            response = self._call_with_circuit_breaker(send if self.hedge_policy is None else hedged)
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response)
+            return response
+
+        if self.single_flight is None:
+            return call()
+        return self.single_flight.do(self._request_key(messages, kwargs), call)
 
     def image(
         self,
@@ -174,31 +749,218 @@ class Model:
         texts: List[str],
         **kwargs
     ) -> List[List[float]]:
-        """High-level embedding generation with retry logic."""
-        return self._retry_wrapper(self._embed_without_retry, texts, **kwargs)
+        """
+        High-level embedding generation with retry logic.
 
-    def _retry_wrapper(self, func, *args, **kwargs):
-        """Internal helper for rate-limit retries."""
-        now = time.time()
-        time_to_wait = self.delay_next_api_call_until - now
+        Only the texts missing from the embedding cache are sent to the API,
+        in chunks retried independently (see `embedding_batch_size`).
+        Small calls are grouped with concurrent ones by `embedding_batcher`.
+        """
+        cache, namespace, vectors, missing = self._embedding_cache_lookup(texts, kwargs)
+        if not missing:
+            return vectors
+
+        if self._use_embedding_batcher(missing):
+            computed = self.embedding_batcher.embed((id(self), namespace), missing, self._embedding_batch_sender(kwargs))
+            if cache is not None:
+                computed = cache.set_many(namespace, missing, computed)
+        elif cache is not None:
+            # Chunks are stored as they arrive: a failed call does not lose the others.
+            # Vectors are returned as stored (float32), like future hits.
+            computed = self._embed_in_chunks(missing, kwargs,
+                                             on_chunk=lambda chunk, chunk_vectors: cache.set_many(namespace, chunk, chunk_vectors))
+        else:
+            computed = self._embed_in_chunks(missing, kwargs)
+        return self._stitch_embeddings(texts, vectors, missing, computed)
+
+    async def embed_async(
+        self,
+        texts: List[str],
+        **kwargs
+    ) -> List[List[float]]:
+        """
+        Async embedding generation.
+
+        With an `embedding_batcher`, small calls wait for their batch without holding a thread.
+        """
+        cache, namespace, vectors, missing = self._embedding_cache_lookup(texts, kwargs)
+        if not missing:
+            return vectors
+
+        if self._use_embedding_batcher(missing):
+            computed = await self.embedding_batcher.embed_async((id(self), namespace), missing, self._embedding_batch_sender(kwargs))
+            if cache is not None:
+                computed = cache.set_many(namespace, missing, computed)
+            return self._stitch_embeddings(texts, vectors, missing, computed)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_executor(), lambda: self.embed(texts, **kwargs))
+
+    def _embedding_cache_lookup(self, texts: List[str], kwargs: Dict[str, Any]):
+        """Return the cache, its namespace, the cached vectors (None if missing) and the unique missing texts."""
+        cache = self.get_embedding_cache()
+        namespace = self._embedding_cache_namespace(kwargs)
+        if cache is None or not texts:
+            return None, namespace, [None] * len(texts), list(texts)
+        vectors = cache.get_many(namespace, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        return cache, namespace, vectors, missing
+
+    @staticmethod
+    def _stitch_embeddings(texts, vectors, missing, computed) -> List[List[float]]:
+        if len(missing) == len(texts):
+            return list(computed)
+        computed = dict(zip(missing, computed))
+        return [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+    def _use_embedding_batcher(self, texts: List[str]) -> bool:
+        return self.embedding_batcher is not None and 0 < len(texts) < self.embedding_batcher.max_batch_size
+
+    def _embedding_batch_sender(self, kwargs: Dict[str, Any]):
+        return lambda batch: self._embed_in_chunks(batch, kwargs)
+
+    def split_embedding_input(self, texts: List[str]) -> List[List[str]]:
+        """Split texts in chunks of at most `embedding_batch_size` texts and `embedding_batch_tokens` estimated tokens."""
+        chunks, chunk, chunk_tokens = [], [], 0
+        for text in texts:
+            tokens = len(str(text)) // 4 + 1
+            if chunk and (len(chunk) >= self.embedding_batch_size or chunk_tokens + tokens > self.embedding_batch_tokens):
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(text)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _embed_in_chunks(self, texts: List[str], kwargs: Dict[str, Any], on_chunk=None) -> List[List[float]]:
+        """
+        Embed chunks of `texts` concurrently, each with its own retries, and return the vectors in order.
+
+        A short-lived pool is used rather than `get_executor()`, so that embed() called
+        from a worker of that executor cannot wait on itself.
+        """
+        def embed_chunk(chunk: List[str]) -> List[List[float]]:
+            vectors = self._retry_wrapper(self._balanced(self._embed_without_retry), chunk, **kwargs)
+            if len(vectors) != len(chunk):
+                raise RequestError(f"[Model.embed] {len(vectors)} embeddings returned for {len(chunk)} texts.")
+            return on_chunk(chunk, vectors) if on_chunk is not None else vectors
+
+        chunks = self.split_embedding_input(texts)
+        if len(chunks) <= 1:
+            return embed_chunk(texts)
+
+        # Leaving the pool waits for every chunk, so that successful ones reach on_chunk
+        # before the first failure is raised.
+        with ThreadPoolExecutor(max_workers=min(self.max_async_calls, len(chunks))) as executor:
+            futures = [executor.submit(embed_chunk, chunk) for chunk in chunks]
+        return [vector for future in futures for vector in future.result()]
+
+    def get_embedding_cache(self) -> EmbeddingCache|None:
+        return self.embedding_cache if self.embedding_cache is not None else get_default_embedding_cache()
+
+    def _embedding_cache_namespace(self, kwargs: Dict[str, Any]) -> str:
+        """Cache namespace of the embedding model. Arguments such as `dimensions` change the vectors."""
+        namespace = getattr(self, "embedding_model_name", None) or self.model_name
+        params = {k: v for k, v in kwargs.items() if k not in CALL_OPTIONS}
+        if params:
+            namespace += "-" + make_cache_key(params)[:12]
+        return namespace
+
+    def _pop_retry_policy(self, kwargs: Dict[str, Any]) -> RetryPolicy:
+        """Remove the per-call `retry_policy` from the call arguments and return the policy to apply."""
+        policy = kwargs.pop("retry_policy", None)
+        return policy if policy is not None else self.get_retry_policy()
+
+    def get_retry_policy(self) -> RetryPolicy:
+        """
+        Retry policy of this model.
+
+        Unless `retry_policy` is set, it is derived from `retry_delay`:
+        0 disables retries, otherwise it is the maximum backoff delay.
+        """
+        if self.retry_policy is not None:
+            return self.retry_policy
+        if self._default_retry_policy is None or self._default_retry_policy_delay != self.retry_delay:
+            self._default_retry_policy_delay = self.retry_delay
+            self._default_retry_policy = RetryPolicy(
+                max_attempts=1 if self.retry_delay == 0 else 4,
+                max_delay=self.retry_delay or 60,
+            )
+        return self._default_retry_policy
+
+    def _wait_for_api_availability(self, policy: RetryPolicy):
+        # Callers parked on the same deadline wake up spread over the policy jitter
+        time_to_wait = self.delay_next_api_call_until - time.time()
+        if time_to_wait > 0:
+            time.sleep(time_to_wait + policy.jitter())
+
+    async def _wait_for_api_availability_async(self, policy: RetryPolicy):
+        time_to_wait = self.delay_next_api_call_until - time.time()
         if time_to_wait > 0:
-            time.sleep(time_to_wait)
+            await asyncio.sleep(time_to_wait + policy.jitter())
 
+    def _retry_wrapper(self, func, *args, **kwargs):
+        """Internal helper retrying `func` with the retry policy of the call."""
+        policy = self._pop_retry_policy(kwargs)
+        attempt, delay = 1, 0.0
+        while True:
+            self._wait_for_api_availability(policy)
+            try:
+                return self._call_rate_limited(func, *args, **kwargs)
+            except Exception as e:
+                delay = policy.next_delay(e, attempt, delay)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _retry_wrapper_async(self, func, *args, **kwargs):
+        """Internal helper retrying coroutines. Waits without blocking the event loop."""
+        policy = self._pop_retry_policy(kwargs)
+        attempt, delay = 1, 0.0
+        while True:
+            await self._wait_for_api_availability_async(policy)
+            try:
+                return await self._call_rate_limited_async(func, *args, **kwargs)
+            except Exception as e:
+                delay = policy.next_delay(e, attempt, delay)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _retry_wrapper_stream_async(self, func, *args, **kwargs):
+        """Internal helper retrying async generators, before their first item only."""
+        policy = self._pop_retry_policy(kwargs)
+        attempt, delay = 1, 0.0
+        while True:
+            await self._wait_for_api_availability_async(policy)
+            estimated_tokens = await self._acquire_rate_limit_async(args, kwargs)
+            gen = func(*args, **kwargs)
+            try:
+                first_item = await gen.__anext__()
+                break
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                self._refund_rate_limit(estimated_tokens)
+                delay = policy.next_delay(e, attempt, delay)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        streamed_chars = 0
         try:
-            return func(*args, **kwargs)
-        except RateLimitError as e:
-            if self.retry_delay == 0:
-                raise e
-            
-            now = time.time()
-            time_to_wait = self.delay_next_api_call_until - now
-            if time_to_wait <= 0:
-                self.delay_next_api_call_until = now + self.retry_delay
-            
-            time_to_wait = self.delay_next_api_call_until - now
-            if time_to_wait > 0:
-                time.sleep(time_to_wait)
-            return func(*args, **kwargs)
+            streamed_chars += len(first_item) if isinstance(first_item, str) else 0
+            yield first_item
+            async for item in gen:
+                streamed_chars += len(item) if isinstance(item, str) else 0
+                yield item
+        finally:
+            self._record_streamed_rate_limit_usage(estimated_tokens, args, streamed_chars)
+
 
     @abc.abstractmethod
     def _generate_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
@@ -226,6 +988,7 @@ class Model:
         return await self.generate_async(messages, **llm_args)
 
     def api_call_without_retry(self, messages: List[Dict[str, str]], llm_args: Dict = {}) -> Dict:
+        llm_args = {k: v for k, v in llm_args.items() if k not in CALL_OPTIONS}
         return self._generate_without_retry(messages, **llm_args)
 
     def embedding_api_call(self, texts: List[str]) -> List[List[float]]:
@@ -0,0 +1,435 @@
+"""
+Content-addressed caches.
+
+Stores map a key (hex digest) to bytes: `MemoryCache` (LRU + TTL, per process)
+and `DiskCache` (sqlite file, shared between processes and runs).
+
+`ResponseCache` uses them under `Model.generate`, `generate_async` and `generate_stream`:
+
+```
+model.response_cache = ResponseCache(DiskCache("~/.cache/openhosta/responses.sqlite"))
+```
+
+`EmbeddingCache` stores float32 vectors under `Model.embed`. One in-memory cache is
+shared by all models of the process; it can be replaced by memory-mapped files:
+
+```
+set_default_embedding_cache(EmbeddingCache("~/.cache/openhosta/embeddings"))
+```
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Key added to responses served from the cache
+CACHE_HIT_KEY = "openhosta_cache_hit"
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Hash JSON-serializable parts into a cache key.
+
+    Dicts are serialized with sorted keys, so that the key does not depend on insertion order.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe in-memory LRU store.
+
+    Args:
+        max_entries: Least recently used entries are evicted above this size.
+        ttl: Lifetime of entries in seconds. None for no expiry.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Persistent store in a sqlite file, safe to share between threads and processes.
+
+    Args:
+        path: sqlite file. Parent directories are created.
+        ttl: Lifetime of entries in seconds. None for no expiry.
+        max_entries: Least recently used entries are evicted above this size. None for no limit.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < now:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            if self.max_entries is not None:
+                self._connection.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def set(self, key: str, value: bytes):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), expires_at, now),
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Cache of model responses, keyed by model, messages and effective API parameters.
+
+    Only deterministic calls are cached by default: `temperature` 0 or a `seed`.
+    Sampling without a seed is expected to give a different answer on each call.
+
+    Args:
+        store: `MemoryCache` (default) or `DiskCache`, or any object with get/set.
+        cache_nondeterministic: Also cache calls sampled without a seed.
+
+    A single call can bypass or force the cache with `force_llm_args={"response_cache": False}` (or True).
+    """
+
+    def __init__(self, store=None, cache_nondeterministic: bool = False):
+        self.store = store if store is not None else MemoryCache()
+        self.cache_nondeterministic = cache_nondeterministic
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def is_cacheable(self, params: Dict[str, Any]) -> bool:
+        if self.cache_nondeterministic:
+            return True
+        return params.get("seed") is not None or params.get("temperature") == 0
+
+    def key(self, model, messages: List[Dict[str, Any]], params: Dict[str, Any], kind: str = "generate") -> str:
+        return make_cache_key(kind, type(model).__name__, model.model_name, model.base_url, messages, params)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup_key(self, model, messages, params: Dict[str, Any], force: Optional[bool] = None,
+                   kind: str = "generate") -> Optional[str]:
+        """Return the cache key of a call, or None if the call must not be cached."""
+        if force is False:
+            return None
+        if force is None and not self.is_cacheable(params):
+            self._count("skipped")
+            return None
+        return self.key(model, messages, params, kind)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh copy of the cached value, or None."""
+        raw = self.store.get(key)
+        if raw is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any):
+        self.store.set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "skipped": self.skipped}
+
+    def __repr__(self):
+        return f"ResponseCache(store={type(self.store).__name__}, cache_nondeterministic={self.cache_nondeterministic})"
+
+
+def _to_float32_bytes(vector: List[float]) -> bytes:
+    values = array("f", vector)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_float32_bytes(data: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+class MappedVectorFile:
+    """
+    Append-only file of little-endian float32 vectors, read through mmap.
+
+    Each row is a 16-byte key digest followed by the vector. Rows appended by other
+    processes are indexed on the next lookup miss.
+    """
+
+    HEADER = struct.Struct("<8sI")
+    MAGIC = b"OHEMB001"
+    DIGEST_SIZE = 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dimension: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._indexed_size = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Index the rows written since the last call. A partially written last row is left for later."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size <= max(self._indexed_size, self.HEADER.size - 1):
+            return
+
+        with open(self.path, "rb") as file:
+            if self.dimension is None:
+                magic, dimension = self.HEADER.unpack(file.read(self.HEADER.size))
+                if magic != self.MAGIC:
+                    raise ValueError(f"{self.path} is not an OpenHosta embedding file")
+                self.dimension = dimension
+                self._indexed_size = self.HEADER.size
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        row_size = self.DIGEST_SIZE + 4 * self.dimension
+        end = self._indexed_size + (size - self._indexed_size) // row_size * row_size
+        for offset in range(self._indexed_size, end, row_size):
+            self._index[self._mmap[offset:offset + self.DIGEST_SIZE]] = offset + self.DIGEST_SIZE
+        self._indexed_size = end
+
+    def get_many(self, digests: List[bytes]) -> List[Optional[List[float]]]:
+        with self._lock:
+            if any(digest not in self._index for digest in digests):
+                self._refresh()
+            vectors = []
+            for digest in digests:
+                offset = self._index.get(digest)
+                if offset is None:
+                    vectors.append(None)
+                else:
+                    vectors.append(_from_float32_bytes(self._mmap[offset:offset + 4 * self.dimension]))
+            return vectors
+
+    def set_many(self, digests: List[bytes], vectors: List[List[float]]):
+        with self._lock:
+            self._refresh()
+            if self.dimension is None:
+                try:
+                    with open(self.path, "xb") as file:
+                        file.write(self.HEADER.pack(self.MAGIC, len(vectors[0])))
+                except FileExistsError:
+                    pass
+                self._refresh()
+
+            # Vectors of another size (e.g. a different `dimensions` argument) are not stored
+            rows = b"".join(digest + _to_float32_bytes(vector)
+                            for digest, vector in zip(digests, vectors)
+                            if digest not in self._index and len(vector) == self.dimension)
+            if not rows:
+                return
+            with open(self.path, "ab") as file:
+                _lock_file(file)
+                file.write(rows)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+
+def _lock_file(file):
+    """Exclusive lock released when the file is closed, so that processes do not interleave rows."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: appends of a single write are not interleaved
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+
+class EmbeddingCache:
+    """
+    Cache of embeddings keyed by embedding model and text.
+
+    Vectors are stored as float32, so hits and misses return the same values.
+
+    Args:
+        directory: Folder of the memory-mapped files, one per embedding model. None keeps vectors in memory.
+        max_entries: Size of the in-memory LRU when `directory` is None.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = 10_000):
+        self.directory = os.path.expanduser(directory) if directory is not None else None
+        self._memory = MemoryCache(max_entries=max_entries) if directory is None else None
+        self._files: Dict[str, MappedVectorFile] = {}
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()[:MappedVectorFile.DIGEST_SIZE]
+
+    def _file(self, namespace: str) -> MappedVectorFile:
+        with self._lock:
+            if namespace not in self._files:
+                name = re.sub(r"[^A-Za-z0-9._-]+", "_", namespace)
+                self._files[namespace] = MappedVectorFile(os.path.join(self.directory, f"{name}.f32"))
+            return self._files[namespace]
+
+    def get_many(self, namespace: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors of `texts`, with None for each miss."""
+        digests = [self.digest(text) for text in texts]
+        if self._memory is not None:
+            vectors = []
+            for digest in digests:
+                data = self._memory.get(namespace + ":" + digest.hex())
+                vectors.append(_from_float32_bytes(data) if data is not None else None)
+        else:
+            vectors = self._file(namespace).get_many(digests)
+
+        misses = vectors.count(None)
+        with self._lock:
+            self.hits += len(vectors) - misses
+            self.misses += misses
+        return vectors
+
+    def set_many(self, namespace: str, texts: List[str], vectors: List[List[float]]) -> List[List[float]]:
+        """Store the vectors of `texts` and return them as stored (float32)."""
+        if not texts:
+            return []
+        digests = [self.digest(text) for text in texts]
+        if self._memory is not None:
+            for digest, vector in zip(digests, vectors):
+                self._memory.set(namespace + ":" + digest.hex(), _to_float32_bytes(vector))
+        else:
+            self._file(namespace).set_many(digests, vectors)
+        return [_from_float32_bytes(_to_float32_bytes(vector)) for vector in vectors]
+
+    def close(self):
+        with self._lock:
+            for vector_file in self._files.values():
+                vector_file.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def __repr__(self):
+        return f"EmbeddingCache(directory={self.directory!r})"
+
+
+_default_embedding_cache: Optional[EmbeddingCache] = EmbeddingCache()
+
+
+def get_default_embedding_cache() -> Optional[EmbeddingCache]:
+    """Embedding cache of the models created without `embedding_cache`."""
+    return _default_embedding_cache
+
+
+def set_default_embedding_cache(cache: Optional[EmbeddingCache]):
+    """Replace the process-wide embedding cache. None disables it."""
+    global _default_embedding_cache
+    _default_embedding_cache = cache
@@ -0,0 +1,150 @@
+"""
+Circuit breaker of a model: stop calling a provider that keeps failing.
+
+```
+model = OpenAICompatibleModel(model_name="gpt-4o", circuit_breaker=CircuitBreaker(cooldown=30))
+```
+
+The breaker is closed while calls succeed. When the failure rate of the last calls
+(connection errors, timeouts, HTTP 429 and 5xx, calls slower than `slow_call_duration`)
+reaches `failure_rate_threshold`, it opens: calls fail at once with CircuitOpenError and
+`OneTurnConversationPipeline.push_choose_model` skips the model. After `cooldown`
+seconds it is half-open: a trial call is let through, which closes the breaker if it
+succeeds and opens it again otherwise.
+
+Every state change is sent to the audit callbacks as a `circuit_breaker_<state>` event.
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+
+from typing import Any, Deque, Dict
+
+from .audit import trigger_audit_event
+from .errors import CircuitOpenError
+from .load_balancer import is_endpoint_failure
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker driven by the failure rate of the last calls.
+
+    Args:
+        failure_rate_threshold: Fraction of failed calls in the window opening the breaker.
+        window_size: Number of last calls the failure rate is computed on.
+        minimum_calls: Calls needed in the window before the breaker can open.
+        cooldown: Seconds the breaker stays open before letting a trial call through.
+        slow_call_duration: Successful calls slower than this many seconds count as failures. None disables it.
+        half_open_max_calls: Trial calls allowed at the same time while half-open.
+        name: Name used in the audit events. Defaults to the model name.
+    """
+
+    def __init__(self,
+                 failure_rate_threshold: float = 0.5,
+                 window_size: int = 20,
+                 minimum_calls: int = 5,
+                 cooldown: float = 30.0,
+                 slow_call_duration: float|None = None,
+                 half_open_max_calls: int = 1,
+                 name: str|None = None):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_size = window_size
+        self.minimum_calls = minimum_calls
+        self.cooldown = cooldown
+        self.slow_call_duration = slow_call_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.name = name
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # True for each failed call of the window
+        self._outcomes: Deque[bool] = collections.deque(maxlen=window_size)
+        self._trials = 0
+        # Reentrant: audit callbacks run under the lock and may read the stats
+        self._lock = threading.RLock()
+
+    def failure_rate(self) -> float:
+        with self._lock:
+            return self._failure_rate()
+
+    def _failure_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def is_available(self) -> bool:
+        """True if a call would be let through now. Does not change the state."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return self._trials < self.half_open_max_calls
+
+    def before_call(self):
+        """
+        Let a call through, or raise CircuitOpenError.
+
+        Each call let through must be followed by `record_success`, `record_failure` or `record_cancel`.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"[CircuitBreaker] {self.name} is unavailable (circuit {self.state}, retry in {remaining:.0f}s).")
+
+    def record_success(self, duration: float = 0.0):
+        if self.slow_call_duration is not None and duration > self.slow_call_duration:
+            self._record(failed=True)
+        else:
+            self._record(failed=False)
+
+    def record_failure(self, error: BaseException|None = None):
+        """Record a failed call. Errors of the request itself (HTTP 4xx) count as successes of the provider."""
+        self._record(failed=error is None or is_endpoint_failure(error))
+
+    def record_cancel(self):
+        """Release the trial slot of a call that was abandoned without an outcome."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+
+    def _record(self, failed: bool):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+                self._transition(OPEN if failed else CLOSED)
+                return
+            self._outcomes.append(failed)
+            if self.state == CLOSED and len(self._outcomes) >= self.minimum_calls \
+                    and self._failure_rate() >= self.failure_rate_threshold:
+                self._transition(OPEN)
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        details = {"model": self.name, "previous_state": previous, "failure_rate": self._failure_rate(),
+                   "calls": len(self._outcomes)}
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            details["cooldown"] = self.cooldown
+        elif state == CLOSED:
+            self._outcomes.clear()
+        self._trials = 0
+        trigger_audit_event(f"circuit_breaker_{state}", details)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failure_rate": self._failure_rate(), "calls": len(self._outcomes)}
+
+    def __repr__(self):
+        return f"CircuitBreaker(name={self.name!r}, state={self.state!r})"
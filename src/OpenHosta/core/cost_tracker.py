@@ -22,6 +22,10 @@ class CostTracker:
         self.completion_tokens = 0
         self.total_tokens = 0
         self.calls = 0
+        self.cache_hits = 0
+        # Prompt tokens read from the provider prompt cache (billed at a discount), and written to it
+        self.cached_tokens = 0
+        self.cache_creation_tokens = 0
 
     def add_usage(self, usage: Dict):
         """Add usage dict returned by an OpenAI-compatible API to the tracker."""
@@ -31,10 +35,21 @@ class CostTracker:
         self.prompt_tokens += usage.get("prompt_tokens", 0)
         self.completion_tokens += usage.get("completion_tokens", 0)
         self.total_tokens += usage.get("total_tokens", 0)
+        self.cached_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        self.cache_creation_tokens += usage.get("cache_creation_input_tokens") or 0
         self.calls += 1
 
+    def add_cache_hit(self):
+        """Count a response served from the response cache: no token was spent."""
+        self.cache_hits += 1
+
+    @property
+    def cached_token_ratio(self) -> float:
+        """Share of the prompt tokens read from the provider prompt cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
     def __str__(self):
-        return f"CostTracker(calls={self.calls}, prompt_tokens={self.prompt_tokens}, completion_tokens={self.completion_tokens}, total_tokens={self.total_tokens})"
+        return f"CostTracker(calls={self.calls}, cache_hits={self.cache_hits}, prompt_tokens={self.prompt_tokens}, cached_tokens={self.cached_tokens}, completion_tokens={self.completion_tokens}, total_tokens={self.total_tokens})"
 
 _current_cost_tracker: contextvars.ContextVar[CostTracker] = contextvars.ContextVar("current_cost_tracker", default=None)
 
@@ -9,12 +9,25 @@ __all__ = (
 class RequestError(Exception):
     """ Raised when a request to a llm went wrong """
 
+    def __init__(self, *args, status_code: int|None = None, retry_after: float|None = None):
+        super().__init__(*args)
+        # HTTP status of the failed response and delay requested by the server (seconds), if known
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 class RateLimitError(RequestError):
     """ Raised when rate limit is exceeded """
 
 class ApiKeyError(RequestError):
     """ Raised when API key is missing or incorrect """
 
+class CircuitOpenError(RequestError):
+    """ Raised instead of calling a model whose circuit breaker is open """
+
+
+class ReplayMissError(Exception):
+    """ Raised when a ReplayModel is asked a call that its cassette did not record """
+
 
 class FrameError(Exception):
     """ Raised when the frame inspection fail """
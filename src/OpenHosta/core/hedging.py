@@ -0,0 +1,181 @@
+"""
+Hedged requests: cut the tail latency of `generate` by racing a second request.
+
+If the first request has not answered after a delay, an identical request is sent,
+to the same model (another replica when a LoadBalancer is set) or to an alternate
+model. The first answer wins; the other request is cancelled (async) or ignored.
+
+```
+model = OpenAICompatibleModel(model_name="gpt-4o", hedge_policy=HedgePolicy(budget=0.05))
+```
+
+The extra requests cost tokens: `budget` caps them to a fraction of the calls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict
+
+from .metrics import Histogram, LATENCY_BUCKETS
+
+
+class HedgePolicy:
+    """
+    When to send a hedge request, and where.
+
+    Args:
+        delay: Fixed seconds to wait for the first answer. None derives it from the
+            `quantile` of the observed latencies.
+        quantile: Latency quantile used as delay, e.g. 0.95 hedges the 5% slowest calls.
+        initial_delay: Delay used until `min_samples` latencies were observed.
+        min_samples: Observed calls needed before using the quantile.
+        budget: Maximum hedge requests, as a fraction of the calls.
+        alternate: Model receiving the hedge requests, answering in the same format. None uses the same model.
+        max_workers: Threads running the requests of synchronous calls.
+    """
+
+    def __init__(self,
+                 delay: float|None = None,
+                 quantile: float = 0.95,
+                 initial_delay: float = 2.0,
+                 min_samples: int = 20,
+                 budget: float = 0.1,
+                 alternate=None,
+                 max_workers: int = 64):
+        self.delay = delay
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.alternate = alternate
+        self.max_workers = max_workers
+
+        # Seconds to the answer of first requests
+        self.latencies = Histogram(LATENCY_BUCKETS)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor|None = None
+
+    def get_delay(self) -> float:
+        """Seconds to wait for the first answer before hedging."""
+        if self.delay is not None:
+            return self.delay
+        if self.latencies.count < self.min_samples:
+            return self.initial_delay
+        return self.latencies.quantile(self.quantile)
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.calls:
+                self.budget_denied += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def _record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._executor
+
+    def run(self, primary: Callable[[], Any], hedge: Callable[[], Any]) -> Any:
+        """
+        Return the result of `primary()`, or of `hedge()` if it answers first.
+
+        The losing request cannot be interrupted: it completes in the background and its result is dropped.
+        If both fail, the error of `primary` is raised.
+        """
+        self._start_call()
+        executor = self._get_executor()
+        start = time.perf_counter()
+        first = executor.submit(contextvars.copy_context().run, primary)
+
+        def observe(future):
+            if future.exception() is None:
+                self.latencies.observe(time.perf_counter() - start)
+        first.add_done_callback(observe)
+
+        done, _ = wait([first], timeout=self.get_delay())
+        if done or not self._take_budget():
+            return first.result()
+
+        second = executor.submit(contextvars.copy_context().run, hedge)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._record_win()
+                    return future.result()
+        return first.result()
+
+    async def run_async(self, primary: Callable[[], Awaitable[Any]], hedge: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of `run`. The losing request is cancelled."""
+        self._start_call()
+        start = time.perf_counter()
+        first = asyncio.ensure_future(primary())
+
+        def observe(task):
+            # A cancelled loser gives a lower bound of its latency: the slow tail must not vanish from the statistics
+            if task.cancelled() or task.exception() is None:
+                self.latencies.observe(time.perf_counter() - start)
+        first.add_done_callback(observe)
+
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.get_delay())
+            if done or not self._take_budget():
+                return await first
+
+            second = asyncio.ensure_future(hedge())
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._record_win()
+                        return task.result()
+            return first.result()
+        finally:
+            # The loser, or both requests if the caller was cancelled
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "delay": self.get_delay(),
+        }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return f"HedgePolicy(delay={self.delay}, quantile={self.quantile}, budget={self.budget})"
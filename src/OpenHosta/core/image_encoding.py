@@ -0,0 +1,164 @@
+"""
+Encoding of the PIL image arguments sent to the models.
+
+`push_select_meta_prompts` downscales each image, encodes it and sends it as a base64
+data URL. An `ImageEncoder` sets how, per model:
+
+```
+model.image_encoder = ImageEncoder(format="jpeg", quality=80, max_edge=1024)
+```
+
+Encoded payloads are cached by content hash, so that retries and images sent to
+several functions are encoded once. Several images of one call are encoded in parallel.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import threading
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from .cache import MemoryCache
+
+# Mime subtype and PIL format name of the supported formats
+_FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+# Edge OpenAI downscales low detail images to
+LOW_DETAIL_MAX_EDGE = 512
+
+_default_image_cache = MemoryCache(max_entries=32)
+
+
+class ImageEncoder:
+    """
+    Encoder policy of the images sent to a model.
+
+    Args:
+        format: "png", "jpeg" or "webp".
+        quality: Quality of the lossy formats (1-100).
+        max_edge: Images are downscaled so that their longest edge is at most this many pixels.
+        detail: "low" asks the API for a reduced-detail analysis (fewer tokens) and downscales
+            to 512 pixels. None leaves the choice to the API.
+        cache: Store of the encoded payloads (see `core.cache`). Defaults to an in-memory cache shared by every encoder.
+        max_workers: Threads encoding the images of one call.
+    """
+
+    def __init__(self,
+                 format: str = "png",
+                 quality: int = 85,
+                 max_edge: int|None = 1920,
+                 detail: str|None = None,
+                 cache=None,
+                 max_workers: int = 4):
+        format = format.lower()
+        if format not in _FORMATS:
+            raise ValueError(f"[ImageEncoder] Unsupported format {format!r}. Use one of {sorted(_FORMATS)}.")
+        self.format = "jpeg" if format == "jpg" else format
+        self.quality = quality
+        self.max_edge = max_edge
+        if detail is not None and detail not in ("low", "high", "auto"):
+            raise ValueError(f"[ImageEncoder] Unsupported detail {detail!r}. Use 'low', 'high' or 'auto'.")
+        self.detail = detail
+        self.cache = cache if cache is not None else _default_image_cache
+        self.max_workers = max_workers
+
+        # Downscaled images made by this encoder, with their key, by id (PIL images are not hashable)
+        self._known_images: Dict[int, Tuple[weakref.ref, str]] = {}
+        # Reentrant: the weakref callbacks may run in a garbage collection triggered under the lock
+        self._known_lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_max_edge(self) -> int|None:
+        if self.detail == "low":
+            return min(self.max_edge or LOW_DETAIL_MAX_EDGE, LOW_DETAIL_MAX_EDGE)
+        return self.max_edge
+
+    def image_key(self, image) -> str:
+        """Hash of the pixels of `image` and of this policy."""
+        with self._known_lock:
+            known = self._known_images.get(id(image))
+        if known is not None and known[0]() is image:
+            return known[1]
+        digest = hashlib.sha256()
+        digest.update(f"{self.format}|{self.quality}|{self.get_max_edge()}|{image.mode}|{image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def encode(self, image) -> Tuple[Dict[str, str], Any]:
+        """
+        Return the `image_url` part of a chat message holding `image`, and the downscaled image.
+
+        The downscaled image is `image` itself when it fits in `max_edge`.
+        """
+        key = self.image_key(image)
+        # Downscaling is cheap next to encoding: it is redone on hits rather than keeping the images
+        downscaled = self.downscale(image)
+        data_url = self.cache.get(key)
+        if data_url is not None:
+            self.hits += 1
+            data_url = data_url.decode("ascii")
+        else:
+            self.misses += 1
+            data_url = self.to_data_url(downscaled)
+            self.cache.set(key, data_url.encode("ascii"))
+
+        if downscaled is not image:
+            # Sent again as is by retries: no need to hash it
+            image_id = id(downscaled)
+            forget = lambda _: self._forget(image_id)
+            with self._known_lock:
+                self._known_images[image_id] = (weakref.ref(downscaled, forget), key)
+
+        image_url = {"url": data_url}
+        if self.detail is not None:
+            image_url["detail"] = self.detail
+        return image_url, downscaled
+
+    def _forget(self, image_id: int):
+        with self._known_lock:
+            known = self._known_images.get(image_id)
+            if known is not None and known[0]() is None:
+                del self._known_images[image_id]
+
+    def encode_many(self, images: List[Any]) -> List[Tuple[Dict[str, str], Any]]:
+        """Encode `images`, in parallel when there are several (PIL releases the GIL while encoding)."""
+        if len(images) <= 1:
+            return [self.encode(image) for image in images]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(images))) as executor:
+            return list(executor.map(self.encode, images))
+
+    def _needs_downscale(self, image) -> bool:
+        max_edge = self.get_max_edge()
+        return max_edge is not None and max(image.width, image.height) > max_edge
+
+    def downscale(self, image):
+        if not self._needs_downscale(image):
+            return image
+        ratio = self.get_max_edge() / max(image.width, image.height)
+        return image.resize([int(image.width * ratio), int(image.height * ratio)])
+
+    def to_data_url(self, image) -> str:
+        pil_format = _FORMATS[self.format]
+        options = {}
+        if pil_format == "JPEG":
+            # JPEG has no alpha channel nor palette
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            options["quality"] = self.quality
+        elif pil_format == "WEBP":
+            options["quality"] = self.quality
+        buffered = io.BytesIO()
+        image.save(buffered, pil_format, **options)
+        encoded = base64.b64encode(buffered.getvalue()).decode("ascii")
+        return f"data:image/{self.format};base64,{encoded}"
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def __repr__(self):
+        return f"ImageEncoder(format={self.format!r}, quality={self.quality}, max_edge={self.max_edge}, detail={self.detail!r})"
@@ -1,4 +1,6 @@
 import sys
+import copy
+import contextvars
 import inspect
 
 from types import FrameType, MethodType, FunctionType
@@ -11,6 +13,10 @@ from .analizer import hosta_analyze, hosta_analyze_update
 if TYPE_CHECKING:
     from ..pipelines.simple_pipeline import Pipeline
 
+# Set while the calls of a function run concurrently (see exec/map.py): each call then
+# works on its own copy of the inspection stored on the function.
+call_scoped_inspection: contextvars.ContextVar[bool] = contextvars.ContextVar("call_scoped_inspection", default=False)
+
 class Inspection:
     def __init__(self,
                  function_pointer: Callable,
@@ -28,6 +34,20 @@ class Inspection:
         self.prompt_data:Dict = {}
         self.pipeline:Pipeline|None =  None
         self.model:Model|None = None
+        # routing_policy of the current call, read by push_choose_model
+        self.routing_policy = None
+
+    def copy(self) -> "Inspection":
+        """
+        Copy for one call: the analyse, logs and call data are its own, the rest is shared.
+        """
+        clone = copy.copy(self)
+        clone.analyse = copy.copy(self.analyse)
+        clone.logs = {}
+        clone.force_llm_args = dict(self.force_llm_args)
+        clone.counters = dict(self.counters)
+        clone.prompt_data = {}
+        return clone
         
 class HostaInjectedFunction(Callable):
     hosta_inspection: Inspection
@@ -150,6 +170,8 @@ def get_hosta_inspection(frame=None, function_pointer=None):
             analyse=analyse)
         setattr(function_pointer, "hosta_inspection", inspection)
     else:
+        if call_scoped_inspection.get():
+            inspection = inspection.copy()
         if frame is None:
             # We do not have argument types from the call (most likely a closure)
             inspection.analyse.args = []
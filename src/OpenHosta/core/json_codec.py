@@ -0,0 +1,94 @@
+"""
+JSON codec of the request and response bodies of the models.
+
+Bodies are encoded to bytes and responses decoded from bytes by the process-wide codec:
+orjson when it is installed, the standard library otherwise.
+
+```
+from OpenHosta.core.json_codec import StdlibJSONCodec, set_json_codec
+
+set_json_codec(StdlibJSONCodec())
+```
+
+Embedding vectors may be received as base64 float32 (`encoding_format="base64"` on
+OpenAI-compatible APIs); `decode_embedding` reads them without parsing one float per token.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import sys
+
+from array import array
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:
+    # Optional dependency: the standard library is used without it
+    orjson = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+class StdlibJSONCodec:
+    """Codec of the `json` module of the standard library."""
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes|str) -> Any:
+        return json.loads(data)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class OrjsonJSONCodec(StdlibJSONCodec):
+    """Codec of orjson, several times faster on large bodies such as base64 images and logprobs."""
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("[OrjsonJSONCodec] orjson is not installed. Install it with `pip install orjson`.")
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson refuses what json accepts, e.g. integers above 64 bits or dicts with non-str keys
+            return super().dumps(obj)
+
+    def loads(self, data: bytes|str) -> Any:
+        return orjson.loads(data)
+
+
+def default_json_codec() -> StdlibJSONCodec:
+    return OrjsonJSONCodec() if orjson is not None else StdlibJSONCodec()
+
+
+_json_codec = default_json_codec()
+
+
+def get_json_codec() -> StdlibJSONCodec:
+    """Codec used by every model."""
+    return _json_codec
+
+
+def set_json_codec(codec: StdlibJSONCodec):
+    """Replace the process-wide codec, e.g. by `StdlibJSONCodec()` to compare both."""
+    global _json_codec
+    _json_codec = codec
+
+
+def decode_embedding(value: List[float]|str) -> List[float]:
+    """Vector of an embedding response: a list of floats, or base64 little-endian float32."""
+    if not isinstance(value, str):
+        return value
+    values = array("f")
+    values.frombytes(base64.b64decode(value))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
@@ -0,0 +1,215 @@
+"""
+Client-side load balancing of one logical model over several replicas.
+
+```
+replicas = LoadBalancer(["http://10.0.0.1:8000", "http://10.0.0.2:8000"], strategy="least_outstanding")
+model = OpenAICompatibleModel(model_name="llama-3.1-8b", base_url="http://10.0.0.1:8000/v1", load_balancer=replicas)
+```
+
+Each attempt of `generate`, `generate_stream` and `embed` (retries included) is sent
+to an endpoint picked by the balancer. The endpoint replaces the scheme, host and port
+of the model `base_url`; routes such as `/v1/chat/completions` are kept.
+
+Endpoints are health-checked passively: after `max_consecutive_errors` failed calls
+(connection errors, HTTP 429 and 5xx) an endpoint is ejected for `ejection_time`
+seconds. It then gets a single trial request: a success brings it back, a failure
+ejects it again for twice as long, up to `max_ejection_time`.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import random
+import threading
+import time
+
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from .errors import ApiKeyError, RateLimitError
+from .metrics import Histogram, LATENCY_BUCKETS
+
+STRATEGIES = ("round_robin", "least_outstanding", "latency_weighted")
+
+# Endpoint of the attempt being sent by the current thread or task
+_current_endpoint: contextvars.ContextVar[Optional["Endpoint"]] = contextvars.ContextVar("current_endpoint", default=None)
+
+
+def get_current_endpoint() -> Optional["Endpoint"]:
+    return _current_endpoint.get()
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """True if `error` tells that the endpoint is unhealthy rather than that the request is wrong."""
+    if isinstance(error, ApiKeyError):
+        return False
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and isinstance(error, RateLimitError):
+        status_code = 429
+    # No status: connection error, timeout or unreadable response
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class Endpoint:
+    """One replica of the model, with its in-flight count, latency and health."""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url if "://" in url else "http://" + url)
+        self.url = f"{parsed.scheme}://{parsed.netloc}"
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        # Seconds per call (time to first chunk for streams)
+        self.latencies = Histogram(LATENCY_BUCKETS)
+        self.ewma_latency: float|None = None
+
+        self.ejected_until = 0.0
+        # Consecutive ejections, doubling the next ejection time
+        self.ejections = 0
+        # A trial request is in flight after an ejection
+        self.probing = False
+
+    def is_ejected(self, now: float|None = None) -> bool:
+        return self.ejected_until > (time.monotonic() if now is None else now)
+
+    def resolve(self, base_url: str) -> str:
+        """Return `base_url` with the scheme, host and port of this endpoint."""
+        parsed = urlparse(base_url)
+        if not parsed.netloc:
+            return self.url
+        return self.url + base_url[len(f"{parsed.scheme}://{parsed.netloc}"):]
+
+    def __repr__(self):
+        return f"Endpoint({self.url!r}, in_flight={self.in_flight}, ejected={self.is_ejected()})"
+
+
+class LoadBalancer:
+    """
+    Pick the endpoint of each request among the replicas of a model.
+
+    Args:
+        endpoints: Base URLs of the replicas. Only their scheme, host and port are used.
+        strategy: "round_robin", "least_outstanding" (fewest requests in flight) or
+            "latency_weighted" (random pick weighted by the inverse of the recent latency
+            times the requests in flight).
+        max_consecutive_errors: Failed calls in a row after which an endpoint is ejected.
+        ejection_time: Seconds of the first ejection of an endpoint.
+        max_ejection_time: Upper bound of the ejection time, doubled at each failed trial.
+        latency_decay: Weight of the last call in the moving average used by "latency_weighted".
+    """
+
+    def __init__(self,
+                 endpoints: Iterable[str],
+                 strategy: str = "round_robin",
+                 max_consecutive_errors: int = 3,
+                 ejection_time: float = 10.0,
+                 max_ejection_time: float = 300.0,
+                 latency_decay: float = 0.3):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"[LoadBalancer] Unknown strategy {strategy!r}. Use one of {STRATEGIES}.")
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in endpoints]
+        if not self.endpoints:
+            raise ValueError("[LoadBalancer] At least one endpoint is required.")
+        self.strategy = strategy
+        self.max_consecutive_errors = max_consecutive_errors
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.latency_decay = latency_decay
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._random = random.Random()
+
+    def acquire(self) -> Endpoint:
+        """Pick the endpoint of a new request and count it in flight. Each call must be matched by `release`."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if not e.is_ejected(now) and not e.probing]
+            if not candidates:
+                # Every endpoint is ejected: rather try the one coming back first than fail
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            endpoint = self._pick(candidates)
+            if endpoint.ejections:
+                endpoint.probing = True
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _pick(self, candidates: List[Endpoint]) -> Endpoint:
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "latency_weighted":
+            known = [e.ewma_latency for e in candidates if e.ewma_latency is not None]
+            # Endpoints without measure yet are given the best latency, so that they get tried
+            default = min(known) if known else 1.0
+            weights = [1.0 / (max(e.ewma_latency if e.ewma_latency is not None else default, 1e-6) * (1 + e.in_flight))
+                       for e in candidates]
+            return self._random.choices(candidates, weights)[0]
+
+        # Rotate the starting point so that ties are spread over the endpoints
+        start = self._next % len(candidates)
+        self._next += 1
+        rotated = candidates[start:] + candidates[:start]
+        if self.strategy == "least_outstanding":
+            return min(rotated, key=lambda e: e.in_flight)
+        return rotated[0]
+
+    def release(self, endpoint: Endpoint, latency: float|None = None, error: BaseException|None = None):
+        """
+        Record the end of a request sent to `endpoint`.
+
+        Args:
+            latency: Seconds of the call, if it succeeded.
+            error: Exception raised by the call. Errors of the request itself (HTTP 4xx) do not count against the endpoint.
+
+        Without latency nor error, the request was abandoned (cancelled) and tells nothing about the endpoint.
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            was_probing, endpoint.probing = endpoint.probing, False
+            if latency is None and error is None:
+                return
+            if error is not None and is_endpoint_failure(error):
+                endpoint.errors += 1
+                endpoint.consecutive_errors += 1
+                if was_probing or endpoint.consecutive_errors >= self.max_consecutive_errors:
+                    self._eject(endpoint, self.ejection_time * 2 ** endpoint.ejections)
+                return
+            endpoint.consecutive_errors = 0
+            endpoint.ejections = 0
+            if latency is not None:
+                endpoint.ewma_latency = latency if endpoint.ewma_latency is None else \
+                    (1 - self.latency_decay) * endpoint.ewma_latency + self.latency_decay * latency
+        if latency is not None:
+            endpoint.latencies.observe(latency)
+
+    def eject(self, endpoint: Endpoint, seconds: float):
+        """Take `endpoint` out of rotation for `seconds`, e.g. when it asks to retry later."""
+        with self._lock:
+            self._eject(endpoint, seconds)
+
+    def _eject(self, endpoint: Endpoint, seconds: float):
+        endpoint.ejected_until = max(endpoint.ejected_until, time.monotonic() + min(seconds, self.max_ejection_time))
+        endpoint.ejections += 1
+        endpoint.consecutive_errors = 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counters of each endpoint, by URL."""
+        now = time.monotonic()
+        return {
+            endpoint.url: {
+                "in_flight": endpoint.in_flight,
+                "requests": endpoint.requests,
+                "errors": endpoint.errors,
+                "ejected": endpoint.is_ejected(now),
+                "mean_latency": endpoint.latencies.mean(),
+                "p50_latency": endpoint.latencies.quantile(0.5),
+                "p99_latency": endpoint.latencies.quantile(0.99),
+            }
+            for endpoint in self.endpoints
+        }
+
+    def __repr__(self):
+        return f"LoadBalancer({[e.url for e in self.endpoints]}, strategy={self.strategy!r})"
@@ -6,8 +6,74 @@ Meta-prompt is jinja2. Period.
 Just make it easier to inspect and tune.
 """
 
+import copy
+import inspect
+import re
+import threading
+
 from textwrap import dedent
-from jinja2 import Template
+from jinja2 import Environment, Template, meta
+
+from .cache import MemoryCache, make_cache_key
+
+# A line holding only whitespace, followed by more of them. Starting with a line end lets
+# the regex engine jump from one to the next.
+_BLANK_LINES = re.compile(r"(\n[^\S\n]*)(?:\n[^\S\n]*(?![^\n]))+")
+_TRAILING_NEWLINE = re.compile(r"(?:\r\n|\r|\n)\Z")
+
+# Options of jinja2.Template, in the order of its positional arguments
+_TEMPLATE_OPTIONS = inspect.signature(Template.__new__)
+
+# One environment per set of options, shared by all meta-prompts using them
+_environments = {}
+_environments_lock = threading.Lock()
+# Compiled templates, keyed by the options and the source
+_template_cache = MemoryCache(max_entries=256)
+
+
+def collapse_blank_lines(text: str) -> str:
+    """
+    Keep only the first line of each run of blank lines, e.g. those left by {% if ... %} blocks that are false.
+    """
+    return _BLANK_LINES.sub(r"\1", "\n" + text)[1:]
+
+
+def get_environment(*args, **kargs) -> Environment:
+    """
+    Shared jinja2 environment for the options of `jinja2.Template(source, *args, **kargs)`.
+    """
+    options = _TEMPLATE_OPTIONS.bind(Template, "", *args, **kargs).arguments
+    options = {name: value for name, value in options.items() if name not in ("cls", "source")}
+    key = make_cache_key(options)
+    environment = _environments.get(key)
+    if environment is None:
+        with _environments_lock:
+            environment = _environments.get(key)
+            if environment is None:
+                environment = Environment(**options)
+                environment.filters["collapse_blank_lines"] = collapse_blank_lines
+                _environments[key] = environment
+    return environment
+
+
+def compile_template(source: str, *args, **kargs) -> Template:
+    """
+    Compile `source` into a template collapsing its blank lines, or return the one compiled
+    earlier for the same source and options.
+    """
+    environment = get_environment(*args, **kargs)
+    key = make_cache_key(id(environment), source)
+    template = _template_cache.get(key)
+    if template is None:
+        if not environment.keep_trailing_newline:
+            # Jinja drops it at the end of the source, which is now inside the filter block
+            source = _TRAILING_NEWLINE.sub("", source, count=1)
+        start, end = environment.block_start_string, environment.block_end_string
+        template = environment.from_string(
+            f"{start} filter collapse_blank_lines {end}{source}{start} endfilter {end}")
+        _template_cache.set(key, template)
+    return template
+
 
 class MetaPrompt:
     """
@@ -40,7 +106,10 @@ class MetaPrompt:
         self._source = dedent(source)
         self._template_args = args
         self._template_kargs = kargs
-        self.template = Template(self._source, *args, **kargs)
+        self.template = compile_template(self._source, *args, **kargs)
+        # Incremented when the source changes, so that renderings cached by the pipelines are dropped
+        self.version = 0
+        self._variables = None
 
     def copy(self):
         """
@@ -52,7 +121,10 @@ class MetaPrompt:
         Returns:
             MetaPrompt: A copy of the meta-prompt.
         """
-        return MetaPrompt(self._source, *self._template_args, **self._template_kargs)
+        # The compiled template is shared, it is never modified
+        clone = copy.copy(self)
+        clone.version = 0
+        return clone
 
     @property
     def source(self):
@@ -64,23 +136,28 @@ class MetaPrompt:
     @source.setter
     def source(self, value):
         self._source = dedent(value)
-        self.template = Template(self._source, *self._template_args, **self._template_kargs)
+        self.template = compile_template(self._source, *self._template_args, **self._template_kargs)
+        self.version += 1
+        self._variables = None
+
+    @property
+    def variables(self) -> frozenset:
+        """
+        Names of the variables read by the template.
+        """
+        if self._variables is None:
+            ast = self.template.environment.parse(self._source)
+            self._variables = frozenset(meta.find_undeclared_variables(ast))
+        return self._variables
 
     def render(self, *args, **kargs):
         """
         Render the template with the given arguments.
 
-        Removes empty lines associated to {% if ...  %} that append to be false. 
+        Removes empty lines associated to {% if ...  %} that append to be false.
+        This is done by the compiled template itself, see `collapse_blank_lines`.
         """
-        raw_rendering = self.template.render(*args, **kargs)
-        lines = raw_rendering.split("\n")
-        cleaned_lines = [lines[0]]
-        for l in lines[1:]:
-            if len(l.strip()) == 0 and len(cleaned_lines[-1].strip()) == 0:
-                pass
-            else:
-                cleaned_lines.append(l)
-        return "\n".join(cleaned_lines)
+        return self.template.render(*args, **kargs)
 
     def __str__(self):
         return self.source
@@ -165,3 +242,16 @@ USER_CALL_META_PROMPT = MetaPrompt(
     {% if variables_initialization %}# Values of parameters to be used
     {{ variables_initialization }}{% endif %}
     {{ function_name }}({{ function_call_arguments }})""")
+
+PACKED_CALLS_META_PROMPT = MetaPrompt(
+    """\
+    Answer each of the {{ call_count }} calls below on its own, as if it was the only one.
+    Return one ```python block per call, in the order of the calls, each starting with a comment giving the number of its call:
+    ```python
+    # 1
+    ...return value of call 1...
+    ```
+    {% for call in calls %}
+    # Call {{ loop.index }}
+    {{ call }}
+    {% endfor %}""")
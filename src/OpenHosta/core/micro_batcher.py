@@ -0,0 +1,140 @@
+"""
+Micro-batching of small concurrent embedding calls.
+
+Embedding one text per request (fuzzy lookups in a web service, `SemanticSet.add`...)
+wastes a round trip per text. The batcher holds small calls for up to `max_wait`
+seconds or `max_batch_size` texts, sends them as one request and gives each caller
+its own vectors back.
+
+```
+model = OpenAICompatibleModel(model_name="gpt-4o", embedding_batcher=EmbeddingBatcher(max_wait=0.005))
+```
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from .metrics import Histogram, LATENCY_BUCKETS, SIZE_BUCKETS
+
+EmbedCall = Callable[[List[str]], List[List[float]]]
+
+
+class _Batch:
+    def __init__(self, send: EmbedCall):
+        self.send = send
+        self.texts: List[str] = []
+        # One (future, start, end) slice of `texts` per caller
+        self.callers: List[Tuple[Future, int, int]] = []
+        self.full = threading.Event()
+
+
+class EmbeddingBatcher:
+    """
+    Group small embed() calls of many threads or coroutines into one API request.
+
+    Args:
+        max_wait: Seconds the first call of a batch waits for others.
+        max_batch_size: A batch is sent as soon as it holds this many texts. Larger calls are not batched.
+        max_workers: Threads sending the batches opened by coroutines.
+    """
+
+    def __init__(self, max_wait: float = 0.005, max_batch_size: int = 64, max_workers: int = 4):
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._open: Dict[Any, _Batch] = {}
+        self._executor: ThreadPoolExecutor|None = None
+
+        # Texts per API request, and seconds from submission to result for each caller
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.latencies = Histogram(LATENCY_BUCKETS)
+
+    def _join(self, key: Any, texts: List[str], send: EmbedCall) -> Tuple[_Batch, Future, bool]:
+        """Add `texts` to the open batch of `key`. Returns the batch, the caller future and whether the caller opened it."""
+        with self._lock:
+            batch = self._open.get(key)
+            opened = batch is None
+            if opened:
+                batch = self._open[key] = _Batch(send)
+            future = Future()
+            batch.callers.append((future, len(batch.texts), len(batch.texts) + len(texts)))
+            batch.texts.extend(texts)
+            if len(batch.texts) >= self.max_batch_size:
+                # Closed: the next call opens a new batch
+                del self._open[key]
+                batch.full.set()
+            return batch, future, opened
+
+    def _flush(self, key: Any, batch: _Batch):
+        batch.full.wait(self.max_wait)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+
+        self.batch_sizes.observe(len(batch.texts))
+        try:
+            vectors = batch.send(batch.texts)
+        except BaseException as e:
+            for future, _, _ in batch.callers:
+                future.set_exception(e)
+            return
+        for future, start, end in batch.callers:
+            future.set_result(vectors[start:end])
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embedding-batcher")
+            return self._executor
+
+    def embed(self, key: Any, texts: List[str], send: EmbedCall) -> List[List[float]]:
+        """
+        Embed `texts` in the batch of `key`, sent with `send` by the caller that opened it.
+
+        Args:
+            key: Calls are only batched with calls of the same key (model and embedding arguments).
+            send: Embeds a whole batch, in order.
+        """
+        start = time.perf_counter()
+        batch, future, opened = self._join(key, texts, send)
+        if opened:
+            self._flush(key, batch)
+        vectors = future.result()
+        self.latencies.observe(time.perf_counter() - start)
+        return vectors
+
+    async def embed_async(self, key: Any, texts: List[str], send: EmbedCall) -> List[List[float]]:
+        """Async version of `embed`: batches opened by coroutines are sent from a worker thread."""
+        start = time.perf_counter()
+        batch, future, opened = self._join(key, texts, send)
+        if opened:
+            self._get_executor().submit(self._flush, key, batch)
+        vectors = await asyncio.shield(asyncio.wrap_future(future))
+        self.latencies.observe(time.perf_counter() - start)
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batch_sizes.count,
+            "calls": self.latencies.count,
+            "mean_batch_size": self.batch_sizes.mean(),
+            "p50_latency": self.latencies.quantile(0.5),
+            "p99_latency": self.latencies.quantile(0.99),
+        }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return f"EmbeddingBatcher(max_wait={self.max_wait}, max_batch_size={self.max_batch_size})"
@@ -0,0 +1,204 @@
+"""
+Latency- and cost-aware choice of the model answering a call.
+
+The router keeps rolling statistics of each model of a pipeline, fed by the responses
+going through `pull()`: latency, tokens per second, error rate and price per token.
+Among the models having the capabilities a call requires, it picks the one best
+fitting the routing policy of the call:
+
+```
+router = ModelRouter(prices={"gpt-4o": (2.50, 10.00), "gpt-4o-mini": (0.15, 0.60)})
+pipeline = OneTurnConversationPipeline(model_list=[gpt_4o, gpt_4o_mini], router=router)
+
+def summarize(text: str) -> str:
+    \"""Summarize the text.\"""
+    return emulate(pipeline=pipeline, force_llm_args={"routing_policy": RoutingPolicy("cost", latency_slo=2.0)})
+```
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import weakref
+
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .load_balancer import is_endpoint_failure
+
+OBJECTIVES = ("first", "latency", "cost")
+# Short names accepted as routing_policy
+_NAMED_POLICIES = {"first": "first", "lowest_latency": "latency", "lowest_cost": "cost"}
+
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RoutingPolicy:
+    """
+    How the router ranks the capable models of a call.
+
+    Args:
+        objective: "first" (order of model_list), "latency" (lowest latency quantile) or "cost" (lowest price).
+        latency_slo: Seconds. When set, only models whose latency quantile meets it are ranked,
+            e.g. RoutingPolicy("cost", latency_slo=2.0) is the cheapest model answering in 2 s.
+        quantile: Latency quantile used by the objective and the SLO.
+        max_error_rate: Models failing more often are avoided while another model is usable.
+    """
+
+    def __init__(self, objective: str = "first", latency_slo: float|None = None,
+                 quantile: float = 0.95, max_error_rate: float = 0.5):
+        objective = _NAMED_POLICIES.get(objective, objective)
+        if objective not in OBJECTIVES:
+            raise ValueError(f"[RoutingPolicy] Unknown objective {objective!r}. Use one of {OBJECTIVES}.")
+        self.objective = objective
+        self.latency_slo = latency_slo
+        self.quantile = quantile
+        self.max_error_rate = max_error_rate
+
+    @classmethod
+    def parse(cls, policy) -> "RoutingPolicy":
+        """Accept a RoutingPolicy or one of the names "first", "lowest_latency" and "lowest_cost"."""
+        if policy is None or isinstance(policy, RoutingPolicy):
+            return policy
+        if isinstance(policy, str):
+            return cls(policy)
+        raise TypeError(f"[RoutingPolicy] Invalid routing policy: {policy!r}")
+
+    def __repr__(self):
+        return f"RoutingPolicy({self.objective!r}, latency_slo={self.latency_slo}, quantile={self.quantile})"
+
+
+class ModelStats:
+    """Rolling statistics of the last `window_size` calls of one model."""
+
+    def __init__(self, window_size: int):
+        self.latencies: Deque[float] = collections.deque(maxlen=window_size)
+        self.tokens_per_second: Deque[float] = collections.deque(maxlen=window_size)
+        # True for each failed call
+        self.outcomes: Deque[bool] = collections.deque(maxlen=window_size)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def latency(self, q: float) -> Optional[float]:
+        return _quantile(list(self.latencies), q)
+
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ModelRouter:
+    """
+    Choose among capable models with rolling per-model statistics.
+
+    Args:
+        prices: Price of each model name, as (input, output) per million tokens. Unpriced models rank last on cost.
+        default_policy: Policy of calls that do not set `routing_policy`.
+        window_size: Number of last calls kept per model.
+        min_samples: Calls needed before the latency of a model is trusted. Less measured models
+            are tried first by the latency objective, so that every model gets measured.
+    """
+
+    def __init__(self,
+                 prices: Dict[str, Tuple[float, float]]|None = None,
+                 default_policy="first",
+                 window_size: int = 100,
+                 min_samples: int = 5):
+        self.prices = dict(prices or {})
+        self.default_policy = RoutingPolicy.parse(default_policy)
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._stats: "weakref.WeakKeyDictionary[Any, ModelStats]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _get_stats(self, model) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window_size)
+        return stats
+
+    def record(self, model, latency: float|None, usage: Dict|None = None):
+        """Record a successful call of `model` taking `latency` seconds."""
+        with self._lock:
+            stats = self._get_stats(model)
+            stats.outcomes.append(False)
+            usage = usage or {}
+            stats.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+            completion_tokens = usage.get("completion_tokens", 0) or 0
+            stats.completion_tokens += completion_tokens
+            if latency is not None:
+                stats.latencies.append(latency)
+                if completion_tokens and latency > 0:
+                    stats.tokens_per_second.append(completion_tokens / latency)
+
+    def record_error(self, model, error: BaseException|None = None):
+        """Record a failed call. Errors of the request itself (HTTP 4xx) are not held against the model."""
+        if error is not None and not is_endpoint_failure(error):
+            return
+        with self._lock:
+            self._get_stats(model).outcomes.append(True)
+
+    def price_per_token(self, model) -> Optional[float]:
+        """Blended price of one token of `model`, weighted by the prompt/completion mix seen by the router."""
+        price = self.prices.get(getattr(model, "model_name", None))
+        if price is None:
+            return None
+        prompt = sum(s.prompt_tokens for s in self._stats.values())
+        completion = sum(s.completion_tokens for s in self._stats.values())
+        total = prompt + completion
+        prompt_share = prompt / total if total else 0.5
+        return (price[0] * prompt_share + price[1] * (1 - prompt_share)) / 1_000_000
+
+    def choose(self, models: List[Any], policy=None):
+        """Return the model of `models` best fitting `policy` (the default policy if None)."""
+        policy = RoutingPolicy.parse(policy) or self.default_policy
+        if len(models) == 1 or policy.objective == "first" and policy.latency_slo is None:
+            return models[0]
+
+        with self._lock:
+            stats = {id(model): self._get_stats(model) for model in models}
+            latency = {id(model): stats[id(model)].latency(policy.quantile)
+                       if len(stats[id(model)].latencies) >= self.min_samples else None
+                       for model in models}
+            candidates = [m for m in models if stats[id(m)].error_rate() <= policy.max_error_rate] or list(models)
+
+            if policy.latency_slo is not None:
+                meeting = [m for m in candidates if latency[id(m)] is not None and latency[id(m)] <= policy.latency_slo]
+                # Not measured yet: may meet it
+                unknown = [m for m in candidates if latency[id(m)] is None]
+                if meeting or unknown:
+                    candidates = meeting or unknown
+                else:
+                    # Nobody meets the SLO: the fastest is the closest
+                    return min(candidates, key=lambda m: latency[id(m)])
+
+            if policy.objective == "latency":
+                # Unmeasured models first, so that they get measured
+                return min(candidates, key=lambda m: -1.0 if latency[id(m)] is None else latency[id(m)])
+            if policy.objective == "cost":
+                prices = {id(m): self.price_per_token(m) for m in candidates}
+                return min(candidates, key=lambda m: float("inf") if prices[id(m)] is None else prices[id(m)])
+            return candidates[0]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Statistics of each model, by model name."""
+        with self._lock:
+            result = {}
+            for model, stats in list(self._stats.items()):
+                throughput = list(stats.tokens_per_second)
+                result[getattr(model, "model_name", repr(model))] = {
+                    "calls": len(stats.outcomes),
+                    "error_rate": stats.error_rate(),
+                    "p50_latency": stats.latency(0.5),
+                    "p95_latency": stats.latency(0.95),
+                    "tokens_per_second": sum(throughput) / len(throughput) if throughput else None,
+                    "price_per_token": self.price_per_token(model),
+                }
+            return result
+
+    def __repr__(self):
+        return f"ModelRouter(default_policy={self.default_policy!r}, models={len(self._stats)})"
@@ -0,0 +1,84 @@
+"""
+Incremental decoder of the newline-delimited JSON streams of Ollama.
+
+Ollama streams one JSON object per line, `/api/chat` with the delta in `message.content`
+and `/api/generate` in `response`; the last object has `"done": true` and the token counts:
+
+```
+decoder = NDJSONDeltaDecoder("message")
+for data in response.iter_content(chunk_size=None):
+    for delta in decoder.feed(data):
+        print(delta, end="")
+    if decoder.done:
+        break
+print(decoder.final["eval_count"])
+```
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from .errors import RequestError
+from .json_codec import get_json_codec
+
+
+class NDJSONDeltaDecoder:
+    """
+    Bytes of an Ollama stream in, text deltas out.
+
+    Args:
+        field: "message" for /api/chat streams, "response" for /api/generate streams.
+    """
+
+    def __init__(self, field: str = "message"):
+        self.field = field
+        self._buffer = bytearray()
+        # Position up to which the buffer holds no line end
+        self._scanned = 0
+        # True once the object with "done": true was read
+        self.done = False
+        # Last object of the stream, with the token counts and durations
+        self.final: Dict[str, Any]|None = None
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add the next bytes of the stream. Returns the non-empty deltas of the lines completed by them."""
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b"\n", self._scanned)
+        if end == -1 or self.done:
+            self._scanned = len(buffer)
+            return []
+
+        lines = bytes(buffer[:end])
+        del buffer[:end + 1]
+        self._scanned = len(buffer)
+        return self._decode_lines(lines)
+
+    def flush(self) -> List[str]:
+        """Deltas of the last line, when the stream does not end with a line end."""
+        lines = bytes(self._buffer)
+        self._buffer.clear()
+        self._scanned = 0
+        return [] if self.done else self._decode_lines(lines)
+
+    def _decode_lines(self, lines: bytes) -> List[str]:
+        codec = get_json_codec()
+        deltas = []
+        for line in lines.split(b"\n"):
+            if not line.strip():
+                continue
+            chunk = codec.loads(line)
+            if "error" in chunk:
+                # Errors met after the status line was sent, e.g. the model ran out of memory
+                raise RequestError(f"[NDJSONDeltaDecoder] Ollama error: {chunk['error']}")
+            delta = chunk.get(self.field)
+            if isinstance(delta, dict):
+                delta = delta.get("content")
+            if delta:
+                deltas.append(delta)
+            if chunk.get("done"):
+                self.done = True
+                self.final = chunk
+                break
+        return deltas
@@ -0,0 +1,199 @@
+"""
+Proactive client-side rate limiting.
+
+Providers enforce requests-per-minute (RPM) and tokens-per-minute (TPM) quotas.
+Instead of bouncing off them with 429 errors, a `RateLimiter` attached to a model
+delays each call until both budgets allow it:
+
+```
+model.rate_limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=30_000)
+```
+
+Token usage is estimated from the request size before the call, then corrected
+with the `usage` field of the response.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from typing import Any, Dict, Optional
+
+# Rough token cost of an image attached to a request (OpenAI high detail is 85 + 170 per 512px tile)
+IMAGE_TOKENS_ESTIMATE = 765
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Callers reserve their amount immediately, possibly putting the bucket in debt,
+    and are told how long to wait before the amount is actually available.
+    Waiting callers are therefore served in order without polling.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        if rate_per_second <= 0:
+            raise ValueError("TokenBucket rate must be positive.")
+        self.rate_per_second = float(rate_per_second)
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` from the bucket and return the number of seconds to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+            if self.level >= 0:
+                return 0.0
+            return -self.level / self.rate_per_second
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take (negative) `amount` without waiting, e.g. to fix an estimate."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by every caller of a model.
+
+    Works for synchronous calls, calls running on the model thread pool and asyncio calls.
+
+    Args:
+        requests_per_minute: Request budget. None for no limit.
+        tokens_per_minute: Token budget (prompt + completion). None for no limit.
+        burst_seconds: Size of each bucket in seconds of budget. Providers usually enforce
+            quotas on short windows (60,000 RPM is often enforced as 1,000 requests per second).
+        expected_completion_tokens: Completion size assumed when `max_tokens` is not set.
+        chars_per_token: Ratio used to estimate prompt tokens from text length.
+    """
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 burst_seconds: float = 1.0,
+                 expected_completion_tokens: int = 256,
+                 chars_per_token: float = 4.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.expected_completion_tokens = expected_completion_tokens
+        self.chars_per_token = chars_per_token
+
+        self.requests_bucket = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60
+            self.requests_bucket = TokenBucket(rate, max(1.0, rate * burst_seconds))
+
+        self.tokens_bucket = None
+        if tokens_per_minute:
+            rate = tokens_per_minute / 60
+            self.tokens_bucket = TokenBucket(rate, max(1.0, rate * burst_seconds))
+
+        # Counters
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.delayed_calls = 0
+        self.total_wait_time = 0.0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+
+    def _count_tokens(self, payload: Any) -> float:
+        if payload is None:
+            return 0
+        if isinstance(payload, str):
+            if payload.startswith("data:image/"):
+                return IMAGE_TOKENS_ESTIMATE
+            return len(payload) / self.chars_per_token
+        if isinstance(payload, dict):
+            return sum(self._count_tokens(v) for k, v in payload.items() if k not in ("role", "type"))
+        if isinstance(payload, (list, tuple)):
+            return sum(self._count_tokens(v) for v in payload)
+        return 0
+
+    def estimate_tokens(self, payload: Any, llm_args: Dict[str, Any] = {}) -> int:
+        """
+        Estimate the token cost of a request before sending it.
+
+        Args:
+            payload: Chat messages, list of texts to embed or prompt string.
+            llm_args: API parameters of the call (used for `max_tokens`).
+        """
+        completion_tokens = llm_args.get("max_tokens") or llm_args.get("max_completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = self.expected_completion_tokens if isinstance(payload, list) and payload and isinstance(payload[0], dict) else 0
+        return int(self._count_tokens(payload)) + 1 + int(completion_tokens)
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = 0.0
+        if self.requests_bucket is not None:
+            wait = max(wait, self.requests_bucket.reserve(1))
+        if self.tokens_bucket is not None:
+            wait = max(wait, self.tokens_bucket.reserve(estimated_tokens))
+
+        with self._lock:
+            self.calls += 1
+            self.estimated_tokens += estimated_tokens
+            if wait > 0:
+                self.delayed_calls += 1
+                self.total_wait_time += wait
+        return wait
+
+    def acquire(self, estimated_tokens: int = 0) -> float:
+        """Block the calling thread until the call fits in the budgets. Returns the time waited."""
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, estimated_tokens: int = 0) -> float:
+        """Wait, without blocking the event loop, until the call fits in the budgets."""
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_usage(self, estimated_tokens: int, usage: Optional[Dict[str, Any]]):
+        """Correct the token budget with the `usage` returned by the API."""
+        if not usage or "total_tokens" not in usage:
+            return
+        actual = int(usage["total_tokens"])
+        with self._lock:
+            self.actual_tokens += actual
+        if self.tokens_bucket is not None:
+            self.tokens_bucket.adjust(estimated_tokens - actual)
+
+    def record_streamed_usage(self, estimated_tokens: int, payload: Any, streamed_chars: int):
+        """
+        Correct the token budget of a streamed call.
+
+        Streams carry no `usage`: the completion size is estimated from the streamed text.
+        """
+        prompt_tokens = int(self._count_tokens(payload)) + 1
+        self.record_usage(estimated_tokens, {"total_tokens": prompt_tokens + int(streamed_chars / self.chars_per_token)})
+
+    def refund(self, estimated_tokens: int):
+        """Give back the tokens reserved for a call that failed before using them."""
+        if self.tokens_bucket is not None:
+            self.tokens_bucket.adjust(estimated_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "delayed_calls": self.delayed_calls,
+            "total_wait_time": self.total_wait_time,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+        }
+
+    def __repr__(self):
+        return f"RateLimiter(requests_per_minute={self.requests_per_minute}, tokens_per_minute={self.tokens_per_minute})"
@@ -0,0 +1,196 @@
+"""
+Retry policy of model API calls.
+
+Failed calls are retried with exponential backoff and decorrelated jitter, so that
+threads failing together do not retry together. Delays requested by the server
+(`Retry-After`, `x-ratelimit-reset-*` headers) are honored.
+
+```
+model.retry_policy = RetryPolicy(max_attempts=6, max_delay=30)
+emulate(force_llm_args={"retry_policy": RetryPolicy(max_attempts=1)})  # per call
+```
+"""
+
+from __future__ import annotations
+
+import random
+import re
+import socket
+import time
+
+from email.utils import parsedate_to_datetime
+from typing import Any, Iterable, Optional
+
+from .errors import ApiKeyError, RateLimitError, RequestError
+
+# Request timeout, conflict, too early, rate limit and transient server errors
+DEFAULT_RETRY_STATUS = (408, 409, 425, 429, 500, 502, 503, 504)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse a delay sent by an API into seconds.
+
+    Accepts plain seconds ("20", "0.5"), Go style durations used by OpenAI
+    ("1s", "6m0s", "20ms", "1h2m3.5s") and HTTP dates.
+    Returns None if the value cannot be parsed.
+    """
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        factors = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+        return sum(float(number) * factors[unit] for number, unit in parts)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """
+    Return the delay (seconds) requested by the rate limit headers of a response, or None.
+
+    `Retry-After` wins. Otherwise the `x-ratelimit-reset-*` headers of exhausted
+    budgets (`x-ratelimit-remaining-*` at 0) are used. When the exhausted budget is
+    unknown, the earliest reset is used: the longest one (e.g. a token budget resetting
+    in 6 minutes) is often not the one that was exceeded.
+    """
+    if headers is None:
+        return None
+
+    if "retry-after-ms" in headers:
+        delay = parse_duration(headers["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    if "Retry-After" in headers:
+        return parse_duration(headers["Retry-After"])
+
+    resets = {}
+    for budget in ("requests", "tokens"):
+        if f"x-ratelimit-reset-{budget}" in headers:
+            delay = parse_duration(headers[f"x-ratelimit-reset-{budget}"])
+            if delay is not None:
+                resets[budget] = delay
+    if not resets:
+        return None
+
+    exhausted = [budget for budget in resets
+                 if str(headers.get(f"x-ratelimit-remaining-{budget}", "")).strip() == "0"]
+    if exhausted:
+        return max(resets[budget] for budget in exhausted)
+    return min(resets.values())
+
+
+def _connection_error_types() -> tuple:
+    types = [ConnectionError, TimeoutError]
+    try:
+        import requests
+        types += [requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                  requests.exceptions.ChunkedEncodingError]
+    except ImportError:
+        pass
+    try:
+        import httpx
+        types += [httpx.TransportError]
+    except ImportError:
+        pass
+    return tuple(types)
+
+
+def _is_name_resolution_error(error: BaseException) -> bool:
+    """True if `error` was caused by a DNS failure: a wrong base_url is not worth a retry."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, socket.gaierror) or type(error).__name__ == "NameResolutionError":
+            return True
+        reason = getattr(error, "reason", None)
+        if isinstance(reason, BaseException):
+            error = reason
+        elif error.args and isinstance(error.args[0], BaseException):
+            error = error.args[0]
+        else:
+            error = error.__cause__ or error.__context__
+    return False
+
+
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a failed API call.
+
+    Args:
+        max_attempts: Total number of attempts, including the first one. 1 disables retries.
+        initial_delay: First backoff delay in seconds.
+        max_delay: Upper bound of the backoff delay. Longer delays requested by the server are clamped to it.
+        retry_on_status: HTTP status codes worth a retry.
+        retry_on_connection_errors: Retry connection resets and timeouts. DNS failures are never retried.
+        respect_retry_after: Wait for the delay requested by the server when it sends one.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 4,
+                 initial_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 retry_on_status: Iterable[int] = DEFAULT_RETRY_STATUS,
+                 retry_on_connection_errors: bool = True,
+                 respect_retry_after: bool = True):
+        self.max_attempts = max(1, int(max_attempts))
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.retry_on_status = set(retry_on_status)
+        self.retry_on_connection_errors = retry_on_connection_errors
+        self.respect_retry_after = respect_retry_after
+        self._connection_errors = _connection_error_types()
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, ApiKeyError):
+            return False
+        if isinstance(error, RequestError):
+            status_code = error.status_code
+            if status_code is None and isinstance(error, RateLimitError):
+                status_code = 429
+            if status_code is not None:
+                return status_code in self.retry_on_status
+            # Adapters wrap transport errors in RequestError
+            error = error.__cause__ or error
+        return self.retry_on_connection_errors and \
+            isinstance(error, self._connection_errors) and \
+            not _is_name_resolution_error(error)
+
+    def backoff(self, previous_delay: float) -> float:
+        """Decorrelated jitter: random delay between `initial_delay` and 3 times the previous one."""
+        previous_delay = max(previous_delay, self.initial_delay)
+        return min(self.max_delay, random.uniform(self.initial_delay, previous_delay * 3))
+
+    def next_delay(self, error: BaseException, attempt: int, previous_delay: float = 0.0) -> Optional[float]:
+        """
+        Delay before the next attempt, or None if `error` must be raised.
+
+        Args:
+            error: Exception raised by attempt number `attempt` (starting at 1).
+            previous_delay: Delay returned for the previous attempt (0 for the first one).
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+
+        delay = self.backoff(previous_delay)
+        retry_after = getattr(error, "retry_after", None)
+        if self.respect_retry_after and retry_after is not None:
+            # Small jitter so that callers told to wait the same delay do not come back together
+            delay = min(retry_after, self.max_delay) + self.jitter()
+        return delay
+
+    def jitter(self) -> float:
+        """Random extra delay added to waits shared by several callers."""
+        return random.uniform(0, self.initial_delay)
+
+    def __repr__(self):
+        return f"RetryPolicy(max_attempts={self.max_attempts}, initial_delay={self.initial_delay}, max_delay={self.max_delay})"
@@ -0,0 +1,101 @@
+"""
+Single-flight de-duplication of identical in-flight calls.
+
+While a call is running, identical calls (same key) do not start their own: they wait
+for the first one and get a copy of its response, or its exception. This avoids a
+stampede of identical API calls when many threads or coroutines ask the same question
+at the same moment.
+
+```
+model = OpenAICompatibleModel(model_name="gpt-4o", single_flight=SingleFlight())
+```
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import threading
+
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Share the result of in-flight calls between identical callers, threads and coroutines alike.
+
+    Results are deep-copied for each follower, so that callers may modify their response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (future of the leader, thread ident of the leader)
+        self._in_flight: Dict[str, Tuple[Future, int]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str, blocking: bool) -> Tuple[Future, bool]:
+        """Return the future of the call in flight for `key`, and whether the caller must run it."""
+        with self._lock:
+            self.calls += 1
+            entry = self._in_flight.get(key)
+            # A thread blocked on a call it is itself running (e.g. in its event loop) would never wake up
+            if entry is not None and not (blocking and entry[1] == threading.get_ident()):
+                self.coalesced += 1
+                return entry[0], False
+            future = Future()
+            if entry is None:
+                self._in_flight[key] = (future, threading.get_ident())
+            return future, True
+
+    def _finish(self, key: str, future: Future):
+        with self._lock:
+            entry = self._in_flight.get(key)
+            if entry is not None and entry[0] is future:
+                del self._in_flight[key]
+
+    def do(self, key: str, call: Callable[[], Any]) -> Any:
+        """Run `call`, unless an identical call is in flight: then wait for its result."""
+        future, leader = self._join(key, blocking=True)
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of `do`. Followers may run on other threads and event loops."""
+        future, leader = self._join(key, blocking=False)
+        if not leader:
+            # Shielded: a cancelled follower must not cancel the call of the others
+            return copy.deepcopy(await asyncio.shield(asyncio.wrap_future(future)))
+
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": self.in_flight()}
+
+    def __repr__(self):
+        return f"SingleFlight(calls={self.calls}, coalesced={self.coalesced})"
@@ -0,0 +1,91 @@
+"""
+Incremental decoder of the Server-Sent Events streams of chat completions.
+
+The decoder is fed with the bytes read from the connection, whatever their boundaries,
+and returns the text deltas of the events completed so far:
+
+```
+decoder = SSEDeltaDecoder()
+for data in response.iter_content(chunk_size=None):
+    for delta in decoder.feed(data):
+        print(delta, end="")
+    if decoder.done:
+        break
+```
+
+The complete lines of the byte buffer are matched in one regular expression pass and
+only the `content` string of the `delta` object is copied out and decoded; the whole
+chunk is parsed with the JSON codec only when its layout is not the usual one.
+"""
+
+from __future__ import annotations
+
+import re
+
+from json.decoder import scanstring
+from typing import List
+
+from .json_codec import get_json_codec
+
+# One "data:" line. Groups: end of stream, content string of the delta (the usual layout,
+# the role may come first), or any other data, parsed with the JSON codec.
+_EVENT = re.compile(
+    rb'^data:[ \t]*(?:'
+    rb'(\[DONE\])'
+    rb'|[^\n]*?"delta"[ \t]*:[ \t]*\{[ \t]*(?:"role"[ \t]*:[ \t]*"[a-z]*"[ \t]*,[ \t]*)?'
+    rb'"content"[ \t]*:[ \t]*(?:"([^"\\\n]*(?:\\.[^"\\\n]*)*)"|null)'
+    rb'|([^\n]*))',
+    re.MULTILINE)
+
+
+class SSEDeltaDecoder:
+    """Bytes of an OpenAI-compatible SSE stream in, text deltas out."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Position up to which the buffer holds no line end
+        self._scanned = 0
+        # True once the "data: [DONE]" event was read
+        self.done = False
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add the next bytes of the stream. Returns the non-empty deltas of the lines completed by them."""
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b"\n", self._scanned)
+        if end == -1 or self.done:
+            self._scanned = len(buffer)
+            return []
+
+        deltas = []
+        for match in _EVENT.finditer(buffer, 0, end + 1):
+            done, content, other = match.groups()
+            if done:
+                self.done = True
+                break
+            if content:
+                # Escaped characters are rare: let the C string scanner of json decode them
+                delta = scanstring(content.decode("utf-8") + '"', 0)[0] if b"\\" in content else content.decode("utf-8")
+            elif other is not None:
+                delta = _parse_chunk(other)
+            else:
+                continue
+            if delta:
+                deltas.append(delta)
+        del buffer[:end + 1]
+        self._scanned = len(buffer)
+        return deltas
+
+
+def _parse_chunk(data: bytes) -> str:
+    try:
+        chunk = get_json_codec().loads(data)
+    except ValueError:
+        return ""
+    if not isinstance(chunk, dict):
+        return ""
+    return (
+        (chunk.get("choices") or [{}])[0]
+             .get("delta", {})
+             .get("content") or ""
+    )
@@ -0,0 +1,308 @@
+"""
+Offline batch execution of an emulated function over many inputs.
+
+Every call is rendered with the pipeline `push()`, written to a JSONL file in the
+OpenAI Batch format and submitted to the `/files` and `/batches` endpoints of the
+model. Once the batch is done, each answer goes through `pull()`:
+
+```
+def classify(review: str) -> Sentiment:
+    \"""Return the sentiment of the review.\"""
+    return emulate()
+
+sentiments = emulate_batch(classify, reviews, workdir="runs/classify-2024-06-01")
+```
+
+Rows that fail (API error or unparsable answer) are sent again in a new batch, up to
+`max_row_retries` times. The work directory keeps the submitted batches and the
+received answers, so that a run interrupted at any point resumes where it stopped.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import copy
+import hashlib
+import json
+import os
+import time
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..core.errors import RequestError, UncertaintyError
+from ..core.inspection import Inspection
+
+# Batch statuses after which results will not change
+_FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+_capturing_batch: contextvars.ContextVar[bool] = contextvars.ContextVar("capturing_batch", default=False)
+
+
+class BatchError(Exception):
+    """ Raised when some rows of a batch still fail after their retries """
+
+    def __init__(self, message: str, results: List[Any], errors: Dict[int, str]):
+        super().__init__(message)
+        # Results in input order (None for failed rows) and error of each failed row index
+        self.results = results
+        self.errors = errors
+
+
+class BatchCapture(BaseException):
+    """
+    Raised by emulate() instead of calling the model while a BatchRunner renders its rows.
+
+    Derived from BaseException so that `except Exception` blocks of the emulated function do not catch it.
+    """
+
+    def __init__(self, pipeline, inspection: Inspection, force_llm_args: dict):
+        super().__init__("emulate() call captured for batch execution")
+        self.pipeline = pipeline
+        self.inspection = inspection
+        self.force_llm_args = force_llm_args
+
+
+def is_capturing_batch() -> bool:
+    return _capturing_batch.get()
+
+
+def row_call_args(row: Any):
+    """Positional and keyword arguments of a row: a tuple of positional arguments, a dict of keyword arguments or a single argument."""
+    if isinstance(row, dict):
+        return (), row
+    if isinstance(row, tuple):
+        return row, {}
+    return (row,), {}
+
+
+class _Row:
+    def __init__(self, index: int, pipeline, inspection: Inspection, line: Dict[str, Any]):
+        self.index = index
+        self.pipeline = pipeline
+        self.inspection = inspection
+        self.line = line
+
+    @property
+    def custom_id(self) -> str:
+        return self.line["custom_id"]
+
+
+class BatchRunner:
+    """
+    Run an emulated function over many inputs through the OpenAI Batch API.
+
+    Args:
+        function: Function calling `emulate()` (not a generator).
+        workdir: Directory holding the state of the run. Reuse it to resume an interrupted run.
+        completion_window: Batch completion window requested to the API.
+        poll_interval: Seconds between two status checks of a running batch.
+        max_row_retries: Number of new batches a failed row can be sent in.
+        timeout: Seconds after which `run` gives up waiting for a batch. None waits forever.
+    """
+
+    def __init__(self,
+                 function: Callable,
+                 workdir: str,
+                 completion_window: str = "24h",
+                 poll_interval: float = 30.0,
+                 max_row_retries: int = 2,
+                 timeout: Optional[float] = None):
+        self.function = function
+        self.workdir = workdir
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.max_row_retries = max_row_retries
+        self.timeout = timeout
+
+    # --- Rendering ---
+
+    def _call_args(self, row: Any):
+        return row_call_args(row)
+
+    def render(self, rows: Iterable[Any]) -> List[_Row]:
+        """Call the function on each row and capture its rendered request instead of sending it."""
+        rendered = []
+        token = _capturing_batch.set(True)
+        try:
+            for index, row in enumerate(rows):
+                args, kwargs = self._call_args(row)
+                try:
+                    self.function(*args, **kwargs)
+                except BatchCapture as capture:
+                    rendered.append(self._render_capture(index, capture))
+                else:
+                    raise ValueError(f"[BatchRunner] {self.function.__name__} returned without calling emulate().")
+        finally:
+            _capturing_batch.reset(token)
+        return rendered
+
+    def _render_capture(self, index: int, capture: BatchCapture) -> _Row:
+        inspection = capture.inspection
+        inspection.routing_policy = capture.force_llm_args.get("routing_policy")
+        messages = capture.pipeline.push(inspection)
+        llm_args = {k: v for k, v in (inspection.force_llm_args | capture.force_llm_args).items() if k != "routing_policy"}
+
+        model = inspection.model
+        if not hasattr(model, "batch_request_line"):
+            raise ValueError(f"[BatchRunner] {type(model).__name__} does not support the Batch API.")
+        line = model.batch_request_line(f"row-{index}", messages, **llm_args)
+
+        # pull() of this row needs the analyse of this call, not of the last one
+        row_inspection = copy.copy(inspection)
+        row_inspection.logs = {}
+        row_inspection.frame = None
+        return _Row(index, capture.pipeline, row_inspection, line)
+
+    # --- State of the work directory ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.workdir, name)
+
+    def _load_state(self, fingerprint: str) -> Dict[str, Any]:
+        os.makedirs(self.workdir, exist_ok=True)
+        state = {"fingerprint": fingerprint, "attempts": {}, "batches": []}
+        if os.path.exists(self._path("state.json")):
+            with open(self._path("state.json"), "r", encoding="utf-8") as file:
+                state = json.load(file)
+            if state["fingerprint"] != fingerprint:
+                raise ValueError(f"[BatchRunner] {self.workdir} holds the state of another run.")
+        return state
+
+    def _save_state(self, state: Dict[str, Any]):
+        temporary = self._path("state.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temporary, self._path("state.json"))
+
+    def _load_answers(self) -> Dict[str, Any]:
+        answers = {}
+        if os.path.exists(self._path("answers.jsonl")):
+            with open(self._path("answers.jsonl"), "r", encoding="utf-8") as file:
+                for line in file:
+                    # A run killed while writing leaves a truncated last line
+                    try:
+                        answer = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    answers[answer["custom_id"]] = answer["response"]
+        return answers
+
+    def _append_answers(self, answers: Dict[str, Any]):
+        with open(self._path("answers.jsonl"), "a", encoding="utf-8") as file:
+            for custom_id, response in answers.items():
+                file.write(json.dumps({"custom_id": custom_id, "response": response}) + "\n")
+
+    # --- Execution ---
+
+    def run(self, rows: Iterable[Any]) -> List[Any]:
+        """
+        Return the typed results of the function over `rows`, in input order.
+
+        A row is a tuple of positional arguments, a dict of keyword arguments, or a single argument.
+
+        Raises:
+            BatchError: Some rows still failed after `max_row_retries` new batches.
+        """
+        rendered = self.render(rows)
+        by_id = {row.custom_id: row for row in rendered}
+        fingerprint = hashlib.sha256(
+            "\n".join(json.dumps(row.line, sort_keys=True) for row in rendered).encode("utf-8")).hexdigest()
+
+        state = self._load_state(fingerprint)
+        answers = self._load_answers()
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+
+        while True:
+            self._pull_answers(by_id, answers, results, errors, state)
+            pending = [row for row in rendered
+                       if row.custom_id not in results
+                       and state["attempts"].get(row.custom_id, 0) <= self.max_row_retries]
+            running = [batch for batch in state["batches"] if not batch.get("collected")]
+            if not pending and not running:
+                break
+
+            batch = running[0] if running else self._submit(pending, state)
+            model = by_id[batch["rows"][0]].inspection.model
+            new_answers = self._wait_and_collect(model, batch, errors)
+            self._append_answers(new_answers)
+            answers.update(new_answers)
+            batch["collected"] = True
+            self._save_state(state)
+
+        ordered = [results.get(row.custom_id) for row in rendered]
+        failed = {row.index: errors.get(row.custom_id, "No answer") for row in rendered if row.custom_id not in results}
+        if failed:
+            raise BatchError(f"[BatchRunner] {len(failed)} rows failed after {self.max_row_retries} retries.",
+                             ordered, failed)
+        return ordered
+
+    def _pull_answers(self, by_id, answers, results, errors, state):
+        """Type the answers not yet typed. Unparsable answers are dropped, so that their row is sent again."""
+        for custom_id, response in list(answers.items()):
+            if custom_id in results or custom_id not in by_id:
+                continue
+            row = by_id[custom_id]
+            try:
+                results[custom_id] = row.pipeline.pull(row.inspection, response)
+                errors.pop(custom_id, None)
+            except (ValueError, TypeError, AssertionError, UncertaintyError) as e:
+                errors[custom_id] = f"{type(e).__name__}: {e}"
+                del answers[custom_id]
+
+    def _submit(self, pending: List[_Row], state: Dict[str, Any]) -> Dict[str, Any]:
+        number = len(state["batches"]) + 1
+        path = self._path(f"batch-{number}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            for row in pending:
+                file.write(json.dumps(row.line) + "\n")
+
+        model = pending[0].inspection.model
+        if any(row.inspection.model is not model for row in pending):
+            raise ValueError("[BatchRunner] All rows of a batch shall use the same model.")
+
+        endpoint = pending[0].line["url"]
+        batch_id = model.create_batch(model.upload_batch_file(path), endpoint, self.completion_window)["id"]
+        for row in pending:
+            state["attempts"][row.custom_id] = state["attempts"].get(row.custom_id, 0) + 1
+        batch = {"id": batch_id, "rows": [row.custom_id for row in pending]}
+        state["batches"].append(batch)
+        self._save_state(state)
+        return batch
+
+    def _wait_and_collect(self, model, batch: Dict[str, Any], errors: Dict[str, str]) -> Dict[str, Any]:
+        start = time.time()
+        while True:
+            status = model.retrieve_batch(batch["id"])
+            if status.get("status") in _FINISHED_STATUSES:
+                break
+            if self.timeout is not None and time.time() - start > self.timeout:
+                raise RequestError(f"[BatchRunner] Batch {batch['id']} still {status.get('status')} "
+                                   f"after {self.timeout}s. Run again with the same workdir to resume.")
+            time.sleep(self.poll_interval)
+
+        answers = {}
+        if status.get("output_file_id"):
+            for line in model.download_file(status["output_file_id"]).decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                output = json.loads(line)
+                response = output.get("response") or {}
+                if response.get("status_code") == 200:
+                    answers[output["custom_id"]] = response["body"]
+                else:
+                    errors[output["custom_id"]] = json.dumps(output.get("error") or response.get("body"))
+        if status.get("error_file_id"):
+            for line in model.download_file(status["error_file_id"]).decode("utf-8").splitlines():
+                if line.strip():
+                    output = json.loads(line)
+                    errors[output["custom_id"]] = json.dumps(output.get("error"))
+        for custom_id in batch["rows"]:
+            if custom_id not in answers and custom_id not in errors:
+                errors[custom_id] = f"Batch {batch['id']} {status.get('status')} without an answer"
+        return answers
+
+
+def emulate_batch(function: Callable, rows: Iterable[Any], workdir: str, **kwargs) -> List[Any]:
+    """Run `function` over `rows` with a BatchRunner. See BatchRunner for the arguments."""
+    return BatchRunner(function, workdir, **kwargs).run(rows)
@@ -81,6 +81,10 @@ def closure_async(
         return response_data
 
     inner_func_pointer = inner_func
+    # Identity of the closure, read by memoize
+    inner_func.__doc__ = query_string
+    if force_return_type is not None:
+        inner_func.__annotations__["return"] = force_return_type
 
     return inner_func
 
@@ -126,6 +130,10 @@ def closure(
         return response_data
     
     inner_func_pointer = inner_func
+    # Identity of the closure, read by memoize
+    inner_func.__doc__ = query_string
+    if force_return_type is not None:
+        inner_func.__annotations__["return"] = force_return_type
 
     return inner_func
 
@@ -8,6 +8,9 @@ from ..core.inspection import get_caller_frame, get_hosta_inspection
 
 from ..pipelines import OneTurnConversationPipeline
 
+from .batch import BatchCapture, is_capturing_batch
+from .map import emulate_amap, emulate_map
+
 
 def emulate(
         *,
@@ -46,6 +49,9 @@ def emulate(
     if is_generator:
         # Return a sync generator; the caller yields it with `yield from emulate()`
         return pipeline.execute_stream(inspection, force_llm_args, item_type)
+    elif is_capturing_batch():
+        # Rendered by a BatchRunner, answered later by the Batch API
+        raise BatchCapture(pipeline, inspection, force_llm_args)
     else:
         # Existing behaviour — synchronous single value
         return pipeline.execute(inspection, force_llm_args)
@@ -88,3 +94,8 @@ def emulate_async(
     else:
         # Return a coroutine object
         return pipeline.execute_async(inspection, force_llm_args)
+
+
+# emulate.map(function, rows) and emulate.amap(function, rows), see exec/map.py
+emulate.map = emulate_map
+emulate.amap = emulate_amap
@@ -108,7 +108,8 @@ def fill_nodes(
         else:
             messages[-1]["content"] = [{'type': 'text', 'text': current_node["text"]}] 
     
-        response_dict = model.api_call(messages, inspection.force_llm_args | force_llm_args | {"logprobs": True, "top_logprobs": 20, "max_tokens": 10})    
+        llm_args = {k: v for k, v in (inspection.force_llm_args | force_llm_args).items() if k != "routing_policy"}
+        response_dict = model.api_call(messages, llm_args | {"logprobs": True, "top_logprobs": 20, "max_tokens": 10})    
 
         if not "logprobs" in response_dict["choices"][0]:
             # Most likely an empty answer: terminal node
@@ -0,0 +1,237 @@
+"""
+Concurrent execution of an emulated function or closure over many inputs.
+
+At most `max_concurrency` calls are in flight, and a new one starts as soon as one ends
+(a sliding window, where BatchDataContext waits for each whole chunk). The limit defaults
+to the `max_async_calls` of the model of the pipeline:
+
+```
+def classify(review: str) -> Sentiment:
+    \"""Return the sentiment of the review.\"""
+    return emulate()
+
+sentiments = emulate.map(classify, reviews, timeout=30, on_progress=lambda done, total: print(done, "/", total))
+sentiments = await emulate.amap(classify_async, reviews)
+```
+
+A row is a tuple of positional arguments, a dict of keyword arguments, or a single argument.
+The exception of a failed row (TimeoutError past `timeout`) takes its place in the results,
+unless `return_exceptions=False`. With `ordered=False`, (index, result) pairs are yielded as
+the calls complete.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.inspection import call_scoped_inspection
+from ..pipelines import OneTurnConversationPipeline
+from .batch import row_call_args
+
+ProgressCallback = Callable[[int, int], Any]
+
+
+def default_concurrency(pipeline: Optional[OneTurnConversationPipeline] = None) -> int:
+    """`max_async_calls` of the model the pipeline would choose first."""
+    if pipeline is None:
+        from ..defaults import config
+        pipeline = config.DefaultPipeline
+    model = next((model for model in pipeline.model_list if model.is_available()), pipeline.model_list[0])
+    return model.max_async_calls
+
+
+def _call_row(function: Callable, row: Any) -> Any:
+    args, kwargs = row_call_args(row)
+    token = call_scoped_inspection.set(True)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        call_scoped_inspection.reset(token)
+
+
+def _check_limit(max_concurrency: Optional[int], pipeline) -> int:
+    limit = max_concurrency if max_concurrency is not None else default_concurrency(pipeline)
+    if limit < 1:
+        raise ValueError(f"[emulate.map] max_concurrency shall be at least 1, got {limit}.")
+    return limit
+
+
+def _imap(function: Callable, rows: List[Any], limit: int, timeout: Optional[float],
+          return_exceptions: bool, on_progress: Optional[ProgressCallback]) -> Iterator[Tuple[int, Any]]:
+    total = len(rows)
+    executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="openhosta-map")
+    running = {}       # future -> (index, deadline)
+    abandoned = set()  # futures past their timeout: their request still holds a slot
+    next_index = done = 0
+    try:
+        while next_index < total or running:
+            while next_index < total and len(running) + len(abandoned) < limit:
+                future = executor.submit(contextvars.copy_context().run, _call_row, function, rows[next_index])
+                running[future] = (next_index, time.monotonic() + timeout if timeout is not None else None)
+                next_index += 1
+
+            deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+            wait_time = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            finished, _ = wait(list(running) + list(abandoned), timeout=wait_time, return_when=FIRST_COMPLETED)
+
+            completed = []
+            for future in finished:
+                if future in abandoned:
+                    abandoned.discard(future)
+                    continue
+                index, _ = running.pop(future)
+                completed.append((index, future.exception(), future))
+            now = time.monotonic()
+            for future, (index, deadline) in list(running.items()):
+                if deadline is not None and deadline <= now:
+                    del running[future]
+                    abandoned.add(future)
+                    completed.append((index, TimeoutError(f"[emulate.map] Row {index} took more than {timeout}s."), None))
+
+            for index, error, future in completed:
+                if error is not None and (not return_exceptions or not isinstance(error, Exception)):
+                    raise error
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, total)
+                yield index, error if error is not None else future.result()
+    finally:
+        # Calls past their timeout are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def emulate_map(function: Callable,
+                rows: Iterable[Any],
+                *,
+                max_concurrency: Optional[int] = None,
+                timeout: Optional[float] = None,
+                ordered: bool = True,
+                return_exceptions: bool = True,
+                on_progress: Optional[ProgressCallback] = None,
+                pipeline: Optional[OneTurnConversationPipeline] = None):
+    """
+    Call `function` on each row, with at most `max_concurrency` calls running on threads.
+
+    Args:
+        function: Emulated function or closure.
+        rows: Arguments of each call, see `row_call_args`.
+        max_concurrency: Calls in flight. None uses `max_async_calls` of the model of `pipeline`.
+        timeout: Seconds after which a row fails with TimeoutError. Its call cannot be interrupted
+            and keeps its slot until its request returns.
+        ordered: True returns the results in input order, False an iterator of (index, result)
+            pairs in completion order.
+        return_exceptions: True puts the exception of a failed row in its place, False raises it.
+        on_progress: Called with (done, total) after each row.
+        pipeline: Pipeline giving the default concurrency. None for the default pipeline.
+
+    Returns:
+        The list of results, or an iterator of (index, result) pairs when `ordered` is False.
+    """
+    rows = list(rows)
+    iterator = _imap(function, rows, _check_limit(max_concurrency, pipeline), timeout, return_exceptions, on_progress)
+    if not ordered:
+        return iterator
+    results: List[Any] = [None] * len(rows)
+    for index, result in iterator:
+        results[index] = result
+    return results
+
+
+async def _call_row_async(function: Callable, row: Any) -> Any:
+    if not inspect.iscoroutinefunction(function):
+        # Called from _call_row, whose frame lets emulate() find a local function from the thread
+        return await asyncio.to_thread(_call_row, function, row)
+    args, kwargs = row_call_args(row)
+    # The task runs in a copy of the context
+    call_scoped_inspection.set(True)
+    return await function(*args, **kwargs)
+
+
+async def _aimap(function: Callable, rows: List[Any], limit: int, timeout: Optional[float],
+                 return_exceptions: bool, on_progress: Optional[ProgressCallback]) -> AsyncIterator[Tuple[int, Any]]:
+    total = len(rows)
+    # A coroutine past its timeout is cancelled, a thread is not: its request keeps its slot until it returns
+    cancellable = inspect.iscoroutinefunction(function)
+    running = {}       # task -> (index, deadline)
+    abandoned = set()  # tasks past their timeout, until they end
+    next_index = done = 0
+    try:
+        while next_index < total or running:
+            while next_index < total and len(running) + len(abandoned) < limit:
+                task = asyncio.ensure_future(_call_row_async(function, rows[next_index]))
+                running[task] = (next_index, time.monotonic() + timeout if timeout is not None else None)
+                next_index += 1
+
+            deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+            wait_time = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            finished, _ = await asyncio.wait(set(running) | abandoned, timeout=wait_time,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+            completed = []
+            for task in finished:
+                if task in abandoned:
+                    abandoned.discard(task)
+                    # Retrieved so that asyncio does not log it
+                    task.cancelled() or task.exception()
+                    continue
+                index, _ = running.pop(task)
+                completed.append((index, task.exception(), task))
+            now = time.monotonic()
+            for task, (index, deadline) in list(running.items()):
+                if deadline is not None and deadline <= now:
+                    del running[task]
+                    abandoned.add(task)
+                    if cancellable:
+                        task.cancel()
+                    completed.append((index, TimeoutError(f"[emulate.amap] Row {index} took more than {timeout}s."), None))
+
+            for index, error, task in completed:
+                if error is not None and (not return_exceptions or not isinstance(error, Exception)):
+                    raise error
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, total)
+                yield index, error if error is not None else task.result()
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def _amap_ordered(function: Callable, rows: List[Any], *args) -> List[Any]:
+    results: List[Any] = [None] * len(rows)
+    async for index, result in _aimap(function, rows, *args):
+        results[index] = result
+    return results
+
+
+def emulate_amap(function: Callable,
+                 rows: Iterable[Any],
+                 *,
+                 max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 ordered: bool = True,
+                 return_exceptions: bool = True,
+                 on_progress: Optional[ProgressCallback] = None,
+                 pipeline: Optional[OneTurnConversationPipeline] = None):
+    """
+    Async version of `emulate_map`. Coroutine functions (emulate_async, closure_async) are
+    awaited on the running event loop, other functions run in threads.
+
+    A coroutine past `timeout` is cancelled. A thread cannot be: like in `emulate_map`, it
+    keeps its slot until its request returns, so that `max_concurrency` is never exceeded.
+
+    Returns:
+        A coroutine of the list of results, or an async iterator of (index, result) pairs
+        when `ordered` is False.
+    """
+    rows = list(rows)
+    args = (_check_limit(max_concurrency, pipeline), timeout, return_exceptions, on_progress)
+    if not ordered:
+        return _aimap(function, rows, *args)
+    return _amap_ordered(function, rows, *args)
@@ -0,0 +1,225 @@
+"""
+Memoization of emulated functions whose answer only depends on their arguments.
+
+The typed results are stored under a hash of the function (name, docstring, signature,
+type definitions, meta-prompts and model of the pipeline) and of the argument values, so
+that a hit skips `push`, the request and `pull`. Editing the docstring or a type changes
+the hash and the old entries are no longer read:
+
+```
+@memoize(store=DiskCache("~/.cache/openhosta/country_codes.sqlite", ttl=30 * 24 * 3600))
+def country_code(country: str) -> str:
+    \"""Return the ISO 3166 alpha-2 code of the country.\"""
+    return emulate()
+```
+
+Arguments are hashed by content: dataclasses, Pydantic models, Enums, containers and PIL
+images (by their pixels). Calls with other argument types are not memoized.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import decimal
+import functools
+import hashlib
+import inspect
+import json
+import pathlib
+import pickle
+import threading
+import uuid
+
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import PIL.Image
+except ImportError:
+    # Image arguments are only hashed when Pillow is installed
+    PIL = None
+
+from ..core.analizer import encode_function_signature, hosta_analyze
+from ..core.cache import MemoryCache, make_cache_key
+from ..core.cost_tracker import get_current_cost_tracker
+
+# Values hashed by their string form
+_STRING_VALUE_TYPES = (datetime.date, datetime.time, datetime.timedelta, decimal.Decimal, uuid.UUID, pathlib.PurePath)
+
+
+def _type_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _sort_key(value: Any) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def canonical_value(value: Any) -> Any:
+    """
+    JSON-serializable form of `value` that only depends on its content.
+
+    Raises:
+        TypeError: The value has no stable content hash (e.g. an arbitrary object).
+    """
+    if isinstance(value, Enum):
+        return {"enum": _type_name(type(value)), "value": canonical_value(value.value)}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return {"bytes": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, _STRING_VALUE_TYPES):
+        return {"type": _type_name(type(value)), "value": str(value)}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {"dataclass": _type_name(type(value)),
+                "fields": {field.name: canonical_value(getattr(value, field.name)) for field in dataclasses.fields(value)}}
+    if hasattr(value, "model_dump") and not isinstance(value, type):
+        # Pydantic models
+        return {"model": _type_name(type(value)), "fields": canonical_value(value.model_dump())}
+    if PIL is not None and isinstance(value, PIL.Image.Image):
+        digest = hashlib.sha256(f"{value.mode}|{value.size}".encode("utf-8"))
+        digest.update(value.tobytes())
+        return {"image": digest.hexdigest()}
+    if isinstance(value, dict):
+        items = [[canonical_value(key), canonical_value(item)] for key, item in value.items()]
+        return {"dict": sorted(items, key=lambda item: _sort_key(item[0]))}
+    if isinstance(value, list):
+        return [canonical_value(item) for item in value]
+    if isinstance(value, tuple):
+        return {"tuple": [canonical_value(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"set": sorted((canonical_value(item) for item in value), key=_sort_key)}
+    raise TypeError(f"[memoize] No content hash for a value of type {type(value).__name__}.")
+
+
+class _Memo:
+    """Keys and storage of the results of one memoized function."""
+
+    def __init__(self, function: Callable, store, pipeline):
+        self.function = function
+        self.store = store
+        self.pipeline = pipeline
+        self.signature = inspect.signature(function)
+        self.hits = self.misses = self.bypassed = 0
+        self._lock = threading.Lock()
+        # Encoded signature for the current docstring, and the last function hash
+        self._signature_data = (None, None)
+        self._identity = (None, None)
+
+    def function_key(self) -> str:
+        """Hash of what the prompt of the function is made of, but its argument values."""
+        from ..defaults import config
+
+        pipeline = self.pipeline or config.DefaultPipeline
+        model = next((model for model in pipeline.model_list if model.is_available()), pipeline.model_list[0])
+        doc = self.function.__doc__
+        parts = (doc, pipeline.emulate_meta_prompt.source, pipeline.user_call_meta_prompt.source, model.model_name,
+                 repr(getattr(self.function, "force_template_data", None)))
+        with self._lock:
+            if self._identity[0] == parts:
+                return self._identity[1]
+            if self._signature_data[0] != doc:
+                self._signature_data = (doc, encode_function_signature(hosta_analyze(function_pointer=self.function)))
+            signature_data = self._signature_data[1]
+        identity = make_cache_key("memoize", _type_name(self.function), str(self.signature), signature_data, *parts)
+        with self._lock:
+            self._identity = (parts, identity)
+        return identity
+
+    def key(self, args, kwargs) -> Optional[str]:
+        """Key of a call, None if an argument has no content hash."""
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            arguments = [[name, canonical_value(value)] for name, value in bound.arguments.items()]
+        except TypeError:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        return make_cache_key(self.function_key(), arguments)
+
+    def get(self, key: str):
+        """(True, result) on a hit, (False, None) otherwise."""
+        data = self.store.get(key)
+        if data is not None:
+            try:
+                result = pickle.loads(data)
+            except Exception:
+                # Stored by a version of the classes that cannot be loaded anymore
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        tracker = get_current_cost_tracker()
+        if tracker:
+            tracker.add_cache_hit()
+        return True, result
+
+    def set(self, key: str, result: Any):
+        try:
+            data = pickle.dumps(result)
+        except Exception:
+            return
+        self.store.set(key, data)
+
+    def info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed}
+
+
+def memoize(function: Callable = None,
+            *,
+            store=None,
+            ttl: Optional[float] = None,
+            max_entries: int = 1024,
+            pipeline=None):
+    """
+    Decorator storing the results of an emulated function by argument values.
+
+    Args:
+        function: Function calling `emulate()` or `emulate_async()`, or a closure.
+        store: Store of the results, e.g. DiskCache(path) to keep them across runs. None for a
+            MemoryCache of `max_entries` entries living `ttl` seconds.
+        ttl: Lifetime of the results in the default store. None for no expiry.
+        max_entries: Size of the default store, least recently used results are evicted.
+        pipeline: Pipeline used by the function, whose meta-prompts and model are part of the key.
+            None for the default pipeline.
+
+    The decorated function has a `cache_info()` method counting hits, misses and calls whose
+    arguments could not be hashed.
+    """
+    if function is None:
+        return lambda function: memoize(function, store=store, ttl=ttl, max_entries=max_entries, pipeline=pipeline)
+    if inspect.isgeneratorfunction(function) or inspect.isasyncgenfunction(function):
+        raise TypeError(f"[memoize] {function.__name__} is a generator: its items cannot be memoized.")
+
+    memo = _Memo(function, store if store is not None else MemoryCache(max_entries=max_entries, ttl=ttl), pipeline)
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            key = memo.key(args, kwargs)
+            if key is None:
+                return await function(*args, **kwargs)
+            hit, result = memo.get(key)
+            if not hit:
+                result = await function(*args, **kwargs)
+                memo.set(key, result)
+            return result
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = memo.key(args, kwargs)
+            if key is None:
+                return function(*args, **kwargs)
+            hit, result = memo.get(key)
+            if not hit:
+                result = function(*args, **kwargs)
+                memo.set(key, result)
+            return result
+
+    wrapper.cache_info = memo.info
+    wrapper.cache_store = memo.store
+    return wrapper
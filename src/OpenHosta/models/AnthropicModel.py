@@ -1,9 +1,8 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Set, Tuple
 import os
-import requests
 from ..core.base_model import Model, ModelCapabilities
-from ..core.errors import ApiKeyError, RequestError, RateLimitError
+from ..core.errors import ApiKeyError
 
 class AnthropicModel(Model):
     def __init__(self, 
@@ -15,19 +14,23 @@ class AnthropicModel(Model):
             base_url: str = "https://api.anthropic.com/v1",
             api_key: str = None, 
             timeout: int = 60,
-            retry_delay:int = 60,            
+            retry_delay:int = 60,
+            prompt_caching:bool = True,  # cache_control breakpoint on the system prompt, the same across calls of a function
+            **kwargs,
         ):     
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
             api_parameters=api_parameters,
-            retry_delay=retry_delay
+            retry_delay=retry_delay,
+            **kwargs,
         )
         self.model_name = model_name
         self.base_url = base_url
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
         self.timeout = timeout
         self.capabilities = capabilities
+        self.prompt_caching = prompt_caching
 
     def _get_headers(self) -> Dict[str, str]:
         headers = {
@@ -85,7 +88,10 @@ class AnthropicModel(Model):
             "messages": anthropic_messages,
             "max_tokens": kwargs.get("max_tokens", 4096)
         }
-        if system_prompt:
+        if system_prompt and self.prompt_caching:
+            # Prompts shorter than the minimum cacheable length (1024 tokens on most models) are not cached
+            body["system"] = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        elif system_prompt:
             body["system"] = system_prompt
         
         # Merge other args
@@ -93,33 +99,32 @@ class AnthropicModel(Model):
             if k not in ["max_tokens", "force_json_output"]:
                 body[k] = v
 
-        response = requests.post(
-            f"{self.base_url}/messages",
-            headers=self._get_headers(),
-            json=body,
-            timeout=self.timeout
-        )
+        response = self._post_json(f"{self.get_base_url()}/messages", body, headers=self._get_headers())
+
+        self._raise_for_status(response, "AnthropicModel._generate_without_retry")
 
-        if response.status_code == 200:
-            resp_json = response.json()
-            # Map back to OpenAI-like format for internal consistency
-            text = ""
-            for block in resp_json.get("content", []):
-                if block.get("type") == "text":
-                    text += block.get("text", "")
-            
-            return {
-                "choices": [{"message": {"content": text}}],
-                "usage": {
-                    "total_tokens": resp_json.get("usage", {}).get("input_tokens", 0) + resp_json.get("usage", {}).get("output_tokens", 0),
-                    "prompt_tokens": resp_json.get("usage", {}).get("input_tokens", 0),
-                    "completion_tokens": resp_json.get("usage", {}).get("output_tokens", 0)
-                }
+        resp_json = self._json_response(response)
+        # Map back to OpenAI-like format for internal consistency
+        text = ""
+        for block in resp_json.get("content", []):
+            if block.get("type") == "text":
+                text += block.get("text", "")
+
+        usage = resp_json.get("usage", {})
+        # input_tokens only counts the tokens after the last cache breakpoint
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        cache_creation = usage.get("cache_creation_input_tokens") or 0
+        prompt_tokens = usage.get("input_tokens", 0) + cache_read + cache_creation
+        return {
+            "choices": [{"message": {"content": text}}],
+            "usage": {
+                "total_tokens": prompt_tokens + usage.get("output_tokens", 0),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": usage.get("output_tokens", 0),
+                "prompt_tokens_details": {"cached_tokens": cache_read},
+                "cache_creation_input_tokens": cache_creation,
             }
-        elif response.status_code == 429:
-            raise RateLimitError(f"[AnthropicModel] Rate limit: {response.text}")
-        else:
-            raise RequestError(f"[AnthropicModel] Request failed ({response.status_code}): {response.text}")
+        }
 
     def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
         raise NotImplementedError("Anthropic does not support text-to-image.")
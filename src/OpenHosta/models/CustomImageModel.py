@@ -1,9 +1,7 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Set, Tuple
 import os
-import requests
 from ..core.base_model import Model, ModelCapabilities
-from ..core.errors import RequestError
 
 class CustomImageModel(Model):
     """
@@ -18,11 +16,13 @@ class CustomImageModel(Model):
             capabilities:Set[ModelCapabilities] = {ModelCapabilities.TEXT2IMAGE},
             api_key: str = None, 
             timeout: int = 120,
+            **kwargs,
         ):     
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
-            api_parameters=api_parameters
+            api_parameters=api_parameters,
+            **kwargs,
         )
         self.model_name = "custom-image-gen"
         self.base_url = base_url
@@ -38,19 +38,12 @@ class CustomImageModel(Model):
         body.update(self.api_parameters)
         body.update(kwargs)
         
-        response = requests.post(
-            self.base_url,
-            headers=self.additionnal_headers,
-            json=body,
-            timeout=self.timeout
-        )
+        response = self._post_json(self.get_base_url(), body, headers=self.additionnal_headers)
 
-        if response.status_code == 200:
-            # Assuming it returns {"image_url": "..."} or {"b64_json": "..."}
-            # We standardize to a simple dict
-            return response.json()
-        else:
-            raise RequestError(f"[CustomImageModel] Failed: {response.text}")
+        self._raise_for_status(response, "CustomImageModel._image_without_retry")
+        # Assuming it returns {"image_url": "..."} or {"b64_json": "..."}
+        # We standardize to a simple dict
+        return self._json_response(response)
 
     def _embed_without_retry(self, texts: List[str], **kwargs) -> List[List[float]]:
         raise NotImplementedError("CustomImageModel only supports image generation.")
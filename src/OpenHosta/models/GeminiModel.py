@@ -1,9 +1,8 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Set, Tuple
 import os
-import requests
 from ..core.base_model import Model, ModelCapabilities
-from ..core.errors import ApiKeyError, RequestError, RateLimitError
+from ..core.errors import ApiKeyError
 
 class GeminiModel(Model):
     def __init__(self, 
@@ -15,19 +14,23 @@ class GeminiModel(Model):
             base_url: str = "https://generativelanguage.googleapis.com/v1beta/models",
             api_key: str = None, 
             timeout: int = 60,
-            retry_delay:int = 60,            
+            retry_delay:int = 60,
+            **kwargs,
         ):     
+        kwargs.setdefault("embedding_batch_size", 100)
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
             api_parameters=api_parameters,
-            retry_delay=retry_delay
+            retry_delay=retry_delay,
+            **kwargs,
         )
         self.model_name = model_name
         self.base_url = base_url
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         self.timeout = timeout
         self.capabilities = capabilities
+        self.embedding_model_name = "text-embedding-004"
 
     def _generate_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
         if not self.api_key:
@@ -86,28 +89,27 @@ class GeminiModel(Model):
             if k not in ["max_tokens", "temperature", "force_json_output"]:
                 body["generationConfig"][k] = v
 
-        url = f"{self.base_url}/{self.model_name}:generateContent?key={self.api_key}"
-        response = requests.post(url, json=body, timeout=self.timeout)
+        url = f"{self.get_base_url()}/{self.model_name}:generateContent?key={self.api_key}"
+        response = self._post_json(url, body)
 
-        if response.status_code == 200:
-            resp_json = response.json()
-            try:
-                text = resp_json["candidates"][0]["content"]["parts"][0]["text"]
-            except (KeyError, IndexError):
-                text = ""
-            
-            return {
-                "choices": [{"message": {"content": text}}],
-                "usage": {
-                    "total_tokens": resp_json.get("usageMetadata", {}).get("totalTokenCount", 0),
-                    "prompt_tokens": resp_json.get("usageMetadata", {}).get("promptTokenCount", 0),
-                    "completion_tokens": resp_json.get("usageMetadata", {}).get("candidatesTokenCount", 0)
-                }
+        self._raise_for_status(response, "GeminiModel._generate_without_retry")
+
+        resp_json = self._json_response(response)
+        try:
+            text = resp_json["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            text = ""
+
+        return {
+            "choices": [{"message": {"content": text}}],
+            "usage": {
+                "total_tokens": resp_json.get("usageMetadata", {}).get("totalTokenCount", 0),
+                "prompt_tokens": resp_json.get("usageMetadata", {}).get("promptTokenCount", 0),
+                "completion_tokens": resp_json.get("usageMetadata", {}).get("candidatesTokenCount", 0),
+                # Implicit caching of repeated prefixes
+                "prompt_tokens_details": {"cached_tokens": resp_json.get("usageMetadata", {}).get("cachedContentTokenCount", 0)},
             }
-        elif response.status_code == 429:
-            raise RateLimitError(f"[GeminiModel] Rate limit: {response.text}")
-        else:
-            raise RequestError(f"[GeminiModel] Request failed ({response.status_code}): {response.text}")
+        }
 
     def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
         # Google Imagen is separate, usually requires Vertex AI or different endpoint
@@ -120,25 +122,24 @@ class GeminiModel(Model):
         # Gemini embedding endpoint: models/{model}:embedContent
         # For multiple texts: models/{model}:batchEmbedContents
         
-        full_url = f"{self.base_url}/text-embedding-004:batchEmbedContents?key={self.api_key}"
+        full_url = f"{self.get_base_url()}/{self.embedding_model_name}:batchEmbedContents?key={self.api_key}"
         
         requests_list = []
         for t in texts:
             requests_list.append({
-                "model": "models/text-embedding-004",
+                "model": f"models/{self.embedding_model_name}",
                 "content": {"parts": [{"text": t}]}
             })
             
         body = {"requests": requests_list}
-        response = requests.post(full_url, json=body, timeout=self.timeout)
+        response = self._post_json(full_url, body)
         
-        if response.status_code == 200:
-            embeddings = []
-            for item in response.json().get("embeddings", []):
-                embeddings.append(item.get("values", []))
-            return embeddings
-        else:
-            raise RequestError(f"[GeminiModel.embed] Failed: {response.text}")
+        self._raise_for_status(response, "GeminiModel._embed_without_retry")
+
+        embeddings = []
+        for item in self._json_response(response).get("embeddings", []):
+            embeddings.append(item.get("values", []))
+        return embeddings
 
     def get_consumption(self, response_dict: Dict) -> int:
         return response_dict.get("usage", {}).get("total_tokens", 0)
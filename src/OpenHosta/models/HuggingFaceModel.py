@@ -17,6 +17,7 @@ class HuggingFaceModel(OpenAICompatibleModel):
             base_url: str = "https://router.huggingface.co/v1", 
             api_key: str = None, 
             timeout: int = 60,
+            **kwargs,
         ):     
         super().__init__(
             model_name=model_name,
@@ -26,5 +27,6 @@ class HuggingFaceModel(OpenAICompatibleModel):
             capabilities=capabilities,
             base_url=base_url,
             api_key=api_key or os.environ.get("HF_TOKEN"),
-            timeout=timeout
+            timeout=timeout,
+            **kwargs,
         )
@@ -1,6 +1,5 @@
 from typing import Any, Dict, List, Set, Optional
 import os
-import requests
 import time
 import io
 from PIL import Image
@@ -27,11 +26,13 @@ class HuggingFaceReplicateModel(Model):
             base_url: str = "https://router.huggingface.co/replicate/v1/models", 
             api_key: str = None, 
             timeout: int = 120,
+            **kwargs,
         ):     
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
             api_parameters=api_parameters,
+            **kwargs,
         )
         self.model_name = model_name
         self.base_url = base_url
@@ -84,14 +85,13 @@ class HuggingFaceReplicateModel(Model):
         payload["input"].update(self.api_parameters)
         payload["input"].update(kwargs)
 
-        prediction_url = f"{self.base_url}/{self.model_name}/predictions"
+        prediction_url = f"{self.get_base_url()}/{self.model_name}/predictions"
         headers = self._get_headers()
         
-        response = requests.post(prediction_url, headers=headers, json=payload, timeout=self.timeout)
-        if response.status_code not in [200, 201]:
-            raise RequestError(f"HuggingFace Replicate API Error ({response.status_code}): {response.text}")
+        response = self._post_json(prediction_url, payload, headers=headers)
+        self._raise_for_status(response, "HuggingFaceReplicateModel._generate_without_retry")
 
-        resp_json = response.json()
+        resp_json = self._json_response(response)
         output = resp_json.get("output", "")
         
         # If output is a list (typical for Replicate), extract the first element
@@ -124,11 +124,13 @@ class HuggingFaceReplicateModel(Model):
         prediction_url = f"{self.base_url}/{self.model_name}/predictions"
         headers = self._get_headers()
         
-        response = requests.post(prediction_url, headers=headers, json=payload, timeout=self.timeout)
+        response = self._post_json(prediction_url, payload, headers=headers)
+        self._raise_for_status(response, "HuggingFaceReplicateModel._image_without_retry")
         if response.status_code != 200:
-            raise RequestError(f"HuggingFace Replicate API Error ({response.status_code}): {response.text}")
+            # 201/202: prediction accepted but not finished, there is no image to return yet
+            raise RequestError(f"HuggingFace Replicate API Error ({response.status_code}): {response.text}", status_code=response.status_code)
 
-        resp_json = response.json()
+        resp_json = self._json_response(response)
         output = resp_json.get("output", [])
         
         if not output:
@@ -137,7 +139,7 @@ class HuggingFaceReplicateModel(Model):
         img_url = output[0] if isinstance(output, list) else output
         
         # Download the image if requested or just return URL
-        img_res = requests.get(img_url, headers={"Authorization": f"Bearer {self.api_key}"})
+        img_res = self.get_http_session().get(img_url, headers={"Authorization": f"Bearer {self.api_key}"})
         img = Image.open(io.BytesIO(img_res.content))
 
         return {
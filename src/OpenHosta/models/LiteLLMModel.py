@@ -21,11 +21,13 @@ class LiteLLMModel(Model):
             capabilities:Set[ModelCapabilities] = {ModelCapabilities.TEXT2TEXT, ModelCapabilities.JSON_OUTPUT},
             api_key: Optional[str] = None, 
             timeout: int = 60,
+            **kwargs,
         ):     
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
-            api_parameters=api_parameters
+            api_parameters=api_parameters,
+            **kwargs,
         )
         self.model_name = model_name
         self.api_key = api_key
@@ -62,11 +64,11 @@ class LiteLLMModel(Model):
             return response.json() if hasattr(response, "json") else dict(response)
         
         except litellm.exceptions.RateLimitError as e:
-            raise RateLimitError(str(e))
+            raise RateLimitError(str(e), status_code=429) from e
         except litellm.exceptions.AuthenticationError as e:
-            raise ApiKeyError(str(e))
+            raise ApiKeyError(str(e)) from e
         except Exception as e:
-            raise RequestError(str(e))
+            raise RequestError(str(e), status_code=getattr(e, "status_code", None)) from e
 
     def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
         llm_args = self.api_parameters | kwargs
@@ -79,7 +81,7 @@ class LiteLLMModel(Model):
             )
             return response.json() if hasattr(response, "json") else dict(response)
         except Exception as e:
-            raise RequestError(str(e))
+            raise RequestError(str(e), status_code=getattr(e, "status_code", None)) from e
 
     def _embed_without_retry(self, texts: List[str], **kwargs) -> List[List[float]]:
         llm_args = self.api_parameters | kwargs
@@ -96,7 +98,7 @@ class LiteLLMModel(Model):
                 embeddings.append(item.get("embedding", []))
             return embeddings
         except Exception as e:
-            raise RequestError(str(e))
+            raise RequestError(str(e), status_code=getattr(e, "status_code", None)) from e
 
     def get_consumption(self, response_dict: Dict) -> int:
         return response_dict.get("usage", {}).get("total_tokens", 0)
@@ -1,18 +1,21 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Set, Tuple
 
-import requests
-import json
-from .OpenAICompatible import OpenAICompatibleModel
-from ..core.base_model import ModelCapabilities
-from ..core.errors import ApiKeyError, RateLimitError, RequestError
+from .OpenAICompatible import OpenAICompatibleModel, httpx
+from ..core.base_model import Model, ModelCapabilities
+from ..core.json_codec import get_json_codec
+from ..core.ndjson import NDJSONDeltaDecoder
+from ..core.errors import RequestError
 
 class OllamaModel(OpenAICompatibleModel):
     """
     Model implementation for Ollama using its native API endpoints.
     Supported endpoints:
-    - /api/generate for text generation
+    - /api/chat for text generation, streamed as NDJSON (/api/generate when chat_url is None)
     - /api/embed for embeddings
+
+    `keep_alive` ("30m", seconds, -1 for ever) is sent with every request so that Ollama keeps
+    the model loaded between calls instead of unloading it after 5 minutes.
     """
 
     def __init__(self, 
@@ -20,16 +23,20 @@ class OllamaModel(OpenAICompatibleModel):
             max_async_calls = 7,
             additionnal_headers: Dict[str, Any] = {},
             api_parameters:Dict[str, Any] = {},
-            capabilities:Set[ModelCapabilities] = {ModelCapabilities.TEXT2TEXT, ModelCapabilities.JSON_OUTPUT},
+            capabilities:Set[ModelCapabilities] = {ModelCapabilities.TEXT2TEXT, ModelCapabilities.JSON_OUTPUT, ModelCapabilities.STREAMING},
             base_url: str = "http://localhost:11434", 
             generate_url: str = "/api/generate",
+            chat_url: str|None = "/api/chat",  # None: messages are flattened in one /api/generate prompt
+            keep_alive: str|int|None = None,
             embedding_url: str = "/api/embed",
             embedding_model_name: str = None,
             embedding_similarity_min: float = 0.30,
             api_key: str = None, 
             timeout: int = 120,
+            **kwargs,
         ):     
         # We inherit from OpenAICompatibleModel but we will override the key methods
+        kwargs.setdefault("embedding_batch_size", 64)
         super().__init__(
             model_name=model_name,
             max_async_calls=max_async_calls,
@@ -40,54 +47,85 @@ class OllamaModel(OpenAICompatibleModel):
             embedding_model_name=embedding_model_name,
             embedding_similarity_min=embedding_similarity_min,
             api_key=api_key,
-            timeout=timeout
+            timeout=timeout,
+            **kwargs,
         )
 
         self.base_url = base_url.rstrip("/")
         self.generate_url = generate_url if generate_url.startswith("/") else "/" + generate_url
+        self.chat_url = chat_url if chat_url is None or chat_url.startswith("/") else "/" + chat_url
+        self.keep_alive = keep_alive
         self.embedding_url = embedding_url if embedding_url.startswith("/") else "/" + embedding_url
         self.embedding_model_name = embedding_model_name
         self.embedding_similarity_min = embedding_similarity_min
 
                 
 
-    def _generate_without_retry(
-        self,
-        messages: List[Dict[str, Any]],
-        **kwargs
-    ) -> Dict:
-        """
-        Call Ollama's native /api/generate endpoint.
-        """
-        llm_args = kwargs
-        if "force_json_output" in llm_args and ModelCapabilities.JSON_OUTPUT not in self.capabilities:
-            llm_args.pop("force_json_output")
-
-        # Convert messages to ollama format (prompt + images)
-        prompts = []
-        images = []
-        
+    def _to_ollama_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Chat messages in the /api/chat format: text parts joined, images as raw base64."""
+        ollama_messages = []
         for m in messages:
             content = m.get("content", [])
+            message = {"role": m.get("role", "user")}
             if isinstance(content, str):
-                prompts.append(content)
-            elif isinstance(content, list):
-                for part in content:
-                    if part.get("type") == "text":
-                        prompts.append(part.get("text", ""))
-                    elif part.get("type") == "image_url":
-                        url = part.get("image_url", {}).get("url", "")
-                        if "base64," in url:
-                            images.append(url.split("base64,")[1])
-                        else:
-                            images.append(url)
+                message["content"] = content
+            else:
+                texts, images = self._split_content(content)
+                message["content"] = "\n".join(texts)
+                if images:
+                    message["images"] = images
+            ollama_messages.append(message)
+        return ollama_messages
 
-        l_body = {
-            "model": self.model_name,
-            "prompt": "\n".join(prompts),
-            "images": images,
-            "stream": False
-        }
+    @staticmethod
+    def _split_content(content: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        texts = []
+        images = []
+        for part in content:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url", "")
+                if "base64," in url:
+                    images.append(url.split("base64,")[1])
+                else:
+                    images.append(url)
+        return texts, images
+
+    def _prepare_ollama_request(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Build the url, headers and json body of an /api/chat request (/api/generate without chat_url)."""
+        llm_args = dict(kwargs)
+        if "force_json_output" in llm_args and ModelCapabilities.JSON_OUTPUT not in self.capabilities:
+            llm_args.pop("force_json_output")
+
+        if self.chat_url is not None:
+            l_body = {
+                "model": self.model_name,
+                "messages": self._to_ollama_messages(messages),
+            }
+            full_url = f"{self.get_base_url()}{self.chat_url}"
+        else:
+            # Convert messages to a single prompt + images
+            prompts = []
+            images = []
+            for m in messages:
+                content = m.get("content", [])
+                if isinstance(content, str):
+                    prompts.append(content)
+                elif isinstance(content, list):
+                    texts, content_images = self._split_content(content)
+                    prompts += texts
+                    images += content_images
+            l_body = {
+                "model": self.model_name,
+                "prompt": "\n".join(prompts),
+                "images": images,
+            }
+            full_url = f"{self.get_base_url()}{self.generate_url}"
+        # Ollama streams unless told otherwise
+        l_body["stream"] = stream
+        if self.keep_alive is not None:
+            l_body["keep_alive"] = self.keep_alive
 
         headers = self._get_headers(self.api_key or "")
 
@@ -95,36 +133,24 @@ class OllamaModel(OpenAICompatibleModel):
         for key, value in all_api_parameters.items():
             if key == "force_json_output" and value:
                 l_body["format"] = "json"
+            elif key == "stream":
+                pass  # set by the calling method
             else:
                 l_body[key] = value
-        
-        full_url = f"{self.base_url}{self.generate_url}"
-        response = requests.post(full_url, headers=headers, json=l_body, timeout=self.timeout)
-
-        if response.status_code == 200:
-            pass
-        elif response.status_code == 429:
-            raise RateLimitError(f"[OllamaModel._generate_without_retry] Rate limit exceeded (HTTP 429). {response.text}")
-        elif response.status_code == 401:
-            raise ApiKeyError(f"[OllamaModel._generate_without_retry] Unauthorized (HTTP 401). {response.text}")
+
+        return full_url, headers, l_body
+
+    def _new_stream_decoder(self) -> NDJSONDeltaDecoder:
+        return NDJSONDeltaDecoder("message" if self.chat_url is not None else "response")
+
+    def _to_chat_completion(self, resp_json: Dict[str, Any]) -> Dict:
+        """Ollama response in the chat completion format read by the pipelines."""
+        if self.chat_url is not None:
+            response_content = (resp_json.get("message") or {}).get("content", "")
         else:
-            raise RequestError(f"[OllamaModel._generate_without_retry] Request failed ({response.status_code}):\n{response.text}")
-            
-        self._nb_requests += 1
+            response_content = resp_json.get("response", "")
 
-        try:
-            resp_json = response.json()
-        except json.JSONDecodeError:
-            response_list = []
-            for line in response.content.decode("utf-8").split("\n"):
-                if line.strip():
-                    response_list.append(json.loads(line))
-            resp_json = response_list[-1]
-            resp_json["response"] = "".join([l.get("response", "") for l in response_list])
-
-        response_content = resp_json.get("response", "")
-        
-        response_dict = {
+        return {
             "choices": [
                 {
                     "message": {"content": response_content},
@@ -137,8 +163,115 @@ class OllamaModel(OpenAICompatibleModel):
                 "completion_tokens": resp_json.get("eval_count", 0)
             }
         }
-        
-        return response_dict
+
+    def _read_response(self, content: bytes) -> Dict:
+        try:
+            resp_json = get_json_codec().loads(content)
+        except ValueError:
+            # Streamed answer of a server ignoring "stream": false: join its deltas
+            decoder = self._new_stream_decoder()
+            text = "".join(decoder.feed(content) + decoder.flush())
+            resp_json = dict(decoder.final or {})
+            if self.chat_url is not None:
+                resp_json["message"] = {"role": "assistant", "content": text}
+            else:
+                resp_json["response"] = text
+        return self._to_chat_completion(resp_json)
+
+    def _generate_without_retry(
+        self,
+        messages: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict:
+        """
+        Call Ollama's native /api/chat endpoint (/api/generate without chat_url).
+        """
+        full_url, headers, l_body = self._prepare_ollama_request(messages, **kwargs)
+        response = self._post_json(full_url, l_body, headers=headers)
+
+        self._raise_for_status(response, "OllamaModel._generate_without_retry")
+
+        self._nb_requests += 1
+        return self._read_response(response.content)
+
+    def _generate_stream_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
+        """Yield the text deltas of the NDJSON stream of Ollama as the bytes arrive."""
+        full_url, headers, l_body = self._prepare_ollama_request(messages, stream=True, **kwargs)
+
+        response = self._post_json(full_url, l_body, headers=headers, stream=True)
+        self._raise_for_status(response, "OllamaModel._generate_stream_without_retry")
+
+        self._nb_requests += 1
+        decoder = self._new_stream_decoder()
+        with response:
+            for data in response.iter_content(chunk_size=None):
+                yield from decoder.feed(data)
+                if decoder.done:
+                    break
+            else:
+                yield from decoder.flush()
+
+    def supports_native_async(self) -> bool:
+        cls = type(self)
+        return httpx is not None and \
+            cls.generate is Model.generate and \
+            cls.generate_stream is Model.generate_stream and \
+            cls._generate_without_retry is OllamaModel._generate_without_retry and \
+            cls._generate_stream_without_retry is OllamaModel._generate_stream_without_retry
+
+    async def _generate_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
+        full_url, headers, l_body = self._prepare_ollama_request(messages, **kwargs)
+
+        try:
+            response = await self.get_async_client().post(full_url, headers=headers, content=get_json_codec().dumps(l_body),
+                                                          timeout=self.timeout)
+        except httpx.TransportError as e:
+            raise RequestError(f"[OllamaModel._generate_async_without_retry] {e}") from e
+
+        self._raise_for_status(response, "OllamaModel._generate_async_without_retry")
+
+        self._nb_requests += 1
+        return self._read_response(response.content)
+
+    async def _generate_stream_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
+        """Async version of _generate_stream_without_retry. The NDJSON stream is read on the event loop."""
+        full_url, headers, l_body = self._prepare_ollama_request(messages, stream=True, **kwargs)
+
+        client = self.get_async_client()
+        try:
+            async with client.stream("POST", full_url, headers=headers, content=get_json_codec().dumps(l_body),
+                                     timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                self._raise_for_status(response, "OllamaModel._generate_stream_async_without_retry")
+
+                self._nb_requests += 1
+                decoder = self._new_stream_decoder()
+                async for data in response.aiter_bytes():
+                    for delta in decoder.feed(data):
+                        yield delta
+                    if decoder.done:
+                        break
+                else:
+                    for delta in decoder.flush():
+                        yield delta
+        except httpx.TransportError as e:
+            raise RequestError(f"[OllamaModel._generate_stream_async_without_retry] {e}") from e
+
+    def preload(self):
+        """
+        Load the model in memory ahead of the first call, for `keep_alive` (an empty chat request).
+        """
+        l_body = {"model": self.model_name}
+        if self.keep_alive is not None:
+            l_body["keep_alive"] = self.keep_alive
+        if self.chat_url is not None:
+            l_body["messages"] = []
+            full_url = f"{self.get_base_url()}{self.chat_url}"
+        else:
+            full_url = f"{self.get_base_url()}{self.generate_url}"
+        response = self._post_json(full_url, l_body, headers=self._get_headers(self.api_key or ""))
+        self._raise_for_status(response, "OllamaModel.preload")
 
     def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
         """Ollama does not natively support text-to-image generation yet."""
@@ -146,35 +279,44 @@ class OllamaModel(OpenAICompatibleModel):
 
     def _embed_without_retry(self, texts: List[str], **kwargs) -> List[List[float]]:
         """
-        Call Ollama's native /api/embed endpoint.
-        NOTE: Sequential loop to avoid Ollama bug where batch inputs return identical vectors.
+        Call Ollama's native /api/embed endpoint with a batch of texts.
+
+        Some Ollama versions return the same vector for every input of a batch. When different
+        texts get identical vectors, they are embedded again one per request, and so are the
+        following calls (`embedding_batch_size` is set to 1).
         """
+        vectors = self._post_embed(texts[0] if len(texts) == 1 else texts, kwargs)
+        if len(texts) > 1 and len(vectors) == len(texts) and _has_identical_vectors(texts, vectors):
+            self.embedding_batch_size = 1
+            vectors = [vector for text in texts for vector in self._post_embed(text, kwargs)]
+        return vectors
+
+    def _post_embed(self, input: str|List[str], kwargs: Dict[str, Any]) -> List[List[float]]:
         headers = self._get_headers(self.api_key or "")
-        embeddings = []
-        
-        full_url = f"{self.base_url}{self.embedding_url}"
-        
-        for text in texts:
-            l_body = {
-                "model": self.embedding_model_name or self.model_name,
-                "input": text  # Single string
-            }
-            l_body.update(kwargs)
-            
-            try:
-                response = requests.post(full_url, headers=headers, json=l_body, timeout=self.timeout)
-                if response.status_code == 200:
-                    resp_json = response.json()
-                    # In Ollama native API, if input is string, embeddings is list of 1 list
-                    # or it might return "embedding": [...] directly?
-                    # Let's check the response format for single input.
-                    embs = resp_json.get("embeddings", [])
-                    if embs:
-                        embeddings.append(embs[0])
-                else:
-                    raise RequestError(f"[OllamaModel._embed_without_retry] Request failed ({response.status_code}): {response.text}")
-            except Exception as e:
-                if isinstance(e, RequestError): raise e
-                raise RequestError(f"[OllamaModel._embed_without_retry] {str(e)}")
-        
-        return embeddings
+        full_url = f"{self.get_base_url()}{self.embedding_url}"
+
+        l_body = {
+            "model": self.embedding_model_name or self.model_name,
+            "input": input
+        }
+        if self.keep_alive is not None:
+            l_body["keep_alive"] = self.keep_alive
+        l_body.update(kwargs)
+
+        try:
+            response = self._post_json(full_url, l_body, headers=headers)
+            self._raise_for_status(response, "OllamaModel._embed_without_retry")
+            # "embeddings" holds one vector per input, in order
+            return self._json_response(response).get("embeddings", [])
+        except Exception as e:
+            if isinstance(e, RequestError): raise e
+            raise RequestError(f"[OllamaModel._embed_without_retry] {str(e)}") from e
+
+
+def _has_identical_vectors(texts: List[str], vectors: List[List[float]]) -> bool:
+    """True if two different texts of a batch got the same vector."""
+    seen = {}
+    for text, vector in zip(texts, vectors):
+        if seen.setdefault(tuple(vector), text) != text:
+            return True
+    return False
@@ -2,10 +2,22 @@ from __future__ import annotations
 from typing import Any, Dict, List, Set, Tuple
 
 import os
-import requests
+import asyncio
+import weakref
 
-from ..core.base_model import Model, ModelCapabilities
-from ..core.errors import ApiKeyError, RequestError, RateLimitError
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:
+    # Optional dependency: without it async calls run on the model thread pool
+    httpx = None
+
+from ..core.base_model import CALL_OPTIONS, Model, ModelCapabilities
+from ..core.errors import ApiKeyError, RequestError
+from ..core.sse import SSEDeltaDecoder
+from ..core.json_codec import decode_embedding, get_json_codec
+from ..core.cache import CACHE_HIT_KEY
 
 class OpenAICompatibleModel(Model):
 
@@ -23,15 +35,18 @@ class OpenAICompatibleModel(Model):
             embedding_url: str = "/embeddings",
             embedding_model_name: str|None = None,
             embedding_similarity_min: float = 0.30,  # Min similarity threshold for clustering
+            embedding_encoding_format: str|None = None,  # "base64": vectors sent as float32 bytes, decoded without JSON floats
             api_key: str|None = None, 
             timeout: int = 300,
-            retry_delay:int = 60,            
+            retry_delay:int = 60,
+            **kwargs,
         ):     
         super().__init__(
             max_async_calls=max_async_calls,
             additionnal_headers=additionnal_headers,
             api_parameters=api_parameters,
-            retry_delay=retry_delay
+            retry_delay=retry_delay,
+            **kwargs,
         )
 
         self.reasoning_start_and_stop_tags = ["<think>", "</think>"]
@@ -44,12 +59,16 @@ class OpenAICompatibleModel(Model):
         
         self.api_key = api_key
         self.timeout = timeout
+        self.embedding_encoding_format = embedding_encoding_format
 
         self.capabilities = capabilities
 
         self._used_tokens = 0
         self._nb_requests = 0
 
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_client_guards = weakref.WeakKeyDictionary()
+
         if any(var is None for var in (model_name, base_url)):
             raise ValueError(f"[Model.__init__] Missing values.")
     
@@ -130,8 +149,9 @@ class OpenAICompatibleModel(Model):
             headers[key] = value
         return headers
 
-    def _generate_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
-        llm_args = kwargs
+    def _prepare_chat_request(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Build the url, headers and json body of a chat completion request."""
+        llm_args = dict(kwargs)
         if "force_json_output" in llm_args and ModelCapabilities.JSON_OUTPUT not in self.capabilities:
             llm_args.pop("force_json_output")
 
@@ -139,108 +159,163 @@ class OpenAICompatibleModel(Model):
         if api_key is None and "api.openai.com/v1" in self.base_url:
             api_key = os.environ.get("OPENAI_API_KEY", None)
             if api_key is None:
-                raise ApiKeyError("[OpenAICompatibleModel._generate_without_retry] Empty API key.")
+                raise ApiKeyError("[OpenAICompatibleModel._prepare_chat_request] Empty API key.")
 
         l_body = {
             "model": self.model_name,
             "messages": messages,
         }
+        if stream:
+            l_body["stream"] = True
         headers = self._get_headers(api_key)
 
         all_api_parameters = self.api_parameters | llm_args
         for key, value in all_api_parameters.items():
             if key == "force_json_output" and value:
                 l_body["response_format"] = {"type": "json_object"}
+            elif key == "stream":
+                pass  # set by the calling method
             else:
                 l_body[key] = value
-        
-        full_url = f"{self.base_url}{self.chat_completion_url}"
-        response = requests.post(full_url, headers=headers, json=l_body, timeout=self.timeout)
 
-        self._handle_rate_limit_headers(response)
-            
-        if response.status_code == 200:
-            self._nb_requests += 1
-            return response.json()
-        elif response.status_code == 429:
-            raise RateLimitError(f"[OpenAICompatibleModel._generate_without_retry] Rate limit exceeded. {response.text}")
-        elif response.status_code == 401:
-            raise ApiKeyError(f"[OpenAICompatibleModel._generate_without_retry] Unauthorized. {response.text}")
-        else:
-            raise RequestError(f"[OpenAICompatibleModel._generate_without_retry] Request failed ({response.status_code}):\n{response.text}")
+        full_url = f"{self.get_base_url()}{self.chat_completion_url}"
+        return full_url, headers, l_body
+
+    def _generate_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
+        full_url, headers, l_body = self._prepare_chat_request(messages, **kwargs)
+
+        response = self._post_json(full_url, l_body, headers=headers)
+
+        self._raise_for_status(response, "OpenAICompatibleModel._generate_without_retry")
+
+        self._nb_requests += 1
+        return self._json_response(response)
 
     def _generate_stream_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
         """Yield raw text delta chunks from the OpenAI-compatible SSE stream.
         
-        Sends stream=True to the API and parses Server-Sent Events line by line.
+        Sends stream=True to the API and decodes the Server-Sent Events as the bytes arrive.
         Each yielded value is a non-empty str delta (may be multi-token).
         """
-        import json as _json
+        full_url, headers, l_body = self._prepare_chat_request(messages, stream=True, **kwargs)
 
-        llm_args = dict(kwargs)
-        if "force_json_output" in llm_args and ModelCapabilities.JSON_OUTPUT not in self.capabilities:
-            llm_args.pop("force_json_output")
+        response = self._post_json(full_url, l_body, headers=headers, stream=True)
+        self._raise_for_status(response, "OpenAICompatibleModel._generate_stream_without_retry")
 
-        api_key = self._get_api_key()
-        if api_key is None and "api.openai.com/v1" in self.base_url:
-            api_key = os.environ.get("OPENAI_API_KEY", None)
-            if api_key is None:
-                raise ApiKeyError("[OpenAICompatibleModel._generate_stream_without_retry] Empty API key.")
+        self._nb_requests += 1
+        decoder = SSEDeltaDecoder()
+        with response:
+            for data in response.iter_content(chunk_size=None):
+                yield from decoder.feed(data)
+                if decoder.done:
+                    break
+
+    def supports_native_async(self) -> bool:
+        # Subclasses overriding the synchronous transport (other APIs, mocks) keep the thread pool path.
+        cls = type(self)
+        return httpx is not None and \
+            cls.generate is Model.generate and \
+            cls.generate_stream is Model.generate_stream and \
+            cls._generate_without_retry is OpenAICompatibleModel._generate_without_retry and \
+            cls._generate_stream_without_retry is OpenAICompatibleModel._generate_stream_without_retry
+
+    def get_async_client(self) -> "httpx.AsyncClient":
+        """
+        Return the httpx.AsyncClient of the running event loop.
 
-        l_body: dict = {
-            "model": self.model_name,
-            "messages": messages,
-            "stream": True,
-        }
-        headers = self._get_headers(api_key)
+        Its connection pool is sized with `max_concurrent_async_requests`.
+        The client is closed when the event loop shuts down (end of `asyncio.run`),
+        by `aclose()` or by `close()`.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrent_async_requests,
+                max_keepalive_connections=self.max_concurrent_async_requests,
+            )
+            client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+            self._async_clients[loop] = client
+
+            # The event loop closes its pending async generators on shutdown (loop.shutdown_asyncgens),
+            # which runs the finally clause of this guard. The guard must be started on the loop.
+            guard = self._async_client_guard(client)
+            self._async_client_guards[loop] = guard
+            asyncio.ensure_future(guard.__anext__())
+        return client
+
+    @staticmethod
+    async def _async_client_guard(client: "httpx.AsyncClient"):
+        try:
+            yield
+        finally:
+            await client.aclose()
+
+    async def aclose(self):
+        """Close the httpx.AsyncClient of the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.pop(loop, None)
+        self._async_client_guards.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        """Release the HTTP connections, the async clients and the thread pool of this model."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
 
-        all_api_parameters = self.api_parameters | llm_args
-        for key, value in all_api_parameters.items():
-            if key == "force_json_output" and value:
-                l_body["response_format"] = {"type": "json_object"}
-            elif key == "stream":
-                pass  # already set
+        for loop, client in list(self._async_clients.items()):
+            if client.is_closed or loop.is_closed():
+                continue
+            if loop is running_loop:
+                loop.create_task(client.aclose())
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
             else:
-                l_body[key] = value
+                loop.run_until_complete(client.aclose())
+        self._async_clients.clear()
+        self._async_client_guards.clear()
 
-        full_url = f"{self.base_url}{self.chat_completion_url}"
+        super().close()
 
-        response = requests.post(
-            full_url, headers=headers, json=l_body,
-            timeout=self.timeout, stream=True
-        )
-        self._handle_rate_limit_headers(response)
+    async def _generate_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
+        full_url, headers, l_body = self._prepare_chat_request(messages, **kwargs)
 
-        if response.status_code == 429:
-            raise RateLimitError(f"[OpenAICompatibleModel._generate_stream_without_retry] Rate limit. {response.text}")
-        if response.status_code == 401:
-            raise ApiKeyError(f"[OpenAICompatibleModel._generate_stream_without_retry] Unauthorized. {response.text}")
-        if response.status_code != 200:
-            raise RequestError(f"[OpenAICompatibleModel._generate_stream_without_retry] Failed ({response.status_code}):\n{response.text}")
+        try:
+            response = await self.get_async_client().post(full_url, headers=headers, content=get_json_codec().dumps(l_body),
+                                                          timeout=self.timeout)
+        except httpx.TransportError as e:
+            # Like the other adapters: transport failures surface as RequestError (retried through __cause__)
+            raise RequestError(f"[OpenAICompatibleModel._generate_async_without_retry] {e}") from e
+
+        self._raise_for_status(response, "OpenAICompatibleModel._generate_async_without_retry")
 
         self._nb_requests += 1
-        for raw_line in response.iter_lines():
-            if not raw_line:
-                continue
-            # SSE lines look like: "data: {...}" or "data: [DONE]"
-            if isinstance(raw_line, bytes):
-                raw_line = raw_line.decode("utf-8")
-            if not raw_line.startswith("data:"):
-                continue
-            data_str = raw_line[len("data:"):].strip()
-            if data_str == "[DONE]":
-                break
-            try:
-                chunk = _json.loads(data_str)
-            except _json.JSONDecodeError:
-                continue
-            delta = (
-                chunk.get("choices", [{}])[0]
-                     .get("delta", {})
-                     .get("content") or ""
-            )
-            if delta:
-                yield delta
+        return self._json_response(response)
+
+    async def _generate_stream_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
+        """Async version of _generate_stream_without_retry. The SSE stream is read on the event loop."""
+        full_url, headers, l_body = self._prepare_chat_request(messages, stream=True, **kwargs)
+
+        client = self.get_async_client()
+        try:
+            async with client.stream("POST", full_url, headers=headers, content=get_json_codec().dumps(l_body),
+                                     timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                self._raise_for_status(response, "OpenAICompatibleModel._generate_stream_async_without_retry")
+
+                self._nb_requests += 1
+                decoder = SSEDeltaDecoder()
+                async for data in response.aiter_bytes():
+                    for delta in decoder.feed(data):
+                        yield delta
+                    if decoder.done:
+                        break
+        except httpx.TransportError as e:
+            raise RequestError(f"[OpenAICompatibleModel._generate_stream_async_without_retry] {e}") from e
 
     def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
         api_key = self._get_api_key()
@@ -257,14 +332,9 @@ class OpenAICompatibleModel(Model):
         l_body.update(kwargs)
         
         full_url = f"{self.base_url}/images/generations"
-        response = requests.post(full_url, headers=headers, json=l_body, timeout=self.timeout)
-        
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 429:
-            raise RateLimitError(f"[OpenAICompatibleModel._image_without_retry] Rate limit exceeded. {response.text}")
-        else:
-            raise RequestError(f"[OpenAICompatibleModel._image_without_retry] Request failed ({response.status_code}): {response.text}")
+        response = self._post_json(full_url, l_body, headers=headers)
+        self._raise_for_status(response, "OpenAICompatibleModel._image_without_retry")
+        return self._json_response(response)
 
     def _embed_without_retry(self, texts: List[str], **kwargs) -> List[List[float]]:
         api_key = self._get_api_key()
@@ -274,32 +344,26 @@ class OpenAICompatibleModel(Model):
             "model": self.embedding_model_name,
             "input": texts
         }
+        if self.embedding_encoding_format:
+            body["encoding_format"] = self.embedding_encoding_format
         body.update(kwargs)
         
-        full_url = f"{self.base_url}{self.embedding_url}"
+        full_url = f"{self.get_base_url()}{self.embedding_url}"
         
         try:
-            response = requests.post(full_url, headers=headers, json=body, timeout=self.timeout)
-            if response.status_code == 200:
-                response_dict = response.json()
-                embeddings = []
-                data = response_dict.get("data", [])
-                data_sorted = sorted(data, key=lambda x: x.get("index", 0))
-                for item in data_sorted:
-                    embeddings.append(item.get("embedding", []))
-                return embeddings
-            else:
-                raise RequestError(f"[OpenAICompatibleModel._embed_without_retry] Request failed ({response.status_code}): {response.text}")
+            response = self._post_json(full_url, body, headers=headers)
+            self._raise_for_status(response, "OpenAICompatibleModel._embed_without_retry")
+            response_dict = self._json_response(response)
+            embeddings = []
+            data = response_dict.get("data", [])
+            data_sorted = sorted(data, key=lambda x: x.get("index", 0))
+            for item in data_sorted:
+                embeddings.append(decode_embedding(item.get("embedding", [])))
+            return embeddings
         except Exception as e:
             if isinstance(e, RequestError): raise e
-            raise RequestError(f"[OpenAICompatibleModel._embed_without_retry] {str(e)}")
+            raise RequestError(f"[OpenAICompatibleModel._embed_without_retry] {str(e)}") from e
 
-    def _handle_rate_limit_headers(self, response):
-        if "Retry-After" in response.headers:
-            self.set_next_rate_limit(next_authorized_api_call_time=response.headers["Retry-After"])
-        elif 'x-ratelimit-reset-requests' in response.headers:
-            self.set_next_rate_limit(next_authorized_api_call_time=response.headers['x-ratelimit-reset-requests'])
-    
     def models_on_same_api(self) -> List[str]:
         api_key = self._get_api_key()
         if api_key is None and "api.openai.com/v1" in self.base_url:
@@ -310,23 +374,79 @@ class OpenAICompatibleModel(Model):
         headers = self._get_headers(api_key)
         full_url = f"{self.base_url}/models"
         
-        response = requests.get(full_url, headers=headers, timeout=self.timeout)
-        if not response.ok:
-            raise RequestError(f"[OpenAICompatibleModel.models_on_same_api] Request failed ({response.status_code}): {response.text}")
+        response = self.get_http_session().get(full_url, headers=headers, timeout=self.timeout)
+        self._raise_for_status(response, "OpenAICompatibleModel.models_on_same_api")
         
         model_list = []
-        if "data" in response.json():
-            for model in response.json()["data"]:
+        response_dict = self._json_response(response)
+        if "data" in response_dict:
+            for model in response_dict["data"]:
                 if model.get("object") == "model":
                     model_list.append(model["id"])
         return model_list
     
+    # --- OpenAI Batch API (/files, /batches) ---
+
+    def batch_request_line(self, custom_id: str, messages: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        """Return the line of a Batch API input file holding this chat completion."""
+        llm_args = {k: v for k, v in kwargs.items() if k not in CALL_OPTIONS}
+        full_url, _, l_body = self._prepare_chat_request(messages, **llm_args)
+        return {"custom_id": custom_id, "method": "POST", "url": urlparse(full_url).path, "body": l_body}
+
+    def _batch_api_headers(self) -> Dict[str, str]:
+        api_key = self._get_api_key()
+        if api_key is None and "api.openai.com/v1" in self.base_url:
+            api_key = os.environ.get("OPENAI_API_KEY", None)
+            if api_key is None:
+                raise ApiKeyError("[OpenAICompatibleModel._batch_api_headers] Empty API key.")
+        headers = self._get_headers(api_key)
+        # Set per request: json or multipart
+        headers.pop("Content-Type", None)
+        return headers
+
+    def upload_batch_file(self, path: str) -> str:
+        """Upload a JSONL Batch input file and return its file id."""
+        return self._retry_wrapper(self._upload_batch_file_without_retry, path)
+
+    def _upload_batch_file_without_retry(self, path: str) -> str:
+        with open(path, "rb") as file:
+            response = self.get_http_session().post(
+                f"{self.base_url}/files", headers=self._batch_api_headers(),
+                data={"purpose": "batch"}, files={"file": (os.path.basename(path), file, "application/jsonl")},
+                timeout=self.timeout)
+        self._raise_for_status(response, "OpenAICompatibleModel.upload_batch_file")
+        return self._json_response(response)["id"]
+
+    def create_batch(self, input_file_id: str, endpoint: str = "/v1/chat/completions", completion_window: str = "24h") -> Dict[str, Any]:
+        """Start a batch over an uploaded input file and return the batch object."""
+        return self._retry_wrapper(self._create_batch_without_retry, input_file_id, endpoint, completion_window)
+
+    def _create_batch_without_retry(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        body = {"input_file_id": input_file_id, "endpoint": endpoint, "completion_window": completion_window}
+        response = self._post_json(f"{self.base_url}/batches", body, headers=self._batch_api_headers())
+        self._raise_for_status(response, "OpenAICompatibleModel.create_batch")
+        return self._json_response(response)
+
+    def retrieve_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Return the batch object, with its `status` and output/error file ids."""
+        return self._retry_wrapper(self._get_batch_api, f"/batches/{batch_id}")
+
+    def download_file(self, file_id: str) -> bytes:
+        """Return the content of a file, e.g. the output of a batch."""
+        return self._retry_wrapper(self._get_batch_api, f"/files/{file_id}/content", raw=True)
+
+    def _get_batch_api(self, route: str, raw: bool = False):
+        response = self.get_http_session().get(f"{self.base_url}{route}", headers=self._batch_api_headers(),
+                                               timeout=self.timeout)
+        self._raise_for_status(response, f"OpenAICompatibleModel GET {route}")
+        return response.content if raw else self._json_response(response)
+
     def get_consumption(self, response_dict) -> int:
         return self._used_tokens
     
     def get_response_content(self, response_dict: Dict) -> str:
         
-        if "usage" in response_dict and "total_tokens" in response_dict["usage"]:
+        if "usage" in response_dict and "total_tokens" in response_dict["usage"] and not response_dict.get(CACHE_HIT_KEY):
             self._used_tokens += int(response_dict["usage"]["total_tokens"])
     
         assert "choices" in response_dict, f"[Model.get_response_content] Invalid response: {response_dict}"
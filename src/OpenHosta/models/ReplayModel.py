@@ -0,0 +1,253 @@
+"""
+Record/replay of the calls of a model, to run and benchmark OpenHosta offline.
+
+In "record" mode the calls go to the wrapped model and every request/response pair
+(completions with their logprobs, stream chunks, embeddings) is appended to a JSON Lines
+cassette. In "replay" mode the cassette answers, with an optional simulated latency and
+throughput, and nothing is sent:
+
+```
+model = ReplayModel(OpenAICompatibleModel(model_name="gpt-4o"), "tests/cassettes/emulate.jsonl", mode="record")
+...
+model = ReplayModel(OpenAICompatibleModel(model_name="gpt-4o"), "tests/cassettes/emulate.jsonl",
+                    latency=0.3, tokens_per_second=80)
+```
+
+Calls are matched on the model name, the messages and the API parameters. A request recorded
+several times (e.g. retries of an unparsable answer) is answered with its recordings in turn.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List
+
+import asyncio
+import copy
+import os
+import threading
+import time
+
+from ..core.base_model import CALL_OPTIONS, Model
+from ..core.cache import CACHE_HIT_KEY, EmbeddingCache, make_cache_key
+from ..core.errors import ReplayMissError
+from ..core.json_codec import get_json_codec
+
+MODES = ("record", "replay", "auto")
+
+
+class Cassette:
+    """
+    JSON Lines file of recorded calls. Each line is a JSON object with its `key`, `kind`,
+    the `request` (for reading) and the `response`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Dict[str, List[Any]] = {}
+        # Next recording served for each key
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            codec = get_json_codec()
+            with open(path, "rb") as file:
+                for line in file:
+                    if line.strip():
+                        record = codec.loads(line)
+                        self._records.setdefault(record["key"], []).append(record["response"])
+
+    def __len__(self):
+        return sum(len(responses) for responses in self._records.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._records
+
+    def get(self, key: str) -> Any:
+        """Next recording of `key`, cycling through them. Raises ReplayMissError if there is none."""
+        with self._lock:
+            responses = self._records.get(key)
+            if not responses:
+                raise ReplayMissError(f"[Cassette] No recorded call {key[:12]} in {self.path}.")
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return copy.deepcopy(responses[cursor % len(responses)])
+
+    def add(self, key: str, kind: str, request: Any, response: Any):
+        """Record a call, written to the file right away so that an interrupted run keeps it."""
+        line = get_json_codec().dumps({"key": key, "kind": kind, "request": request, "response": response}) + b"\n"
+        with self._lock:
+            self._records.setdefault(key, []).append(response)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "ab") as file:
+                file.write(line)
+
+
+class ReplayModel(Model):
+    """
+    Model answering from a cassette recorded from another model.
+
+    Args:
+        model: The wrapped model. It is only called in record mode, but its name, capabilities
+            and response parsing are used in every mode.
+        cassette: Path of the JSON Lines cassette.
+        mode: "record" calls `model` and records every call, "replay" only answers from the
+            cassette (ReplayMissError for unknown calls), "auto" replays the recorded calls and
+            records the others.
+        latency: Simulated seconds before the answer (or the first stream chunk) in replay.
+        tokens_per_second: Simulated generation throughput in replay. None answers at once.
+        **kwargs: Options of `Model` (rate_limiter, response_cache, embedding_cache...). Embeddings
+            use a cache of their own by default, so that every embedded text reaches the cassette.
+    """
+
+    def __init__(self,
+                 model: Model,
+                 cassette: str,
+                 mode: str = "replay",
+                 latency: float = 0.0,
+                 tokens_per_second: float|None = None,
+                 **kwargs):
+        if mode not in MODES:
+            raise ValueError(f"[ReplayModel] Unknown mode {mode!r}. Use one of {MODES}.")
+        kwargs.setdefault("retry_delay", 0)  # the wrapped model retries its own calls
+        kwargs.setdefault("embedding_cache", EmbeddingCache())
+        super().__init__(**kwargs)
+
+        self.model = model
+        self.cassette = Cassette(cassette)
+        self.mode = mode
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+
+        self.model_name = model.model_name
+        self.capabilities = set(model.capabilities)
+        self.preferred_image_format = model.preferred_image_format
+        self.image_encoder = model.image_encoder
+        self.embedding_similarity_min = model.embedding_similarity_min
+
+    def __getattr__(self, name: str):
+        # Response parsing helpers of the wrapped model (get_thinking_and_data_sections...)
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _call_key(self, kind: str, messages: Any, kwargs: Dict[str, Any]) -> str:
+        params = self.model.api_parameters | {k: v for k, v in kwargs.items() if k not in CALL_OPTIONS}
+        return make_cache_key(kind, self.model_name, messages, params)
+
+    def _replays(self, key: str) -> bool:
+        return self.mode == "replay" or (self.mode == "auto" and key in self.cassette)
+
+    def _record(self, key: str, kind: str, request: Any, response: Any):
+        if isinstance(response, dict):
+            response = {k: v for k, v in response.items() if k != CACHE_HIT_KEY}
+        self.cassette.add(key, kind, request, response)
+
+    def _generation_time(self, response: Dict) -> float:
+        if not self.tokens_per_second:
+            return self.latency
+        tokens = (response.get("usage") or {}).get("completion_tokens")
+        if tokens is None:
+            tokens = len(self.model.get_response_content(response) or "") // 4
+        return self.latency + tokens / self.tokens_per_second
+
+    def _chunk_time(self, chunk: str) -> float:
+        return max(1, len(chunk) // 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generate_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
+        key = self._call_key("generate", messages, kwargs)
+        if self._replays(key):
+            response = self.cassette.get(key)
+            time.sleep(self._generation_time(response))
+            return response
+        response = self.model.generate(messages, **kwargs)
+        self._record(key, "generate", {"messages": messages, "params": kwargs}, response)
+        return response
+
+    def _generate_stream_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
+        key = self._call_key("stream", messages, kwargs)
+        if self._replays(key):
+            chunks = self.cassette.get(key)
+            time.sleep(self.latency)
+            for chunk in chunks:
+                time.sleep(self._chunk_time(chunk))
+                yield chunk
+            return
+        chunks = []
+        for chunk in self.model.generate_stream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # Streams interrupted by the caller are not recorded
+        self._record(key, "stream", {"messages": messages, "params": kwargs}, chunks)
+
+    def supports_native_async(self) -> bool:
+        # Replayed calls wait with asyncio.sleep; recorded ones use the async path of the wrapped model
+        return True
+
+    async def _generate_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs) -> Dict:
+        key = self._call_key("generate", messages, kwargs)
+        if self._replays(key):
+            response = self.cassette.get(key)
+            await asyncio.sleep(self._generation_time(response))
+            return response
+        response = await self.model.generate_async(messages, **kwargs)
+        self._record(key, "generate", {"messages": messages, "params": kwargs}, response)
+        return response
+
+    async def _generate_stream_async_without_retry(self, messages: List[Dict[str, Any]], **kwargs):
+        key = self._call_key("stream", messages, kwargs)
+        if self._replays(key):
+            chunks = self.cassette.get(key)
+            await asyncio.sleep(self.latency)
+            for chunk in chunks:
+                await asyncio.sleep(self._chunk_time(chunk))
+                yield chunk
+            return
+        chunks = []
+        async for chunk in self.model.generate_stream_async(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        self._record(key, "stream", {"messages": messages, "params": kwargs}, chunks)
+
+    def _image_without_retry(self, prompt: str, **kwargs) -> Dict:
+        key = self._call_key("image", prompt, kwargs)
+        if self._replays(key):
+            response = self.cassette.get(key)
+            time.sleep(self.latency)
+            return response
+        response = self.model.image(prompt, **kwargs)
+        self._record(key, "image", {"prompt": prompt, "params": kwargs}, response)
+        return response
+
+    def _embed_without_retry(self, texts: List[str], **kwargs) -> List[List[float]]:
+        # Recorded per text: replayed calls may be chunked differently
+        namespace = self.model._embedding_cache_namespace(kwargs)
+        keys = [make_cache_key("embed", namespace, text) for text in texts]
+        missing = [i for i, key in enumerate(keys) if not self._replays(key)]
+        vectors: List[Any] = [None] * len(texts)
+        if missing:
+            computed = self.model.embed([texts[i] for i in missing], **kwargs)
+            for i, vector in zip(missing, computed):
+                vectors[i] = [float(value) for value in vector]
+                self._record(keys[i], "embed", {"text": texts[i], "params": kwargs}, vectors[i])
+        for i, key in enumerate(keys):
+            if vectors[i] is None:
+                vectors[i] = self.cassette.get(key)
+        if len(missing) < len(texts):
+            time.sleep(self.latency)
+        return vectors
+
+    def get_consumption(self, response_dict) -> int:
+        return self.model.get_consumption(response_dict)
+
+    def get_response_content(self, response_dict: Dict) -> str:
+        return self.model.get_response_content(response_dict)
+
+    def print_last_prompt(self, inspection):
+        return self.model.print_last_prompt(inspection)
+
+    def close(self):
+        super().close()
+        self.model.close()
+
+    def __repr__(self):
+        return f"ReplayModel({self.model_name!r}, cassette={self.cassette.path!r}, mode={self.mode!r}, recorded={len(self.cassette)})"
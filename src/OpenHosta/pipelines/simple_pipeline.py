@@ -1,4 +1,8 @@
 import contextvars
+import re
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
 
 from typing import Dict, List, Tuple, Any, Set
@@ -6,13 +10,16 @@ from typing import Dict, List, Tuple, Any, Set
 from abc import ABC, abstractmethod
 
 
-from ..core.errors import UncertaintyError, UnreproducibleError
-from ..core.analizer import encode_function, nice_type_name
+from ..core.errors import CircuitOpenError, UncertaintyError, UnreproducibleError
+from ..core.analizer import CALL_VALUE_KEYS, encode_function_parameter_values, encode_function_signature, nice_type_name, signature_key
 from ..core.base_model import Model, ModelCapabilities
 from ..core.inspection import Inspection
-from ..core.meta_prompt import MetaPrompt, EMULATE_META_PROMPT, USER_CALL_META_PROMPT
+from ..core.meta_prompt import MetaPrompt, EMULATE_META_PROMPT, USER_CALL_META_PROMPT, PACKED_CALLS_META_PROMPT
 from ..core.uncertainty import get_certainty, get_enum_logprobes, normalized_probs, ReproducibleSettings, reproducible_settings_ctxvar
 from ..core.cost_tracker import get_current_cost_tracker
+from ..core.cache import CACHE_HIT_KEY
+from ..core.model_router import ModelRouter
+from ..core.image_encoding import ImageEncoder
 from ..core.audit import trigger_audit_event
 
 from ..guarded.resolver import type_returned_data
@@ -20,6 +27,64 @@ from ..guarded.primitives import GuardedPrimitive
 
 MetaDialog = List[Tuple[str, MetaPrompt]]
 
+# Comment giving the number of the call at the start of a block of a packed answer
+_PACKED_CALL_NUMBER = re.compile(r"\s*#\s*(?:call\s*)?(\d+)[^\n]*", re.IGNORECASE)
+
+
+class CodeBlockScanner:
+    """Incremental scanner of the ```python blocks of a streamed answer.
+
+    Each `feed` only searches the text added since the previous one, so that
+    scanning a long stream stays linear in its length.
+    """
+    START = "```python"
+    END   = "```"
+
+    def __init__(self):
+        self._buffer = ""
+        # Position from which the next delimiter is searched
+        self._position = 0
+        # Start of the content of the open block, None outside of a block
+        self._content_start: int|None = None
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text. Returns the content of the blocks it completes."""
+        self._buffer += text
+        buffer = self._buffer
+        blocks = []
+        while True:
+            if self._content_start is None:
+                start = buffer.find(self.START, self._position)
+                if start == -1:
+                    # A delimiter may be cut between two chunks
+                    self._position = max(self._position, len(buffer) - len(self.START) + 1)
+                    break
+                self._content_start = self._position = start + len(self.START)
+            end = buffer.find(self.END, self._position)
+            if end == -1:
+                self._position = max(self._position, len(buffer) - len(self.END) + 1)
+                break
+            blocks.append(buffer[self._content_start:end])
+            self._content_start = None
+            self._position = end + len(self.END)
+        self._compact()
+        return blocks
+
+    def _compact(self):
+        # Drop the scanned text once it is most of the buffer, which keeps the copies amortized linear
+        keep_from = self._position if self._content_start is None else self._content_start
+        if keep_from > len(self._buffer) // 2:
+            self._buffer = self._buffer[keep_from:]
+            self._position -= keep_from
+            if self._content_start is not None:
+                self._content_start -= keep_from
+
+    def flush(self) -> str|None:
+        """Content of the block left open at the end of the stream, if any."""
+        if self._content_start is None:
+            return None
+        return self._buffer[self._content_start:]
+
 class Pipeline(ABC):
     """
     Abstract base class defining the interface for model selection policies.
@@ -90,15 +155,25 @@ class OneTurnConversationPipeline(Pipeline):
     def __init__(self, 
                  model_list:List[Model]=None,
                  emulate_meta_prompt:MetaPrompt=None,
-                 user_call_meta_prompt:MetaPrompt=None):
+                 user_call_meta_prompt:MetaPrompt=None,
+                 router:ModelRouter=None):
         
         assert len(model_list) > 0, "You shall provide at least one model."
 
         super().__init__()
         
-        self.image_size_limit = 1920  # pixels
+        self.image_size_limit = 1920  # pixels, for the models without an image_encoder
+        self._image_encoders:Dict[Tuple[str, int], ImageEncoder] = {}
+
+        # Encoded signatures and rendered meta-prompts that do not depend on the argument values
+        self.prompt_cache_size = 256
+        self._signature_cache:"OrderedDict[Any, dict]" = OrderedDict()
+        self._render_cache:"OrderedDict[Any, Tuple[MetaPrompt, str]]" = OrderedDict()
+        self._prompt_cache_lock = threading.Lock()
 
         self.model_list:List[Model] = model_list
+        # Chooses among the capable models by latency and cost. None: the first capable model
+        self.router:ModelRouter|None = router
         
         if emulate_meta_prompt is not None:
             self.emulate_meta_prompt = emulate_meta_prompt
@@ -110,6 +185,9 @@ class OneTurnConversationPipeline(Pipeline):
         else:
             self.user_call_meta_prompt = USER_CALL_META_PROMPT.copy()
 
+        # Lists the calls answered by one request, see execute_packed
+        self.packed_calls_meta_prompt = PACKED_CALLS_META_PROMPT.copy()
+
     def push_detect_missing_types(self, inspection:Inspection):
         """Python Level"""
         import warnings
@@ -159,18 +237,43 @@ class OneTurnConversationPipeline(Pipeline):
         return required
 
     def push_choose_model(self, inspection:Inspection):
-        """OpenHosta Level: Dynamic Routing based on capabilities"""
+        """
+        OpenHosta Level: Dynamic Routing based on capabilities
+
+        Models whose circuit breaker is open are skipped until their cool-down ends.
+        With a router, the capable models are ranked by the `routing_policy` of the call
+        or of the function (see ModelRouter), otherwise the first one is taken.
+        """
         
         required = self._detect_required_capabilities(inspection)
         
-        # Search for a model that satisfies all requirements
+        # Search for the models that satisfy all requirements
+        capable = []
+        unavailable = []
         for model in self.model_list:
             if required.issubset(model.capabilities):
-                inspection.model = model
-                return model
+                if not model.is_available():
+                    unavailable.append(model)
+                    continue
+                capable.append(model)
+                if self.router is None:
+                    break
+
+        if capable:
+            chosen_model = capable[0]
+            if self.router is not None:
+                policy = inspection.routing_policy or inspection.force_llm_args.get("routing_policy")
+                chosen_model = self.router.choose(capable, policy)
+            inspection.model = chosen_model
+            return chosen_model
+
+        if unavailable:
+            raise CircuitOpenError(f"[OneTurnConversationPipeline.push_choose_model] Every model with capabilities "
+                                   f"{sorted(c.value for c in required)} is unavailable (circuit open): "
+                                   f"{[m.model_name for m in unavailable]}")
         
         # Fallback to first model with a warning if none fit exactly
-        chosen_model = self.model_list[0]
+        chosen_model = next((model for model in self.model_list if model.is_available()), self.model_list[0])
         inspection.model = chosen_model
         # print(f"[Warning] No model found with all required capabilities: {required}. Falling back to {chosen_model.__class__.__name__}")
         
@@ -179,19 +282,79 @@ class OneTurnConversationPipeline(Pipeline):
     def push_encode_inspected_data(self, inspection: Inspection):
         """Data & Schema Level"""
         
-        model_capabilities: set[ModelCapabilities] = inspection.model.capabilities
         analyse = inspection.analyse
 
-        encoded_data = encode_function(analyse, model_capabilities)
+        # The signature is encoded once per function, only the argument values are encoded on each call
+        key = signature_key(analyse)
+        signature_data = self._prompt_cache_get(self._signature_cache, key)
+        if signature_data is None:
+            signature_data = encode_function_signature(analyse)
+            self._prompt_cache_set(self._signature_cache, key, signature_data)
+        encoded_data = signature_data | encode_function_parameter_values(analyse)
+
+        force_template_data = getattr(inspection.function_pointer, "force_template_data", None)
+        if force_template_data is not None:
+            print("[OneTurnConversationPipeline] Merging force_template_data into encoded_data: ", force_template_data)
+            encoded_data |= force_template_data
+            if key is not None:
+                key = (key, repr(sorted(force_template_data.items(), key=lambda item: item[0])))
 
-        if hasattr(inspection.function_pointer, "force_template_data"):
-            print("[OneTurnConversationPipeline] Merging force_template_data into encoded_data: ", inspection.function_pointer.force_template_data)
-            encoded_data |= inspection.function_pointer.force_template_data 
-        
         inspection.data_for_metaprompt = encoded_data
+        # Identity of the call independent snippets, see render_meta_prompt
+        inspection.prompt_data["signature_key"] = key
+        inspection.prompt_data["signature_data"] = signature_data
         
         return encoded_data 
 
+    def _prompt_cache_get(self, cache:OrderedDict, key):
+        if key is None:
+            return None
+        with self._prompt_cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _prompt_cache_set(self, cache:OrderedDict, key, value):
+        if key is None:
+            return
+        with self._prompt_cache_lock:
+            cache[key] = value
+            while len(cache) > self.prompt_cache_size:
+                cache.popitem(last=False)
+
+    def render_meta_prompt(self, inspection:Inspection, meta_prompt:MetaPrompt, encoded_data:dict) -> str:
+        """
+        Render `meta_prompt`. Renderings that do not read the argument values (the system
+        message) are cached per function, meta-prompt version and template data.
+        """
+        key = inspection.prompt_data.get("signature_key")
+        if key is None or meta_prompt.variables & CALL_VALUE_KEYS:
+            return meta_prompt.render(encoded_data)
+
+        signature_data = inspection.prompt_data["signature_data"]
+        # Template data added to the signature (e.g. by push_streaming) is part of the key
+        extra = tuple(sorted((name, repr(encoded_data.get(name))) for name in meta_prompt.variables if name not in signature_data))
+        key = (key, id(meta_prompt), meta_prompt.version, extra)
+        cached = self._prompt_cache_get(self._render_cache, key)
+        # Same id and version, but maybe another meta-prompt created after the first one was freed
+        if cached is not None and cached[0] is meta_prompt:
+            return cached[1]
+        rendering = meta_prompt.render(encoded_data)
+        self._prompt_cache_set(self._render_cache, key, (meta_prompt, rendering))
+        return rendering
+
+    def get_image_encoder(self, model:Model) -> ImageEncoder:
+        """Encoder of the image arguments sent to `model`: its own one, or one following `image_size_limit`."""
+        if model.image_encoder is not None:
+            return model.image_encoder
+        policy = (model.preferred_image_format or "png", self.image_size_limit)
+        # Kept across calls so that retries find the downscaled images they send again
+        encoder = self._image_encoders.get(policy)
+        if encoder is None:
+            encoder = self._image_encoders[policy] = ImageEncoder(format=policy[0], max_edge=policy[1])
+        return encoder
+
     def push_select_meta_prompts(self, inspection:Inspection):
         """Prompt Level""" 
         
@@ -204,29 +367,14 @@ class OneTurnConversationPipeline(Pipeline):
             pil_is_loaded = False
                         
         if pil_is_loaded:
-            import base64
-            import io
-            img_format = self.model_list[0].preferred_image_format if self.model_list[0].preferred_image_format else "png"
-            size_limit = float(self.image_size_limit)
-
+            image_args = [arg for arg in inspection.analyse.args if isinstance(arg.value, PIL.Image.Image)]
             image_list = []
-            for arg in inspection.analyse.args:
-                is_pil_img = isinstance(arg.value, PIL.Image.Image)
-
-                if is_pil_img:
-                    img:PIL.Image.Image = arg.value
-                    max_size = max(img.width, img.height)
-                    ratio = min(1, size_limit/max_size)
-                    if ratio == 1:
-                        image_resized = img
-                    else:
-                        image_resized = img.resize([int(img.width*ratio),int(img.height*ratio)])
-                        arg.value = image_resized
-                    buffered= io.BytesIO()
-                    image_resized.save(buffered, img_format)
-                    img_string = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    image_list.append(f"data:image/{img_format};base64,{img_string}")
-
+            if image_args:
+                model = inspection.model if inspection.model is not None else self.model_list[0]
+                encoder = self.get_image_encoder(model)
+                for arg, (image_url, image_resized) in zip(image_args, encoder.encode_many([arg.value for arg in image_args])):
+                    arg.value = image_resized
+                    image_list.append(image_url)
 
         default_meta_conversation:MetaDialog = [
             ('system',self.emulate_meta_prompt, None),
@@ -343,32 +491,6 @@ class OneTurnConversationPipeline(Pipeline):
         
         return raw_response
 
-    @staticmethod
-    def _extract_next_code_block(buffer: str):
-        """Find the next complete ```python...``` block in *buffer*.
-
-        Returns
-        -------
-        (content: str, remainder: str)
-            *content* is the text between the delimiters (stripped).
-            *remainder* is everything after the closing ``` .
-            If no complete block is found, returns (None, buffer).
-        """
-        START = "```python"
-        END   = "```"
-        start = buffer.find(START)
-        if start == -1:
-            return None, buffer
-        content_start = start + len(START)
-        # Search for closing ``` *after* the opening tag
-        end = buffer.find(END, content_start)
-        if end == -1:
-            return None, buffer  # block not yet closed
-        content   = buffer[content_start:end]
-        remainder = buffer[end + len(END):]
-        return content, remainder
-
-
     def pull_extract_data_section(self, inspection:Inspection, raw_response:str) -> Any:
         """Data & Schema Level"""
 
@@ -409,6 +531,13 @@ class OneTurnConversationPipeline(Pipeline):
         return l_ret_data
 
     def push_build_messages(self, inspection:Inspection, meta_messages:MetaDialog, encoded_data:dict) -> dict:
+        """
+        Render the meta-prompts into chat messages.
+
+        The system message only uses the function level data (signature, docstring, types): its bytes
+        are the same across the calls of a function, so that the APIs caching prompt prefixes (OpenAI,
+        vLLM, llama.cpp, Anthropic) reuse it. Argument values and images go in the user message.
+        """
         messages = []
         
         inspection.logs["llm_api_messages_sent"] = messages
@@ -416,13 +545,13 @@ class OneTurnConversationPipeline(Pipeline):
         for role, meta_prompt, images in meta_messages:
             
             message_content = [
-                        {"type": "text",  "text" : meta_prompt.render(encoded_data) }
+                        {"type": "text",  "text" : self.render_meta_prompt(inspection, meta_prompt, encoded_data) }
                     ]
             
             if images and len(images) > 0:
                 for image in images:
                     message_content += [
-                        {"type": "image_url", "image_url": {"url": image}}
+                        {"type": "image_url", "image_url": image if isinstance(image, dict) else {"url": image}}
                     ]
 
             messages += [{
@@ -436,6 +565,7 @@ class OneTurnConversationPipeline(Pipeline):
         inspection.pipeline = self
         
         # reset pipe state for new usage
+        inspection.prompt_data.pop("signature_key", None)
         inspection   = self.push_detect_missing_types(inspection)
         chosen_model = self.push_choose_model(inspection)
         inspection   = self.push_check_uncertainty(inspection)
@@ -456,6 +586,7 @@ class OneTurnConversationPipeline(Pipeline):
         """
         inspection.pipeline = self
 
+        inspection.prompt_data.pop("signature_key", None)
         inspection   = self.push_detect_missing_types(inspection)
         _            = self.push_choose_model(inspection)
         inspection   = self.push_check_uncertainty(inspection)
@@ -476,12 +607,8 @@ class OneTurnConversationPipeline(Pipeline):
         inspection.logs["clean_answer"] = ""
         inspection.logs["llm_api_response"] = response_dict
         
-        # Cost Tracking
-        usage = response_dict.get("usage")
-        if usage:
-            tracker = get_current_cost_tracker()
-            if tracker:
-                tracker.add_usage(usage)
+        self.pull_record_usage(response_dict)
+        self.pull_record_model_stats(inspection, response_dict)
         
         # Process Response
         raw_response    = self.pull_extract_messages(inspection, response_dict)
@@ -491,28 +618,115 @@ class OneTurnConversationPipeline(Pipeline):
         
         return response_data
 
+    def pull_record_usage(self, response_dict:dict):
+        """Cost Tracking"""
+        usage = response_dict.get("usage")
+        tracker = get_current_cost_tracker()
+        if tracker:
+            if response_dict.get(CACHE_HIT_KEY):
+                tracker.add_cache_hit()
+            elif usage:
+                tracker.add_usage(usage)
+
+    def pull_record_model_stats(self, inspection:Inspection, response_dict:dict):
+        """Feed the router with the latency and token usage of the call."""
+        latency = inspection.logs.pop("llm_api_duration", None)
+        if self.router is None or response_dict.get(CACHE_HIT_KEY):
+            return
+        self.router.record(inspection.model, latency, response_dict.get("usage"))
+
+    @staticmethod
+    def _model_args(inspection: Inspection, force_llm_args: dict) -> dict:
+        """Arguments of the model call: the function and call arguments, without the pipeline options."""
+        llm_args = inspection.force_llm_args | force_llm_args
+        llm_args.pop("routing_policy", None)
+        return llm_args
+
+    def _record_api_error(self, inspection: Inspection, error: Exception):
+        if self.router is not None and not isinstance(error, CircuitOpenError):
+            self.router.record_error(inspection.model, error)
+
+    def _call_model(self, inspection: Inspection, messages, llm_args: dict) -> dict:
+        start = time.perf_counter()
+        try:
+            response_dict = inspection.model.api_call(messages, llm_args)
+        except Exception as e:
+            self._record_api_error(inspection, e)
+            raise
+        inspection.logs["llm_api_duration"] = time.perf_counter() - start
+        return response_dict
+
+    async def _call_model_async(self, inspection: Inspection, messages, llm_args: dict) -> dict:
+        start = time.perf_counter()
+        try:
+            response_dict = await inspection.model.api_call_async(messages, llm_args)
+        except Exception as e:
+            self._record_api_error(inspection, e)
+            raise
+        inspection.logs["llm_api_duration"] = time.perf_counter() - start
+        return response_dict
+
+    @staticmethod
+    def _model_became_unavailable(model, error: Exception) -> bool:
+        """True if the call failed because the circuit breaker of the model is, or just became, open."""
+        return isinstance(error, CircuitOpenError) or not model.is_available()
+
+    def _push_and_call(self, inspection: Inspection, force_llm_args: dict) -> dict:
+        """
+        Push and call the chosen model.
+
+        When the circuit breaker of the model opens during the call (or was found open),
+        the model is chosen again, skipping it, and the call is sent to the next capable one.
+        """
+        failed_models = []
+        while True:
+            messages = self.push(inspection)
+            model = inspection.model
+            if any(model is failed for failed, _ in failed_models):
+                # Its breaker closed again meanwhile: every capable model was tried
+                raise failed_models[-1][1]
+            llm_args = self._model_args(inspection, force_llm_args)
+            try:
+                return self._call_model(inspection, messages, llm_args)
+            except Exception as e:
+                if not self._model_became_unavailable(model, e):
+                    raise
+                failed_models.append((model, e))
+
+    async def _push_and_call_async(self, inspection: Inspection, force_llm_args: dict) -> dict:
+        failed_models = []
+        while True:
+            messages = self.push(inspection)
+            model = inspection.model
+            if any(model is failed for failed, _ in failed_models):
+                raise failed_models[-1][1]
+            llm_args = self._model_args(inspection, force_llm_args)
+            try:
+                return await self._call_model_async(inspection, messages, llm_args)
+            except Exception as e:
+                if not self._model_became_unavailable(model, e):
+                    raise
+                failed_models.append((model, e))
+
     def execute(self, inspection: Inspection, force_llm_args: dict, is_async: bool = False) -> Any:
         import time
         from ..defaults import config
 
         max_retries = config.MAX_RETRIES
         last_exception = None
+        inspection.routing_policy = force_llm_args.get("routing_policy")
         
         for attempt in range(max_retries):
             start_time = time.time()
             try:
-                # 1. Push
-                messages = self.push(inspection)
-                
-                # 2. Call LLM
-                llm_args = inspection.force_llm_args | force_llm_args
                 if is_async:
                     # In python 3.8+ asyncio.get_event_loop() is discouraged outside main thread, but run_until_complete is not used here, we assume it's awaited in emulate_async
                     # But wait, execute cannot be async if it has the same signature. 
                     # We will handle async separately in execute_async
                     raise NotImplementedError("Use execute_async for asynchronous execution.")
-                else:
-                    response_dict = inspection.model.api_call(messages, llm_args)
+
+                # 1. Push and 2. Call LLM, on the next capable model if a circuit breaker opens
+                response_dict = self._push_and_call(inspection, force_llm_args)
 
                 # 3. Pull
                 response_data = self.pull(inspection, response_dict)
@@ -555,16 +769,13 @@ class OneTurnConversationPipeline(Pipeline):
 
         max_retries = config.MAX_RETRIES
         last_exception = None
+        inspection.routing_policy = force_llm_args.get("routing_policy")
         
         for attempt in range(max_retries):
             start_time = time.time()
             try:
-                # 1. Push
-                messages = self.push(inspection)
-                
-                # 2. Call LLM
-                llm_args = inspection.force_llm_args | force_llm_args
-                response_dict = await inspection.model.api_call_async(messages, llm_args)
+                # 1. Push and 2. Call LLM, on the next capable model if a circuit breaker opens
+                response_dict = await self._push_and_call_async(inspection, force_llm_args)
 
                 # 3. Pull
                 response_data = self.pull(inspection, response_dict)
@@ -601,57 +812,43 @@ class OneTurnConversationPipeline(Pipeline):
 
     def execute_stream(self, inspection: Inspection, force_llm_args: dict, item_type):
         """Stream typed items from the LLM, one ```python block per item."""
+        inspection.routing_policy = force_llm_args.get("routing_policy")
         messages = self.push_streaming(inspection, item_type)
-        llm_args = inspection.force_llm_args | force_llm_args
+        llm_args = self._model_args(inspection, force_llm_args)
 
-        buffer = ""
+        scanner = CodeBlockScanner()
         for chunk in inspection.model.generate_stream(messages, **llm_args):
-            buffer += chunk
-            # Extract as many complete blocks as possible from the buffer
-            while True:
-                content, remainder = self._extract_next_code_block(buffer)
-                if content is None:
-                    break
-                buffer = remainder
+            for content in scanner.feed(chunk):
                 typed_item = self._pull_single_item(inspection, content, item_type)
                 if typed_item is not None:
                     yield typed_item
 
-        # Flush any remaining partial block at end-of-stream
-        if buffer.strip():
-            # Force-close an open block if needed
-            probe = buffer if buffer.rstrip().endswith("```") else buffer + "\n```"
-            content, _ = self._extract_next_code_block(probe)
-            if content is not None:
-                typed_item = self._pull_single_item(inspection, content, item_type)
-                if typed_item is not None:
-                    yield typed_item
+        # Force-close a block left open at end-of-stream
+        content = scanner.flush()
+        if content is not None:
+            typed_item = self._pull_single_item(inspection, content, item_type)
+            if typed_item is not None:
+                yield typed_item
 
 
     async def execute_stream_async(self, inspection: Inspection, force_llm_args: dict, item_type):
         """Async version of _execute_stream."""
+        inspection.routing_policy = force_llm_args.get("routing_policy")
         messages = self.push_streaming(inspection, item_type)
-        llm_args = inspection.force_llm_args | force_llm_args
+        llm_args = self._model_args(inspection, force_llm_args)
 
-        buffer = ""
+        scanner = CodeBlockScanner()
         async for chunk in inspection.model.generate_stream_async(messages, **llm_args):
-            buffer += chunk
-            while True:
-                content, remainder = self._extract_next_code_block(buffer)
-                if content is None:
-                    break
-                buffer = remainder
+            for content in scanner.feed(chunk):
                 typed_item = self._pull_single_item(inspection, content, item_type)
                 if typed_item is not None:
                     yield typed_item
 
-        if buffer.strip():
-            probe = buffer if buffer.rstrip().endswith("```") else buffer + "\n```"
-            content, _ = self._extract_next_code_block(probe)
-            if content is not None:
-                typed_item = self._pull_single_item(inspection, content, item_type)
-                if typed_item is not None:
-                    yield typed_item
+        content = scanner.flush()
+        if content is not None:
+            typed_item = self._pull_single_item(inspection, content, item_type)
+            if typed_item is not None:
+                yield typed_item
 
 
     def _pull_single_item(self, inspection: Inspection, raw_str: str, item_type) -> Any:
@@ -670,3 +867,171 @@ class OneTurnConversationPipeline(Pipeline):
             return None
         finally:
             inspection.analyse.type = original_type
+
+
+    def split_packs(self, model: Model, calls_messages: List[list], max_pack_size: int, tokens_per_answer: int,
+                    llm_args: dict) -> List[List[int]]:
+        """
+        Group the rendered calls in packs fitting the context window of `model`.
+
+        Tokens are estimated at 4 characters each, like the embedding chunks. Each call also books
+        `tokens_per_answer` tokens of answer, within `max_tokens` when it is set.
+
+        Returns:
+            The positions in `calls_messages` of the calls of each pack.
+        """
+        def estimate(content) -> int:
+            return sum(len(item.get("text", "")) // 4 + 1 for item in content)
+
+        budget = model.context_window - estimate(calls_messages[0][0]["content"])
+        max_tokens = llm_args.get("max_tokens") or llm_args.get("max_completion_tokens")
+        if max_tokens:
+            max_pack_size = min(max_pack_size, max(1, max_tokens // tokens_per_answer))
+
+        packs, pack, pack_tokens = [], [], 0
+        for position, messages in enumerate(calls_messages):
+            tokens = sum(estimate(message["content"]) for message in messages[1:]) + tokens_per_answer
+            if pack and (len(pack) >= max_pack_size or pack_tokens + tokens > budget):
+                packs.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append(position)
+            pack_tokens += tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def push_packed(self, calls_messages: List[list]) -> list:
+        """
+        Merge the messages rendered by push() for several calls of one function into one request:
+        their common system message, then one user message listing the calls.
+        """
+        system = calls_messages[0][0]
+        calls = ["\n".join(item["text"] for item in message["content"] if item["type"] == "text").strip()
+                 for messages in calls_messages for message in messages[1:]]
+        content = [{"type": "text", "text": self.packed_calls_meta_prompt.render({"calls": calls, "call_count": len(calls)})}]
+        for number, messages in enumerate(calls_messages, start=1):
+            images = [item for message in messages[1:] for item in message["content"] if item["type"] != "text"]
+            if images:
+                content += [{"type": "text", "text": f"Images of call {number}:"}] + images
+        return [system, {"role": "user", "content": content}]
+
+    def pull_packed(self, inspections: List[Inspection], response_dict: dict) -> Tuple[List[Any], Dict[int, Exception]]:
+        """
+        Split the answer to a packed request in the ```python blocks of its calls and type each one.
+
+        Blocks are matched to the calls by their leading `# <number>` comment, or by their order.
+
+        Returns:
+            The typed value of each call (None for the failed ones) and the error of each failed call position.
+        """
+        lead = inspections[0]
+        lead.logs["rational"] = ""
+        lead.logs["llm_api_response"] = response_dict
+
+        self.pull_record_usage(response_dict)
+        self.pull_record_model_stats(lead, response_dict)
+
+        raw_response = self.pull_extract_messages(lead, response_dict)
+        thinking, answer = lead.model.get_thinking_and_data_sections(raw_response)
+        scanner = CodeBlockScanner()
+        blocks = scanner.feed(answer)
+        last_block = scanner.flush()
+        if last_block is not None:
+            blocks.append(last_block)
+
+        contents: List[str|None] = [None] * len(inspections)
+        for order, block in enumerate(blocks):
+            number = _PACKED_CALL_NUMBER.match(block)
+            position = int(number.group(1)) - 1 if number else order
+            if 0 <= position < len(contents) and contents[position] is None:
+                contents[position] = block[number.end():] if number else block
+
+        rational = lead.logs["rational"] + (thinking or "")
+        values: List[Any] = [None] * len(inspections)
+        errors: Dict[int, Exception] = {}
+        for position, (inspection, content) in enumerate(zip(inspections, contents)):
+            inspection.model = lead.model
+            inspection.logs.update(rational=rational, answer=answer, llm_api_response=response_dict)
+            if content is None:
+                errors[position] = ValueError(f"No ```python block answers call {position + 1} of the pack.")
+                continue
+            response_string = content.strip().strip("\"'")
+            inspection.logs["clean_answer"] = inspection.logs["response_string"] = response_string
+            try:
+                values[position] = self.pull_type_data_section(inspection, response_string)
+            except (ValueError, TypeError, SyntaxError) as e:
+                errors[position] = e
+        return values, errors
+
+    def execute_packed(self, inspections: List[Inspection], force_llm_args: dict = {},
+                       max_pack_size: int = 32, tokens_per_answer: int = 32) -> List[Any]:
+        """
+        Answer many calls of one function with a request per pack of calls.
+
+        The system prompt is sent once per pack instead of once per call, which suits functions
+        with short inputs and answers (classifications, yes/no questions). The calls whose block
+        is missing or does not parse are sent again in packs half as large, and through execute()
+        once they are alone. Calls under a reproducible settings context (uncertainty) are not packed.
+
+        Args:
+            inspections: One inspection per call, each with the analyse of its own argument values.
+            force_llm_args: Additional arguments of the model calls.
+            max_pack_size: Largest number of calls per request.
+            tokens_per_answer: Estimated tokens of the answer to each call, used to fill the context window.
+
+        Returns:
+            The typed results, in the order of `inspections`.
+        """
+        from ..defaults import config
+
+        if not inspections:
+            return []
+        if reproducible_settings_ctxvar.get():
+            return [self.execute(inspection, force_llm_args) for inspection in inspections]
+
+        calls_messages = []
+        for inspection in inspections:
+            inspection.routing_policy = force_llm_args.get("routing_policy")
+            calls_messages.append(self.push(inspection))
+        if any(messages[0] != calls_messages[0][0] for messages in calls_messages):
+            raise ValueError("[OneTurnConversationPipeline.execute_packed] Packed calls shall share their system "
+                             "prompt: pack the calls of one function only.")
+
+        results: List[Any] = [None] * len(inspections)
+        pending = list(range(len(inspections)))
+        pack_size = max_pack_size
+        for _ in range(config.MAX_RETRIES):
+            if not pending or pack_size <= 1:
+                break
+            lead = inspections[pending[0]]
+            llm_args = self._model_args(lead, force_llm_args)
+            packs = self.split_packs(lead.model, [calls_messages[i] for i in pending], pack_size, tokens_per_answer, llm_args)
+            failed = []
+            for pack in packs:
+                pack = [pending[position] for position in pack]
+                if len(pack) == 1:
+                    failed += pack
+                    continue
+                start_time = time.time()
+                pack_inspections = [inspections[i] for i in pack]
+                response_dict = self._call_model(pack_inspections[0], self.push_packed([calls_messages[i] for i in pack]), llm_args)
+                values, errors = self.pull_packed(pack_inspections, response_dict)
+                for position, i in enumerate(pack):
+                    if position in errors:
+                        failed.append(i)
+                    else:
+                        results[i] = values[position]
+                trigger_audit_event("emulate_packed", {
+                    "function": lead.analyse.name,
+                    "calls": len(pack),
+                    "failed": len(errors),
+                    "duration": time.time() - start_time,
+                    "model": lead.model.model_name
+                })
+            pack_size = min(pack_size, max(len(pack) for pack in packs)) // 2
+            pending = failed
+
+        for i in pending:
+            results[i] = self.execute(inspections[i], force_llm_args)
+        return results
+
@@ -0,0 +1,49 @@
+"""
+Benchmark: concurrent `generate_async` calls on the thread pool versus the native asyncio transport.
+
+Run with:
+    python tests/bench/bench_async_transport.py [nb_calls] [server_latency_s]
+"""
+
+import asyncio
+import sys
+import time
+
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+from stub_server import StubLLMServer
+
+
+class ThreadPoolModel(OpenAICompatibleModel):
+    """Same model, forced on the thread pool path (behaviour without httpx)."""
+    def supports_native_async(self) -> bool:
+        return False
+
+
+async def _run_calls(model, nb_calls: int) -> float:
+    messages = [{"role": "user", "content": [{"type": "text", "text": "hello"}]}]
+    start = time.perf_counter()
+    await asyncio.gather(*[model.generate_async(messages) for _ in range(nb_calls)])
+    return time.perf_counter() - start
+
+
+async def run(nb_calls: int = 500, latency: float = 0.05):
+    with StubLLMServer(latency=latency) as server:
+        threaded = ThreadPoolModel(model_name="stub", base_url=server.base_url, max_async_calls=7)
+        native = OpenAICompatibleModel(model_name="stub", base_url=server.base_url, max_async_calls=7)
+
+        threaded_duration = await _run_calls(threaded, nb_calls)
+        native_duration = await _run_calls(native, nb_calls)
+        await native.aclose()
+        threaded.close()
+
+    print(f"concurrent calls     : {nb_calls}, server latency {latency * 1000:.0f} ms")
+    print(f"thread pool (7)      : {threaded_duration:.2f} s, {nb_calls / threaded_duration:.0f} calls/s")
+    print(f"native asyncio       : {native_duration:.2f} s, {nb_calls / native_duration:.0f} calls/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.05,
+    ))
@@ -0,0 +1,46 @@
+"""
+Benchmark: one-shot `requests.post` versus the pooled keep-alive session of `Model`.
+
+Run with:
+    python tests/bench/bench_http_pool.py [nb_calls]
+"""
+
+import sys
+import time
+
+import requests
+
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+from stub_server import StubLLMServer
+
+
+def run(nb_calls: int = 500):
+    messages = [{"role": "user", "content": [{"type": "text", "text": "hello"}]}]
+
+    with StubLLMServer() as server:
+        model = OpenAICompatibleModel(model_name="stub", base_url=server.base_url)
+        url = f"{model.base_url}{model.chat_completion_url}"
+        body = {"model": "stub", "messages": messages}
+
+        start = time.perf_counter()
+        for _ in range(nb_calls):
+            requests.post(url, json=body, timeout=10).json()
+        one_shot = (time.perf_counter() - start) / nb_calls
+        one_shot_connections = server.connections
+
+        start = time.perf_counter()
+        for _ in range(nb_calls):
+            model.generate(messages)
+        pooled = (time.perf_counter() - start) / nb_calls
+        pooled_connections = server.connections - one_shot_connections
+
+    print(f"calls per mode      : {nb_calls}")
+    print(f"requests.post       : {one_shot * 1000:.3f} ms/call, {one_shot_connections} connections")
+    print(f"Model pooled session: {pooled * 1000:.3f} ms/call, {pooled_connections} connections")
+    print(f"pool stats          : {model.http_pool_stats()}")
+    print(f"speedup             : x{one_shot / pooled:.2f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
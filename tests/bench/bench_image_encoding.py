@@ -0,0 +1,69 @@
+"""
+Benchmark: preprocessing time of the image arguments in push_select_meta_prompts.
+
+- the former path: PNG at 1920 pixels, one image after the other, on every call,
+- ImageEncoder policies, first call (cache miss) and retry (cache hit), 4 images per call.
+
+Run with:
+    python tests/bench/bench_image_encoding.py [repeat]
+"""
+
+import base64
+import io
+import sys
+import time
+
+import PIL.Image
+
+from OpenHosta.core.cache import MemoryCache
+from OpenHosta.core.image_encoding import ImageEncoder
+
+
+def photo(seed: int) -> PIL.Image.Image:
+    # Smooth gradients with noise, closer to a photo than random pixels
+    image = PIL.Image.radial_gradient("L").resize((3000, 2000)).convert("RGB")
+    noise = PIL.Image.effect_noise((3000, 2000), 40 + seed).convert("RGB")
+    return PIL.Image.blend(image, noise, 0.3)
+
+
+def former(images):
+    urls = []
+    for image in images:
+        ratio = min(1, 1920 / max(image.width, image.height))
+        resized = image if ratio == 1 else image.resize([int(image.width * ratio), int(image.height * ratio)])
+        buffered = io.BytesIO()
+        resized.save(buffered, "png")
+        urls.append(f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}")
+    return urls
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(repeat: int = 3):
+    images = [photo(seed) for seed in range(4)]
+    print(f"{'policy':<40}{'miss ms':>10}{'hit ms':>10}{'payload':>12}")
+    print(f"{'former (png 1920, sequential)':<40}{timed(lambda: former(images), repeat):>10.0f}{'-':>10}"
+          f"{sum(map(len, former(images))) / 1e6:>10.2f}MB")
+    policies = {
+        "png 1920": dict(format="png"),
+        "jpeg q85 1920": dict(format="jpeg"),
+        "jpeg q80 1024": dict(format="jpeg", quality=80, max_edge=1024),
+        "webp q75 low detail": dict(format="webp", quality=75, detail="low"),
+    }
+    for name, options in policies.items():
+        def miss():
+            return ImageEncoder(cache=MemoryCache(), **options).encode_many(images)
+        encoder = ImageEncoder(cache=MemoryCache(), **options)
+        sent = [downscaled for _, downscaled in encoder.encode_many(images)]
+        payload = sum(len(image_url["url"]) for image_url, _ in encoder.encode_many(sent))
+        print(f"{name:<40}{timed(miss, repeat):>10.0f}{timed(lambda: encoder.encode_many(sent), repeat):>10.1f}"
+              f"{payload / 1e6:>10.2f}MB")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,83 @@
+"""
+Benchmark: encode/decode time of the JSON codecs on typical OpenHosta payloads.
+
+- request with a base64 image (push_select_meta_prompts),
+- chat completion with `top_logprobs: 20` (emulate_iterator),
+- embedding response of 512 vectors of 1536 floats, and the same with encoding_format="base64".
+
+Run with:
+    python tests/bench/bench_json_codec.py [repeat]
+"""
+
+import base64
+import os
+import random
+import struct
+import sys
+import time
+
+from OpenHosta.core.json_codec import OrjsonJSONCodec, StdlibJSONCodec, decode_embedding, orjson
+
+
+def image_request() -> dict:
+    image = base64.b64encode(os.urandom(1_500_000)).decode("ascii")
+    return {"model": "gpt-4o", "messages": [
+        {"role": "system", "content": "You are a Python function. " * 50},
+        {"role": "user", "content": [
+            {"type": "text", "text": "Describe the image."},
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+        ]}]}
+
+
+def logprobs_response() -> dict:
+    def token(i):
+        return {"token": f"tok{i}", "logprob": -random.random() * 10, "bytes": [116, 111, 107]}
+    content = [token(i) | {"top_logprobs": [token(j) for j in range(20)]} for i in range(200)]
+    return {"id": "chatcmpl", "object": "chat.completion", "choices": [{
+        "index": 0, "message": {"role": "assistant", "content": "x" * 800},
+        "logprobs": {"content": content}, "finish_reason": "stop"}]}
+
+
+def embedding_response(encoded: bool) -> dict:
+    def vector():
+        values = [random.uniform(-1, 1) for _ in range(1536)]
+        if encoded:
+            return base64.b64encode(struct.pack("<1536f", *values)).decode("ascii")
+        return values
+    return {"object": "list", "data": [{"object": "embedding", "index": i, "embedding": vector()} for i in range(512)]}
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(repeat: int = 5):
+    codecs = [StdlibJSONCodec()] + ([OrjsonJSONCodec()] if orjson is not None else [])
+    payloads = {
+        "image request": (image_request(), False),
+        "top_logprobs response": (logprobs_response(), False),
+        "embeddings (floats)": (embedding_response(False), True),
+        "embeddings (base64)": (embedding_response(True), True),
+    }
+    print(f"{'payload':<24}{'size':>10}" + "".join(f"{codec.name + ' enc/dec ms':>24}" for codec in codecs))
+    for name, (payload, is_embedding) in payloads.items():
+        data = codecs[0].dumps(payload)
+        row = f"{name:<24}{len(data) / 1e6:>8.1f}MB"
+        for codec in codecs:
+            if is_embedding:
+                def decode():
+                    return [decode_embedding(item["embedding"]) for item in codec.loads(data)["data"]]
+            else:
+                def decode():
+                    return codec.loads(data)
+            row += f"{timed(lambda: codec.dumps(payload), repeat):>14.1f}{timed(decode, repeat):>10.1f}"
+        print(row)
+    if orjson is None:
+        print("orjson is not installed: only the standard library codec was measured.")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,48 @@
+"""
+Benchmark: cost of creating pipelines and of rendering the emulate meta-prompt.
+
+Each pipeline copies the default meta-prompts; rendering is compared with the raw
+jinja2 template rendering of the same source, without the blank line cleanup.
+
+Run with:
+    python tests/bench/bench_meta_prompt.py [repeat]
+"""
+
+import sys
+import time
+
+from jinja2 import Template
+
+from OpenHosta.core.meta_prompt import EMULATE_META_PROMPT
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+DATA = {
+    "function_name": "extract_invoice",
+    "function_args": "document: str, previous: List[Invoice]",
+    "function_doc": "Extract the invoice described by the document.",
+    "function_return_type_name": "Invoice",
+    "python_type_definition_dict": "```python\nclass Invoice(BaseModel):\n    number: str\n```",
+    "return_none_allowed": True,
+    "allow_thinking": False,
+}
+
+
+def per_call(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(repeat: int):
+    raw = Template(EMULATE_META_PROMPT.source)
+    model = OpenAICompatibleModel(model_name="stub", base_url="http://localhost:1/v1")
+
+    print(f"OneTurnConversationPipeline(): {per_call(lambda: OneTurnConversationPipeline(model_list=[model]), repeat):.4f} ms")
+    print(f"MetaPrompt.render:             {per_call(lambda: EMULATE_META_PROMPT.render(DATA), repeat):.4f} ms")
+    print(f"jinja2 Template.render:        {per_call(lambda: raw.render(DATA), repeat):.4f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
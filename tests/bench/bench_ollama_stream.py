@@ -0,0 +1,65 @@
+"""
+Benchmark: time to first item of OllamaModel against a local stub generating tokens.
+
+The stub writes one NDJSON line every `interval` seconds. The time to the first
+streamed delta is compared with the time of the same answer without streaming
+(the former /api/generate path), sync and async.
+
+Run with:
+    python tests/bench/bench_ollama_stream.py [tokens] [interval]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_server import StubLLMServer
+
+from OpenHosta.models.OllamaCompatible import OllamaModel
+
+MESSAGES = [{"role": "user", "content": "Count."}]
+
+
+def run(tokens: int = 50, interval: float = 0.02):
+    stream = [f"token{i} " for i in range(tokens)]
+    with StubLLMServer(reply="".join(stream), stream=stream, stream_interval=interval) as server:
+        model = OllamaModel(model_name="stub", base_url=server.base_url.replace("/v1", ""), keep_alive="30m")
+
+        model.preload()
+        start = time.perf_counter()
+        model.generate(MESSAGES)
+        blocking = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first = None
+        for _ in model.generate_stream(MESSAGES):
+            if first is None:
+                first = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+        async def stream_async():
+            start = time.perf_counter()
+            first = None
+            async for _ in model.generate_stream_async(MESSAGES):
+                if first is None:
+                    first = time.perf_counter() - start
+            return first, time.perf_counter() - start
+
+        async def measure_async():
+            # The first call pays the creation of the httpx client
+            await stream_async()
+            return await stream_async()
+
+        first_async, total_async = asyncio.run(measure_async())
+
+    print(f"{tokens} tokens, one every {interval * 1000:.0f} ms")
+    print(f"{'generate (no streaming)':<28}{'first item':>12}{blocking * 1000:>10.1f} ms")
+    print(f"{'generate_stream':<28}{'first item':>12}{first * 1000:>10.1f} ms   total {total * 1000:.1f} ms")
+    print(f"{'generate_stream_async':<28}{'first item':>12}{first_async * 1000:>10.1f} ms   total {total_async * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50, float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
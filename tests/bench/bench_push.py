@@ -0,0 +1,86 @@
+"""
+Benchmark: latency of OneTurnConversationPipeline.push() for a Pydantic-heavy signature.
+
+push() analyses the types of the function, encodes them and renders both meta-prompts.
+No request is sent: the model is only used for its capabilities.
+
+Run with:
+    python tests/bench/bench_push.py [repeat]
+"""
+
+import sys
+import time
+
+from enum import Enum
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from OpenHosta.core.analizer import hosta_analyze
+from OpenHosta.core.inspection import Inspection
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+class Currency(Enum):
+    EUR = "EUR"
+    USD = "USD"
+
+
+class Address(BaseModel):
+    street: str
+    city: str
+    country: Literal["FR", "DE", "US"]
+
+
+class LineItem(BaseModel):
+    sku: str = Field(description="Stock keeping unit")
+    quantity: int
+    unit_price: float
+    currency: Currency
+
+
+class Customer(BaseModel):
+    name: str
+    email: Optional[str] = None
+    addresses: List[Address]
+
+
+class Invoice(BaseModel):
+    number: str
+    customer: Customer
+    items: List[LineItem]
+    totals: Dict[Currency, float]
+    notes: Optional[str] = None
+
+
+def extract_invoice(document: str, customer_hint: Optional[Customer], previous: List[Invoice]) -> Invoice:
+    """Extract the invoice described by the document."""
+
+
+def make_inspection(document: str) -> Inspection:
+    analyse = hosta_analyze(function_pointer=extract_invoice)
+    for arg, value in zip(analyse.args, (document, None, [])):
+        arg.value = value
+    return Inspection(function_pointer=extract_invoice, frame=None, analyse=analyse)
+
+
+def run(repeat: int = 500):
+    model = OpenAICompatibleModel(model_name="stub", base_url="http://localhost:1/v1")
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    start = time.perf_counter()
+    pipeline.push(make_inspection("Invoice 0"))
+    first = (time.perf_counter() - start) * 1000
+
+    inspections = [make_inspection(f"Invoice {i}: 3 items for ACME") for i in range(repeat)]
+    start = time.perf_counter()
+    for inspection in inspections:
+        pipeline.push(inspection)
+    per_call = (time.perf_counter() - start) / repeat * 1000
+
+    print(f"push(): first call {first:.2f} ms, next calls {per_call:.3f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
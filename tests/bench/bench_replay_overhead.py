@@ -0,0 +1,85 @@
+"""
+Benchmark: overhead of OpenHosta itself (analysis, prompt building, parsing, typing) per call.
+
+Calls are recorded once against the local stub, then replayed by a ReplayModel:
+- without simulated latency, the time per call is the overhead of OpenHosta,
+- with a simulated latency, concurrent `emulate_async` calls show how the pipeline scales.
+
+Run with:
+    python tests/bench/bench_replay_overhead.py [calls]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_server import StubLLMServer
+
+from OpenHosta import emulate, emulate_async
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.models.ReplayModel import ReplayModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+@dataclass
+class Person:
+    name: str
+    age: int
+
+
+def run(calls: int = 200):
+    cassette = os.path.join(tempfile.mkdtemp(), "cassette.jsonl")
+    reply = "```python\nPerson(name='Ada', age=36)\n```"
+    with StubLLMServer(reply=reply) as server:
+        model = OpenAICompatibleModel(model_name="stub", base_url=server.base_url)
+        recorder = ReplayModel(model, cassette, mode="record")
+        pipeline = OneTurnConversationPipeline(model_list=[recorder])
+
+        def extract(text: str) -> Person:
+            """Extract the person described by the text."""
+            return emulate(pipeline=pipeline)
+
+        async def extract_async(text: str) -> Person:
+            """Extract the person described by the text."""
+            return await emulate_async(pipeline=pipeline)
+
+        extract("Ada is 36.")
+        asyncio.run(extract_async("Ada is 36."))
+
+    for latency in (0.0, 0.05):
+        player = ReplayModel(model, cassette, latency=latency)
+        pipeline = OneTurnConversationPipeline(model_list=[player])
+
+        def extract(text: str) -> Person:
+            """Extract the person described by the text."""
+            return emulate(pipeline=pipeline)
+
+        async def extract_async(text: str) -> Person:
+            """Extract the person described by the text."""
+            return await emulate_async(pipeline=pipeline)
+
+        async def concurrent():
+            return await asyncio.gather(*(extract_async("Ada is 36.") for _ in range(calls)))
+
+        sequential = min(calls, 20) if latency else calls
+        start = time.perf_counter()
+        for _ in range(sequential):
+            extract("Ada is 36.")
+        per_call = (time.perf_counter() - start) / sequential * 1000
+
+        start = time.perf_counter()
+        asyncio.run(concurrent())
+        concurrent_time = time.perf_counter() - start
+
+        print(f"latency {latency * 1000:>3.0f} ms: emulate {per_call:6.2f} ms/call, "
+              f"{calls} concurrent emulate_async in {concurrent_time * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
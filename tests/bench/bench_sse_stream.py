@@ -0,0 +1,75 @@
+"""
+Benchmark: items/s of an `Iterator[int]` emulated function streamed from a local server.
+
+The stream is sent as small deltas (about one token each), several SSE events per
+network write. The line-by-line decoder (json.loads of every chunk) is run as well
+for comparison on the raw deltas.
+
+Run with:
+    python tests/bench/bench_sse_stream.py [nb_items]
+"""
+
+import json
+import sys
+import time
+
+from typing import Iterator
+
+from OpenHosta import emulate
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+from stub_server import StubLLMServer
+
+
+class LineByLineModel(OpenAICompatibleModel):
+    """Decodes each SSE line with json.loads, as before the incremental decoder."""
+    def _generate_stream_without_retry(self, messages, **kwargs):
+        full_url, headers, l_body = self._prepare_chat_request(messages, stream=True, **kwargs)
+        with self.get_http_session().post(full_url, headers=headers, json=l_body, timeout=self.timeout, stream=True) as response:
+            for raw_line in response.iter_lines():
+                line = raw_line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+                if delta:
+                    yield delta
+
+
+def make_stream(nb_items: int):
+    text = "".join(f"```python\n{i}\n```\n" for i in range(nb_items))
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def run(nb_items: int = 10_000):
+    messages = [{"role": "user", "content": "hello"}]
+    with StubLLMServer(stream=make_stream(nb_items), events_per_write=64) as server:
+        model = OpenAICompatibleModel(model_name="stub", base_url=server.base_url)
+        pipeline = OneTurnConversationPipeline(model_list=[model])
+
+        def numbers(count: int) -> Iterator[int]:
+            """Return `count` numbers."""
+            return emulate(pipeline=pipeline)
+
+        start = time.perf_counter()
+        nb_received = sum(1 for _ in numbers(nb_items))
+        items_duration = time.perf_counter() - start
+
+        durations = {}
+        for name, stream_model in (("line by line", LineByLineModel(model_name="stub", base_url=server.base_url)),
+                                   ("incremental", model)):
+            start = time.perf_counter()
+            nb_deltas = sum(1 for _ in stream_model.generate_stream(messages))
+            durations[name] = time.perf_counter() - start
+
+    print(f"items streamed       : {nb_received}, {nb_deltas} SSE events")
+    print(f"emulate Iterator[int]: {items_duration:.2f} s, {nb_received / items_duration:.0f} items/s")
+    for name, duration in durations.items():
+        print(f"decoder {name:<13}: {duration:.2f} s, {nb_deltas / duration:.0f} events/s")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
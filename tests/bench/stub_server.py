@@ -0,0 +1,452 @@
+"""
+Local OpenAI-compatible stub server used by benchmarks and offline tests.
+
+It answers `/v1/chat/completions` (plain and SSE streaming), `/v1/embeddings`,
+Ollama `/api/chat`, `/api/generate` (plain and NDJSON streaming) and `/api/embed`,
+Anthropic `/v1/messages` (with prompt caching usage), Gemini `:batchEmbedContents` and the OpenAI Batch API
+(`/v1/files`, `/v1/batches`)
+with deterministic payloads, so that the transport layer of OpenHosta can be
+measured without network access.
+
+Usage:
+    with StubLLMServer(reply="42") as server:
+        model = OpenAICompatibleModel(model_name="stub", base_url=server.base_url)
+"""
+
+import base64
+import email.parser
+import email.policy
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_embedding(text: str, dimensions: int = 8):
+    """Deterministic pseudo-embedding of `text`."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i] - 128) / 128.0 for i in range(dimensions)]
+
+
+def base64_embedding(vector) -> str:
+    """`vector` as sent with encoding_format="base64": little-endian float32 bytes."""
+    return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Real servers disable Nagle, otherwise headers and body writes wait for a delayed ACK
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, status: int, payload: dict, headers: dict = {}):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub: StubLLMServer = self.server.stub
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "batches":
+            batch = stub.poll_batch(parts[-1])
+            if batch is None:
+                self._send_json(404, {"error": {"message": "No such batch"}})
+            else:
+                self._send_json(200, batch)
+        elif len(parts) >= 3 and parts[-1] == "content" and parts[-3] == "files":
+            data = stub.files.get(parts[-2])
+            if data is None:
+                self._send_json(404, {"error": {"message": "No such file"}})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": f"Unknown route {self.path}"})
+
+    def _upload_file(self):
+        stub: StubLLMServer = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + raw)
+        data = b""
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                data = part.get_payload(decode=True)
+        self._send_json(200, {"id": stub.add_file(data), "object": "file", "purpose": "batch", "bytes": len(data)})
+
+    def do_POST(self):
+        stub: StubLLMServer = self.server.stub
+        if self.path.endswith("/files"):
+            self._upload_file()
+            return
+        body = self._read_json()
+        with stub.lock:
+            stub.requests += 1
+            stub.bodies.append(body)
+        failure = stub.next_failure()
+        if failure == "reset":
+            # Abort the connection with a TCP RST, like a crashed upstream
+            self.request.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            return
+        if failure is not None:
+            status, headers = failure if isinstance(failure, tuple) else (failure, {})
+            self._send_json(status, {"error": {"message": f"Scripted failure {status}"}}, headers)
+            return
+
+        if not stub.admit():
+            with stub.lock:
+                stub.rejected += 1
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"Retry-After": "1"})
+            return
+
+        if stub.latency > 0:
+            time.sleep(stub.latency)
+
+        if self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                self._stream_chat(body)
+            else:
+                stub.wait_for_generation(body)
+                self._send_json(200, stub.chat_response(body))
+        elif self.path.endswith("/embeddings"):
+            texts = body.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            encode = base64_embedding if body.get("encoding_format") == "base64" else (lambda vector: vector)
+            self._send_json(200, {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": encode(stub_embedding(t, stub.dimensions))}
+                    for i, t in enumerate(texts)
+                ],
+                "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)},
+            })
+        elif self.path.endswith("/messages"):
+            self._send_json(200, stub.anthropic_response(body))
+        elif self.path.endswith("/batches"):
+            self._send_json(200, stub.create_batch(body))
+        elif self.path.endswith("/api/chat") or self.path.endswith("/api/generate"):
+            # Ollama streams unless told otherwise
+            if body.get("stream", True):
+                self._stream_ollama(body)
+            else:
+                stub.wait_for_generation(body)
+                self._send_json(200, stub.ollama_response(body, self.path.endswith("/api/chat")))
+        elif self.path.endswith("/api/embed"):
+            texts = body.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            if stub.identical_batch_embeddings and len(texts) > 1:
+                # Bug of some Ollama versions: every input gets the vector of the first one
+                texts = [texts[0]] * len(texts)
+            self._send_json(200, {"embeddings": [stub_embedding(t, stub.dimensions) for t in texts]})
+        elif ":batchEmbedContents" in self.path:
+            self._send_json(200, {"embeddings": [
+                {"values": stub_embedding(r["content"]["parts"][0]["text"], stub.dimensions)}
+                for r in body.get("requests", [])
+            ]})
+        else:
+            self._send_json(404, {"error": f"Unknown route {self.path}"})
+
+    def _stream_chat(self, body: dict):
+        stub: StubLLMServer = self.server.stub
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+        events = []
+        for delta in stub.stream_chunks(body):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+            events.append(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            # Group SSE events in network writes like a real server would do
+            if len(events) >= stub.events_per_write:
+                write_chunk(b"".join(events))
+                events = []
+                stub.wait_between_writes()
+        events.append(b"data: [DONE]\n\n")
+        write_chunk(b"".join(events))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _stream_ollama(self, body: dict):
+        stub: StubLLMServer = self.server.stub
+        chat = self.path.endswith("/api/chat")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+        lines = []
+        for delta in stub.stream_chunks(body):
+            chunk = {"model": body.get("model", "stub"), "done": False}
+            if chat:
+                chunk["message"] = {"role": "assistant", "content": delta}
+            else:
+                chunk["response"] = delta
+            lines.append(json.dumps(chunk).encode("utf-8") + b"\n")
+            if len(lines) >= stub.events_per_write:
+                write_chunk(b"".join(lines))
+                lines = []
+                stub.wait_between_writes()
+        final = stub.ollama_response(body, chat)
+        if chat:
+            final["message"]["content"] = ""
+        else:
+            final["response"] = ""
+        lines.append(json.dumps(final).encode("utf-8") + b"\n")
+        write_chunk(b"".join(lines))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open hundreds of connections at once
+    request_queue_size = 1024
+
+
+class StubLLMServer:
+    """
+    Threaded HTTP/1.1 server mimicking an OpenAI-compatible API.
+
+    Args:
+        reply: Content returned by chat completions (str, or callable taking the request body).
+        latency: Seconds to wait before answering each request.
+        stream: Deltas sent in streaming mode (list of str, or callable taking the request body).
+            Defaults to `reply` cut in 4 characters pieces.
+        dimensions: Size of the returned embeddings.
+        stream_interval: Seconds between two network writes of a stream, like a model generating tokens.
+        requests_per_second_quota: When set, requests above this quota (fixed one second
+            windows, like most providers) are answered with HTTP 429.
+
+    `failures` is a list of failures returned, in order, by the next requests:
+    a status code, a (status code, headers) tuple, or "reset" to abort the connection.
+
+    Batches report "in_progress" to their first `batch_polls` polls. Requests whose
+    custom_id is in `batch_row_errors` fail once and are written to the error file.
+    """
+
+    def __init__(self, reply="42", latency: float = 0.0, stream=None, dimensions: int = 8, events_per_write: int = 1,
+                 requests_per_second_quota: int = None, stream_interval: float = 0.0):
+        self.requests_per_second_quota = requests_per_second_quota
+        self._quota_window = 0
+        self._quota_used = 0
+        self.reply = reply
+        self.latency = latency
+        self.stream = stream
+        self.dimensions = dimensions
+        self.events_per_write = events_per_write
+        self.stream_interval = stream_interval
+        self.identical_batch_embeddings = False
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.rejected = 0
+        self.failures = []
+        self.bodies = []
+        self.prompt_prefixes = set()
+
+        self.files = {}
+        self.batches = {}
+        self.batch_polls = 1
+        self.batch_row_errors = []
+
+        self._httpd = None
+        self._thread = None
+
+    def next_failure(self):
+        with self.lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def admit(self) -> bool:
+        """Count the request against the quota. Returns False if it must be rejected."""
+        if self.requests_per_second_quota is None:
+            return True
+        with self.lock:
+            window = int(time.monotonic())
+            if window != self._quota_window:
+                self._quota_window = window
+                self._quota_used = 0
+            self._quota_used += 1
+            return self._quota_used <= self.requests_per_second_quota
+
+    def reply_text(self, body: dict) -> str:
+        return self.reply(body) if callable(self.reply) else str(self.reply)
+
+    def chat_response(self, body: dict) -> dict:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply_text(body)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15,
+                      "prompt_tokens_details": {"cached_tokens": self.cached_prefix_tokens(body.get("messages", []))}},
+        }
+
+    def cached_prefix_tokens(self, messages: list) -> int:
+        """Prefix caching of vLLM or OpenAI: 8 of the 10 prompt tokens are cached when the first message was seen."""
+        if not messages:
+            return 0
+        prefix = json.dumps(messages[0], sort_keys=True)
+        with self.lock:
+            cached = prefix in self.prompt_prefixes
+            self.prompt_prefixes.add(prefix)
+        return 8 if cached else 0
+
+    def anthropic_response(self, body: dict) -> dict:
+        """Messages API answer. A system block with cache_control is written to the cache, then read from it."""
+        system = body.get("system")
+        cached = isinstance(system, list) and any("cache_control" in block for block in system)
+        prefix_tokens = self.cached_prefix_tokens([system]) if cached else 0
+        return {
+            "id": "msg-stub", "type": "message", "role": "assistant", "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": self.reply_text(body)}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 2 if cached else 10, "output_tokens": 5,
+                      "cache_creation_input_tokens": 8 if cached and not prefix_tokens else 0,
+                      "cache_read_input_tokens": prefix_tokens},
+        }
+
+    def ollama_response(self, body: dict, chat: bool) -> dict:
+        response = {"model": body.get("model", "stub"), "done": True, "done_reason": "stop",
+                    "prompt_eval_count": 10, "eval_count": 5}
+        if chat:
+            response["message"] = {"role": "assistant", "content": self.reply_text(body)}
+        else:
+            response["response"] = self.reply_text(body)
+        return response
+
+    def wait_between_writes(self):
+        if self.stream_interval > 0:
+            time.sleep(self.stream_interval)
+
+    def wait_for_generation(self, body: dict):
+        """A non-streamed answer is sent once the whole stream would have been generated."""
+        if self.stream_interval > 0:
+            writes = -(-len(self.stream_chunks(body)) // self.events_per_write)
+            time.sleep(self.stream_interval * writes)
+
+    def add_file(self, data: bytes) -> str:
+        with self.lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = data
+        return file_id
+
+    def create_batch(self, body: dict) -> dict:
+        """Run every request of the input file at once; results are revealed after `batch_polls` polls."""
+        outputs, errors = [], []
+        for line in self.files[body["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            with self.lock:
+                self.bodies.append(request["body"])
+                failed = custom_id in self.batch_row_errors
+                if failed:
+                    self.batch_row_errors.remove(custom_id)
+            if failed:
+                errors.append({"id": f"req-{custom_id}", "custom_id": custom_id, "response": None,
+                               "error": {"code": "server_error", "message": "Scripted row failure"}})
+            else:
+                outputs.append({"id": f"req-{custom_id}", "custom_id": custom_id, "error": None,
+                                "response": {"status_code": 200, "body": self.chat_response(request["body"])}})
+
+        def jsonl(lines):
+            return "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+
+        with self.lock:
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "batch": {"id": batch_id, "object": "batch", "status": "in_progress",
+                          "input_file_id": body["input_file_id"], "endpoint": body.get("endpoint"),
+                          "output_file_id": None, "error_file_id": None},
+                "polls": self.batch_polls,
+                "output": jsonl(outputs),
+                "errors": jsonl(errors) if errors else None,
+            }
+            return dict(self.batches[batch_id]["batch"])
+
+    def poll_batch(self, batch_id: str):
+        with self.lock:
+            state = self.batches.get(batch_id)
+            if state is None:
+                return None
+            if state["polls"] > 0:
+                state["polls"] -= 1
+                return dict(state["batch"])
+        if state["batch"]["status"] != "completed":
+            output_file_id = self.add_file(state["output"])
+            error_file_id = self.add_file(state["errors"]) if state["errors"] is not None else None
+            state["batch"].update(status="completed", output_file_id=output_file_id, error_file_id=error_file_id)
+        return dict(state["batch"])
+
+    def stream_chunks(self, body: dict):
+        if self.stream is None:
+            text = self.reply_text(body)
+            return [text[i:i + 4] for i in range(0, len(text), 4)]
+        return self.stream(body) if callable(self.stream) else self.stream
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._httpd = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The stub server is shared with the benchmarks in tests/bench
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+from stub_server import StubLLMServer
+
+
+@pytest.fixture
+def stub_server():
+    with StubLLMServer() as server:
+        yield server
@@ -0,0 +1,99 @@
+import json
+import re
+
+import pytest
+
+from OpenHosta import emulate
+from OpenHosta.core.errors import RequestError
+from OpenHosta.exec.batch import BatchError, BatchRunner, emulate_batch
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+def last_user_text(body):
+    content = body["messages"][-1]["content"]
+    return content if isinstance(content, str) else "".join(part.get("text", "") for part in content)
+
+
+def marker(body) -> str:
+    return re.search(r"<(\d+)>", last_user_text(body)).group(1)
+
+
+def make_function(stub_server):
+    # The stub answers the number written between brackets in the prompt
+    stub_server.reply = marker
+    pipeline = OneTurnConversationPipeline(model_list=[OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)])
+
+    def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    return read_number
+
+
+def batch_bodies(stub_server):
+    return [body for body in stub_server.bodies if "input_file_id" in body]
+
+
+def test_results_are_typed_and_in_input_order(stub_server, tmp_path):
+    read_number = make_function(stub_server)
+
+    results = emulate_batch(read_number, ["<1>", "<3>", "<0>", "<2>"], str(tmp_path), poll_interval=0.01)
+
+    assert results == [1, 3, 0, 2]
+    lines = [json.loads(line) for line in (tmp_path / "batch-1.jsonl").read_text().splitlines()]
+    assert [line["custom_id"] for line in lines] == ["row-0", "row-1", "row-2", "row-3"]
+    assert lines[0]["method"] == "POST" and lines[0]["url"] == "/v1/chat/completions"
+    assert lines[0]["body"]["model"] == "stub"
+    assert stub_server.requests == len(batch_bodies(stub_server)) == 1
+
+
+def test_failed_rows_are_retried_alone(stub_server, tmp_path):
+    read_number = make_function(stub_server)
+    stub_server.batch_row_errors = ["row-1"]
+
+    results = BatchRunner(read_number, str(tmp_path), poll_interval=0.01).run(["<1>", "<2>", "<3>"])
+
+    assert results == [1, 2, 3]
+    assert len(batch_bodies(stub_server)) == 2
+    assert [json.loads(line)["custom_id"] for line in (tmp_path / "batch-2.jsonl").read_text().splitlines()] == ["row-1"]
+
+
+def test_unparsable_answers_are_retried(stub_server, tmp_path):
+    read_number = make_function(stub_server)
+    answers = iter(["not a number", "2"])
+    stub_server.reply = lambda body: next(answers) if marker(body) == "2" else "1"
+
+    assert emulate_batch(read_number, ["<1>", "<2>"], str(tmp_path), poll_interval=0.01) == [1, 2]
+
+
+def test_rows_failing_every_retry(stub_server, tmp_path):
+    read_number = make_function(stub_server)
+    stub_server.batch_row_errors = ["row-0"] * 3
+
+    with pytest.raises(BatchError) as error:
+        emulate_batch(read_number, ["<1>", "<2>"], str(tmp_path), poll_interval=0.01, max_row_retries=2)
+
+    assert error.value.results == [None, 2]
+    assert list(error.value.errors) == [0]
+    assert len(batch_bodies(stub_server)) == 3
+
+
+def test_interrupted_runs_resume(stub_server, tmp_path):
+    read_number = make_function(stub_server)
+    stub_server.batch_polls = 1000
+
+    with pytest.raises(RequestError):
+        emulate_batch(read_number, ["<1>", "<2>"], str(tmp_path), poll_interval=0.01, timeout=0.05)
+
+    # The same batch is polled again instead of being submitted twice
+    stub_server.batches["batch-1"]["polls"] = 0
+    assert emulate_batch(read_number, ["<1>", "<2>"], str(tmp_path), poll_interval=0.01) == [1, 2]
+    assert len(batch_bodies(stub_server)) == 1
+
+    # Answers are kept: a finished run is not sent again
+    assert emulate_batch(read_number, ["<1>", "<2>"], str(tmp_path), poll_interval=0.01) == [1, 2]
+    assert len(batch_bodies(stub_server)) == 1
+
+    with pytest.raises(ValueError):
+        emulate_batch(read_number, ["other rows"], str(tmp_path))
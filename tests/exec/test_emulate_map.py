@@ -0,0 +1,97 @@
+import asyncio
+import re
+import threading
+import time
+
+from OpenHosta import closure, emulate, emulate_async
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+def make_pipeline(stub_server, delays={}, **kwargs):
+    lock = threading.Lock()
+    stub_server.in_flight = stub_server.max_in_flight = 0
+
+    def reply(body):
+        # The stub answers the number written between brackets in the prompt
+        number = re.search(r"<(\d+)>", body["messages"][-1]["content"][0]["text"]).group(1)
+        with lock:
+            stub_server.in_flight += 1
+            stub_server.max_in_flight = max(stub_server.max_in_flight, stub_server.in_flight)
+        time.sleep(delays.get(number, 0.05))
+        with lock:
+            stub_server.in_flight -= 1
+        return "not a number" if number == "7" else number
+
+    stub_server.reply = reply
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0, **kwargs)
+    return OneTurnConversationPipeline(model_list=[model])
+
+
+def test_map_keeps_input_order_within_the_limit(stub_server):
+    pipeline = make_pipeline(stub_server, delays={"0": 0.3})
+
+    def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    progress = []
+    start = time.perf_counter()
+    results = emulate.map(read_number, [f"<{i}>" for i in range(8) if i != 7], max_concurrency=3,
+                          on_progress=lambda done, total: progress.append((done, total)))
+
+    assert results == [0, 1, 2, 3, 4, 5, 6]
+    assert stub_server.max_in_flight == 3
+    # The slow first row does not hold the others back
+    assert time.perf_counter() - start < 0.45
+    assert progress == [(done, 7) for done in range(1, 8)]
+
+    pairs = list(emulate.map(read_number, ["<0>", "<1>", "<2>"], max_concurrency=3, ordered=False))
+    assert pairs[-1] == (0, 0) and sorted(pairs) == [(0, 0), (1, 1), (2, 2)]
+
+
+def test_failed_rows_and_timeouts_take_their_place(stub_server):
+    pipeline = make_pipeline(stub_server, delays={"9": 1.0})
+    add_one = closure("Return the number between brackets plus one", pipeline=pipeline, force_return_type=int)
+
+    results = emulate.map(add_one, ["<1>", "<7>", "<9>", "<3>"], timeout=0.5, pipeline=pipeline)
+
+    assert results[0] == 1 and results[3] == 3
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], TimeoutError)
+
+
+def test_amap_awaits_async_functions(stub_server):
+    pipeline = make_pipeline(stub_server, max_async_calls=2)
+
+    async def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return await emulate_async(pipeline=pipeline)
+
+    async def run():
+        ordered = await emulate.amap(read_number, [f"<{i}>" for i in range(6)], pipeline=pipeline)
+        pairs = [pair async for pair in emulate.amap(read_number, {"<1>", "<2>"}, pipeline=pipeline, ordered=False)]
+        return ordered, pairs
+
+    ordered, pairs = asyncio.run(run())
+
+    assert ordered == [0, 1, 2, 3, 4, 5]
+    assert sorted(result for _, result in pairs) == [1, 2]
+    # Limited by max_async_calls of the model
+    assert stub_server.max_in_flight == 2
+
+
+def test_amap_timed_out_threads_keep_their_slot(stub_server):
+    pipeline = make_pipeline(stub_server, delays={"9": 0.6})
+
+    def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    rows = ["<9>"] + [f"<{i}>" for i in range(1, 7)]
+    results = asyncio.run(emulate.amap(read_number, rows, max_concurrency=2, timeout=0.2))
+
+    assert isinstance(results[0], TimeoutError)
+    assert results[1:] == [1, 2, 3, 4, 5, 6]
+    # The request of the timed-out row cannot be interrupted: no other row took its slot
+    assert stub_server.max_in_flight == 2
@@ -0,0 +1,116 @@
+import asyncio
+import re
+import time
+
+from dataclasses import dataclass
+from enum import Enum
+
+import PIL.Image
+from pydantic import BaseModel
+
+from OpenHosta import closure, emulate, emulate_async
+from OpenHosta.core.cache import DiskCache, MemoryCache
+from OpenHosta.exec.memoize import canonical_value, memoize
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Item(BaseModel):
+    name: str
+    tags: list
+
+
+def make_pipeline(stub_server):
+    # The stub answers the number written between brackets in the prompt
+    stub_server.reply = lambda body: re.search(r"<(\d+)>", body["messages"][-1]["content"][0]["text"]).group(1)
+    return OneTurnConversationPipeline(model_list=[OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)])
+
+
+def test_hits_skip_the_request(stub_server):
+    pipeline = make_pipeline(stub_server)
+
+    @memoize(pipeline=pipeline)
+    def read_number(text: str, base: int = 10) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    assert [read_number("<1>"), read_number("<2>"), read_number("<1>"), read_number("<1>", base=10)] == [1, 2, 1, 1]
+    assert stub_server.requests == 2
+    assert read_number.cache_info() == {"hits": 2, "misses": 2, "bypassed": 0}
+
+    # A new docstring or meta-prompt is a new function
+    read_number.__wrapped__.__doc__ = "Return the number written between brackets."
+    read_number("<1>")
+    pipeline.emulate_meta_prompt.source = pipeline.emulate_meta_prompt.source + "\nBe accurate."
+    read_number("<1>")
+    assert stub_server.requests == 4
+
+
+def test_disk_store_survives_restarts_and_expires(stub_server, tmp_path):
+    pipeline = make_pipeline(stub_server)
+    path = str(tmp_path / "memo.sqlite")
+
+    def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    assert memoize(read_number, store=DiskCache(path), pipeline=pipeline)("<3>") == 3
+    # Another process would decorate the same function again
+    restarted = memoize(read_number, store=DiskCache(path), pipeline=pipeline)
+    assert restarted("<3>") == 3 and restarted.cache_info()["hits"] == 1
+
+    short_lived = memoize(read_number, store=MemoryCache(ttl=0.05), pipeline=pipeline)
+    short_lived("<4>")
+    time.sleep(0.1)
+    short_lived("<4>")
+    assert stub_server.requests == 3
+
+
+def test_arguments_are_hashed_by_content():
+    image = PIL.Image.new("RGB", (4, 4), "red")
+
+    assert canonical_value(Point(1, 2)) == canonical_value(Point(1, 2)) != canonical_value(Point(2, 1))
+    assert canonical_value(Item(name="a", tags=[1])) == canonical_value(Item(name="a", tags=[1]))
+    assert canonical_value({"b": Color.RED, "a": {2, 1}}) == canonical_value({"a": {1, 2}, "b": Color.RED})
+    assert canonical_value(image) == canonical_value(image.copy()) != canonical_value(PIL.Image.new("RGB", (4, 4), "blue"))
+    assert canonical_value((1, True)) != canonical_value([1, 1])
+
+
+def test_closures_async_functions_and_unhashable_arguments(stub_server):
+    pipeline = make_pipeline(stub_server)
+    as_int = memoize(closure("Return the number between brackets", pipeline=pipeline, force_return_type=int), pipeline=pipeline)
+    as_str = memoize(closure("Return the number between brackets", pipeline=pipeline, force_return_type=str), pipeline=pipeline)
+
+    assert [as_int("<5>"), as_int("<5>"), as_str("<5>")] == [5, 5, "5"]
+    assert stub_server.requests == 2
+
+    @memoize(pipeline=pipeline)
+    async def read_number(text: str) -> int:
+        """Return the number between brackets."""
+        return await emulate_async(pipeline=pipeline)
+
+    assert asyncio.run(read_number("<6>")) == asyncio.run(read_number("<6>")) == 6
+    assert stub_server.requests == 3
+
+    class Box:
+        def __repr__(self):
+            return "<7>"
+
+    @memoize(pipeline=pipeline)
+    def unbox(value: object) -> int:
+        """Return the number between brackets."""
+        return emulate(pipeline=pipeline)
+
+    assert unbox(Box()) == unbox(Box()) == 7
+    assert unbox.cache_info()["bypassed"] == 2 and stub_server.requests == 5
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+httpx = pytest.importorskip("httpx")
+
+
+@pytest.mark.asyncio
+async def test_generate_async_is_not_bound_to_thread_pool(stub_server):
+    stub_server.latency = 0.2
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, max_async_calls=2)
+    assert model.supports_native_async()
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        model.generate_async([{"role": "user", "content": f"call {i}"}]) for i in range(40)
+    ])
+    duration = time.perf_counter() - start
+
+    assert len(responses) == 40
+    assert all(r["choices"][0]["message"]["content"] == "42" for r in responses)
+    # 40 calls of 0.2s on 2 threads would take 4s
+    assert duration < 2
+    assert model.async_executor is None
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_semaphore_bounds_in_flight_requests(stub_server):
+    stub_server.latency = 0.1
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, max_concurrent_async_requests=5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[model.generate_async([{"role": "user", "content": "hi"}]) for i in range(10)])
+    duration = time.perf_counter() - start
+
+    assert duration >= 0.2
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_async_reads_sse_on_event_loop(stub_server):
+    stub_server.stream = ["Hello", " ", "World", "!"]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+
+    chunks = [chunk async for chunk in model.generate_stream_async([{"role": "user", "content": "hi"}])]
+
+    assert chunks == ["Hello", " ", "World", "!"]
+    assert stub_server.bodies[-1]["stream"] is True
+    assert model.async_executor is None
+    await model.aclose()
+
+
+def test_overridden_sync_transport_keeps_thread_pool():
+    class CustomModel(OpenAICompatibleModel):
+        def _generate_without_retry(self, messages, **kwargs):
+            return {"choices": [{"message": {"content": "custom"}}]}
+
+    model = CustomModel(model_name="custom", base_url="http://localhost:1")
+    assert not model.supports_native_async()
+
+    response = asyncio.run(model.generate_async([{"role": "user", "content": "hi"}]))
+    assert response["choices"][0]["message"]["content"] == "custom"
+
+
+def test_async_client_is_closed_with_its_event_loop(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+
+    async def call():
+        await model.generate_async([{"role": "user", "content": "hi"}])
+        return model.get_async_client()
+
+    clients = [asyncio.run(call()) for _ in range(3)]
+
+    assert len(set(map(id, clients))) == 3
+    assert all(client.is_closed for client in clients)
+
+
+def test_close_releases_async_clients(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(model.generate_async([{"role": "user", "content": "hi"}]))
+        client = next(iter(model._async_clients.values()))
+
+        model.close()
+
+        assert client.is_closed
+        assert len(model._async_clients) == 0
+    finally:
+        loop.close()
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_pool_follows_max_concurrent_async_requests(stub_server):
+    stub_server.latency = 0.05
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, max_concurrent_async_requests=20)
+
+    for _ in range(2):
+        await asyncio.gather(*[model.generate_async([{"role": "user", "content": "hi"}]) for _ in range(20)])
+
+    # The second wave reuses the connections of the first one
+    assert stub_server.connections <= 20
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_transport_errors_are_request_errors_and_retried(stub_server):
+    from OpenHosta.core.errors import RequestError
+    from OpenHosta.core.retry_policy import RetryPolicy
+
+    stub_server.failures = ["reset"]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                  retry_policy=RetryPolicy(initial_delay=0.01, max_delay=0.02))
+    assert (await model.generate_async([{"role": "user", "content": "hi"}]))["choices"][0]["message"]["content"] == "42"
+    assert stub_server.requests == 2
+    await model.aclose()
+
+    unreachable = OpenAICompatibleModel(model_name="stub", base_url="http://127.0.0.1:9/v1", retry_delay=0)
+    with pytest.raises(RequestError):
+        await unreachable.generate_async([{"role": "user", "content": "hi"}])
+    with pytest.raises(RequestError):
+        async for _ in unreachable.generate_stream_async([{"role": "user", "content": "hi"}]):
+            pass
+    await unreachable.aclose()
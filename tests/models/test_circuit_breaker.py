@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+
+from stub_server import StubLLMServer
+
+from OpenHosta import emulate, emulate_async
+from OpenHosta.core.audit import register_audit_callback, unregister_audit_callback
+from OpenHosta.core.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from OpenHosta.core.errors import CircuitOpenError, RequestError
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def audit_events():
+    events = []
+    register_audit_callback(events.append)
+    yield events
+    unregister_audit_callback(events.append)
+
+
+def make_model(server, **kwargs):
+    breaker = CircuitBreaker(**kwargs)
+    return OpenAICompatibleModel(model_name="stub", base_url=server.base_url, retry_delay=0, circuit_breaker=breaker)
+
+
+def test_breaker_opens_on_errors_and_fails_fast(stub_server, audit_events):
+    stub_server.failures = [500] * 4
+    model = make_model(stub_server, minimum_calls=4, failure_rate_threshold=0.75)
+
+    for _ in range(3):
+        with pytest.raises(RequestError):
+            model.generate(MESSAGES)
+    with pytest.raises(RequestError):
+        list(model.generate_stream(MESSAGES))
+
+    assert model.circuit_breaker.state == OPEN and not model.is_available()
+    with pytest.raises(CircuitOpenError):
+        model.generate(MESSAGES)
+    assert stub_server.requests == 4
+    opened = [e for e in audit_events if e.event_type == "circuit_breaker_open"]
+    assert len(opened) == 1 and opened[0].details["model"] == "stub" and opened[0].details["failure_rate"] == 1.0
+
+
+def test_trial_call_closes_or_reopens_the_breaker(stub_server, audit_events):
+    stub_server.failures = [503] * 3
+    model = make_model(stub_server, minimum_calls=2, cooldown=0.05)
+    for _ in range(2):
+        with pytest.raises(RequestError):
+            model.generate(MESSAGES)
+
+    time.sleep(0.06)
+    assert model.is_available()
+    with pytest.raises(RequestError):
+        model.generate(MESSAGES)
+    assert model.circuit_breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert model.get_response_content(model.generate(MESSAGES)) == "42"
+    assert model.circuit_breaker.state == CLOSED
+    assert [e.event_type for e in audit_events] == [
+        "circuit_breaker_open", "circuit_breaker_half_open", "circuit_breaker_open",
+        "circuit_breaker_half_open", "circuit_breaker_closed"]
+
+
+def test_request_errors_and_slow_calls(stub_server):
+    stub_server.failures = [400] * 3
+    model = make_model(stub_server, minimum_calls=3)
+    for _ in range(3):
+        with pytest.raises(RequestError):
+            model.generate(MESSAGES)
+    assert model.circuit_breaker.state == CLOSED
+
+    stub_server.latency = 0.05
+    model = make_model(stub_server, minimum_calls=2, slow_call_duration=0.01)
+
+    async def main():
+        for _ in range(2):
+            await model.generate_async(MESSAGES)
+
+    asyncio.run(main())
+    assert model.circuit_breaker.state == OPEN
+
+
+def test_push_choose_model_skips_open_breakers(stub_server):
+    with StubLLMServer(reply="7") as backup_server:
+        primary = make_model(stub_server, cooldown=0.05)
+        backup = make_model(backup_server)
+        pipeline = OneTurnConversationPipeline(model_list=[primary, backup])
+
+        def count(text: str) -> int:
+            """Count the words of the text."""
+            return emulate(pipeline=pipeline)
+
+        primary.circuit_breaker._transition(OPEN)
+        assert count("a b c d e f g") == 7
+        assert stub_server.requests == 0
+
+        time.sleep(0.06)
+        assert count("a b c d e f g") == 42
+        assert primary.circuit_breaker.state == CLOSED
+
+        primary.circuit_breaker._transition(OPEN)
+        backup.circuit_breaker._transition(OPEN)
+        with pytest.raises(CircuitOpenError):
+            count("a b")
+
+
+def test_breaker_opening_during_the_call_moves_to_the_next_model(stub_server):
+    with StubLLMServer(reply="7") as backup_server:
+        primary = make_model(stub_server, minimum_calls=1)
+        backup = make_model(backup_server)
+        pipeline = OneTurnConversationPipeline(model_list=[primary, backup])
+
+        def count(text: str) -> int:
+            """Count the words of the text."""
+            return emulate(pipeline=pipeline)
+
+        async def count_async(text: str) -> int:
+            """Count the words of the text."""
+            return await emulate_async(pipeline=pipeline)
+
+        # The failure of the call opens the breaker of the primary model
+        stub_server.failures = [503]
+        assert count("a b c d e f g") == 7
+        assert primary.circuit_breaker.state == OPEN
+        assert (stub_server.requests, backup_server.requests) == (1, 1)
+
+        # The breaker went half-open after push_choose_model and its trial slot is taken
+        primary.circuit_breaker._transition(CLOSED)
+        real_before_call = primary.circuit_breaker.before_call
+
+        def trial_taken():
+            primary.circuit_breaker._transition(OPEN)
+            real_before_call()
+
+        primary.circuit_breaker.before_call = trial_taken
+        assert asyncio.run(count_async("a b c d e f g")) == 7
+        assert (stub_server.requests, backup_server.requests) == (1, 2)
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from OpenHosta.core.cache import EmbeddingCache
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.retry_policy import RetryPolicy
+from OpenHosta.models.GeminiModel import GeminiModel
+from OpenHosta.models.OllamaCompatible import OllamaModel
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+FAST = RetryPolicy(initial_delay=0.01, max_delay=0.02)
+TEXTS = [f"text {i}" for i in range(50)]
+
+
+def make_model(stub_server, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_policy=FAST,
+                                 embedding_cache=EmbeddingCache(), **kwargs)
+
+
+def test_split_by_count_and_tokens(stub_server):
+    model = make_model(stub_server, embedding_batch_size=3, embedding_batch_tokens=10)
+
+    chunks = model.split_embedding_input(["a", "b", "c", "d", "x" * 40, "e"])
+
+    assert chunks == [["a", "b", "c"], ["d"], ["x" * 40], ["e"]]
+
+
+def test_chunks_are_sent_in_parallel_and_stitched_in_order(stub_server):
+    stub_server.latency = 0.1
+    model = make_model(stub_server, embedding_batch_size=5, max_async_calls=10)
+    reference = make_model(stub_server, embedding_batch_size=1000)
+
+    vectors = model.embed(TEXTS)
+
+    assert stub_server.requests == 10
+    assert all(len(body["input"]) == 5 for body in stub_server.bodies)
+    assert vectors == reference.embed(TEXTS)
+    assert stub_server.requests == 11
+
+
+def test_failed_chunks_are_retried_alone(stub_server):
+    stub_server.failures = [503, 503]
+    model = make_model(stub_server, embedding_batch_size=10)
+
+    vectors = model.embed(TEXTS)
+
+    assert len(vectors) == 50
+    assert stub_server.requests == 5 + 2
+
+
+def test_successful_chunks_are_kept_when_one_fails(stub_server):
+    stub_server.failures = [400]
+    model = make_model(stub_server, embedding_batch_size=10)
+
+    with pytest.raises(RequestError):
+        model.embed(TEXTS)
+    model.embed(TEXTS)
+
+    # Only the failed chunk is sent again
+    assert stub_server.requests == 5 + 1
+
+
+def test_concurrency_is_bounded_by_max_async_calls(stub_server):
+    stub_server.latency = 0.05
+    model = make_model(stub_server, embedding_batch_size=1, max_async_calls=3)
+    active, peak, lock = [0], [0], threading.Lock()
+    embed_chunk = model._embed_without_retry
+
+    def counting_embed(texts, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return embed_chunk(texts, **kwargs)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    model._embed_without_retry = counting_embed
+    model.embed(TEXTS[:12])
+
+    assert peak[0] == 3
+
+
+def test_ollama_uses_native_batches(stub_server):
+    model = OllamaModel(model_name="stub", base_url=stub_server.base_url.replace("/v1", ""),
+                        embedding_cache=EmbeddingCache(), embedding_batch_size=20)
+
+    assert len(model.embed(TEXTS)) == 50
+    assert sorted(len(body["input"]) for body in stub_server.bodies) == [10, 20, 20]
+
+
+def test_ollama_batches_with_identical_vectors_are_embedded_one_by_one(stub_server):
+    stub_server.identical_batch_embeddings = True
+    cache = EmbeddingCache()
+    model = OllamaModel(model_name="stub", base_url=stub_server.base_url.replace("/v1", ""),
+                        embedding_cache=cache, embedding_batch_size=20)
+
+    vectors = model.embed(TEXTS[:5])
+
+    assert [body["input"] for body in stub_server.bodies] == [TEXTS[:5]] + TEXTS[:5]
+    assert len({tuple(vector) for vector in vectors}) == 5
+    assert model.embedding_batch_size == 1
+    # Only the vectors of the single-text requests were cached
+    assert cache.get_many("stub", TEXTS[:5]) == vectors
+    model.embed(TEXTS[5:8])
+    assert sorted(body["input"] for body in stub_server.bodies[6:]) == TEXTS[5:8]
+
+
+def test_gemini_uses_native_batches(stub_server):
+    model = GeminiModel(model_name="stub", base_url=stub_server.base_url, api_key="key",
+                        embedding_cache=EmbeddingCache())
+
+    texts = [f"gemini {i}" for i in range(150)]
+    assert len(model.embed(texts + texts)) == 300
+    # Duplicates are embedded once, in batches of at most 100 requests
+    assert sorted(len(body["requests"]) for body in stub_server.bodies) == [50, 100]
@@ -0,0 +1,75 @@
+import multiprocessing
+
+import pytest
+
+from OpenHosta.core.cache import EmbeddingCache, get_default_embedding_cache
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+
+def make_model(stub_server, cache, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                 embedding_model_name="stub-embed", embedding_cache=cache, **kwargs)
+
+
+def test_only_misses_are_sent(stub_server):
+    model = make_model(stub_server, EmbeddingCache())
+
+    first = model.embed(["a", "b"])
+    vectors = model.embed(["c", "a", "c", "b"])
+
+    assert vectors[1] == first[0] and vectors[3] == first[1] and vectors[0] == vectors[2]
+    assert [body["input"] for body in stub_server.bodies] == [["a", "b"], ["c"]]
+    assert model.embedding_cache.stats() == {"hits": 2, "misses": 2 + 2}
+
+
+def test_hits_and_misses_return_the_same_float32_values(stub_server):
+    model = make_model(stub_server, EmbeddingCache())
+
+    assert model.embed(["a"]) == model.embed(["a"])
+    assert stub_server.requests == 1
+
+
+def test_arguments_are_part_of_the_key(stub_server):
+    model = make_model(stub_server, EmbeddingCache())
+
+    model.embed(["a"])
+    model.embed(["a"], dimensions=4)
+    model.embed(["a"], dimensions=4)
+
+    assert stub_server.requests == 2
+
+
+def _embed_in_child(base_url, directory):
+    model = OpenAICompatibleModel(model_name="stub", base_url=base_url, embedding_model_name="stub-embed",
+                                  embedding_cache=EmbeddingCache(directory))
+    model.embed(["from child"])
+
+
+def test_memory_mapped_files_persist_and_are_shared(stub_server, tmp_path):
+    directory = str(tmp_path / "embeddings")
+    vectors = make_model(stub_server, EmbeddingCache(directory)).embed(["a", "b"])
+
+    # Another process appends to the same file
+    child = multiprocessing.get_context("spawn").Process(target=_embed_in_child, args=(stub_server.base_url, directory))
+    child.start()
+    child.join(30)
+    assert child.exitcode == 0
+
+    cache = EmbeddingCache(directory)
+    model = make_model(stub_server, cache)
+    assert model.embed(["b", "from child", "a"]) == [vectors[1], pytest.approx(model.embed(["from child"])[0]), vectors[0]]
+    assert stub_server.requests == 2
+    assert (tmp_path / "embeddings" / "stub-embed.f32").exists()
+    cache.close()
+
+
+def test_models_share_the_process_wide_cache(stub_server, monkeypatch):
+    monkeypatch.setattr("OpenHosta.core.cache._default_embedding_cache", EmbeddingCache())
+    first = make_model(stub_server, None)
+    second = make_model(stub_server, None)
+    assert first.get_embedding_cache() is get_default_embedding_cache()
+
+    first.embed(["shared text"])
+    second.embed(["shared text"])
+
+    assert stub_server.requests == 1
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from stub_server import StubLLMServer
+
+from OpenHosta.core.hedging import HedgePolicy
+from OpenHosta.core.load_balancer import LoadBalancer
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def slow_and_fast():
+    servers = [StubLLMServer(reply="slow", latency=0.6).start(), StubLLMServer(reply="fast").start()]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def make_model(server, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=server.base_url, retry_delay=0, **kwargs)
+
+
+def test_hedge_on_another_replica_wins(slow_and_fast):
+    slow, fast = slow_and_fast
+    policy = HedgePolicy(delay=0.05, budget=1.0)
+    model = make_model(slow, hedge_policy=policy,
+                       load_balancer=LoadBalancer([slow.base_url, fast.base_url]))
+
+    start = time.perf_counter()
+    answer = model.get_response_content(model.generate(MESSAGES))
+
+    assert answer == "fast"
+    assert time.perf_counter() - start < 0.5
+    assert policy.stats()["hedged"] == 1 and policy.stats()["hedge_wins"] == 1
+
+
+def test_hedge_on_an_alternate_model(slow_and_fast):
+    slow, fast = slow_and_fast
+    policy = HedgePolicy(delay=0.05, budget=1.0, alternate=make_model(fast))
+    model = make_model(slow, hedge_policy=policy)
+
+    assert model.get_response_content(model.generate(MESSAGES)) == "fast"
+    assert fast.requests == 1
+
+
+def test_fast_answers_are_not_hedged(stub_server):
+    policy = HedgePolicy(delay=1.0, budget=1.0)
+    model = make_model(stub_server, hedge_policy=policy)
+
+    for _ in range(3):
+        model.generate(MESSAGES)
+
+    assert stub_server.requests == 3
+    assert policy.stats()["hedged"] == 0
+    assert policy.latencies.count == 3
+
+
+def test_budget_caps_hedges(stub_server):
+    stub_server.latency = 0.1
+    policy = HedgePolicy(delay=0.01, budget=0.5)
+    model = make_model(stub_server, hedge_policy=policy)
+
+    for _ in range(4):
+        model.generate(MESSAGES)
+
+    stats = policy.stats()
+    assert stats["hedged"] == 2 and stats["budget_denied"] == 2
+    assert stats["hedge_wins"] <= 2
+
+
+def test_delay_follows_observed_latencies():
+    policy = HedgePolicy(initial_delay=3.0, quantile=0.95, min_samples=10)
+    assert policy.get_delay() == 3.0
+
+    for _ in range(10):
+        policy.latencies.observe(0.2)
+    assert policy.get_delay() == 0.25
+
+
+def test_async_loser_is_cancelled(slow_and_fast):
+    slow, fast = slow_and_fast
+    slow.latency = 2
+    policy = HedgePolicy(delay=0.05, budget=1.0)
+    balancer = LoadBalancer([slow.base_url, fast.base_url])
+    model = make_model(slow, hedge_policy=policy, load_balancer=balancer)
+
+    async def main():
+        start = time.perf_counter()
+        response = await model.generate_async(MESSAGES)
+        return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(main())
+
+    assert model.get_response_content(response) == "fast"
+    assert elapsed < 1
+    assert all(endpoint.in_flight == 0 for endpoint in balancer.endpoints)
+    assert policy.stats()["hedge_wins"] == 1
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+
+def test_session_is_reused_across_calls(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+
+    for _ in range(5):
+        response = model.generate([{"role": "user", "content": "hello"}])
+        assert response["choices"][0]["message"]["content"] == "42"
+
+    stats = model.http_pool_stats()
+    assert stats["requests"] == 5
+    assert stats["misses"] == 1
+    assert stats["hits"] == 4
+    assert stub_server.connections == 1
+
+
+def test_pool_size_follows_max_async_calls(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, max_async_calls=3)
+    stub_server.latency = 0.05
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda _: model.generate([{"role": "user", "content": "hi"}]), range(9)))
+
+    stats = model.http_pool_stats()
+    assert stats["requests"] == 9
+    assert stats["misses"] <= 3
+    assert stub_server.connections <= 3
+
+
+def test_embeddings_use_the_same_pool(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+    model.generate([{"role": "user", "content": "hello"}])
+    vectors = model.embed(["a", "b"])
+
+    assert len(vectors) == 2
+    assert model.http_pool_stats()["misses"] == 1
+
+
+def test_close_releases_session(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url)
+    model.generate([{"role": "user", "content": "hello"}])
+    model.close()
+
+    assert model.http_pool_stats()["requests"] == 0
+    model.generate([{"role": "user", "content": "hello"}])
+    assert model.http_pool_stats()["requests"] == 1
+
+
+def test_model_is_a_context_manager(stub_server):
+    with OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, http_pool_connections=2) as model:
+        model.generate([{"role": "user", "content": "hello"}])
+        adapter = model.get_http_session().get_adapter(stub_server.base_url)
+        assert adapter._pool_connections == 2
+
+    assert model._http_session is None
@@ -0,0 +1,95 @@
+import base64
+import io
+
+import pytest
+
+PIL = pytest.importorskip("PIL.Image")
+
+from OpenHosta import emulate
+from OpenHosta.core.cache import MemoryCache
+from OpenHosta.core.image_encoding import ImageEncoder
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+def noisy_image(width, height, seed=0):
+    # Random pixels: an encoded size that depends on the quality
+    import random
+    rng = random.Random(seed)
+    return PIL.frombytes("RGB", (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * 3)))
+
+
+def sent_images(body):
+    return [part["image_url"] for message in body["messages"] for part in message["content"]
+            if part["type"] == "image_url"]
+
+
+def decode(data_url):
+    return PIL.open(io.BytesIO(base64.b64decode(data_url.split("base64,")[1])))
+
+
+def test_cache_hits_on_reuse_and_retry():
+    encoder = ImageEncoder(max_edge=64, cache=MemoryCache())
+    image = noisy_image(200, 100)
+
+    image_url, downscaled = encoder.encode(image)
+    assert downscaled.size == (64, 32)
+    assert encoder.encode(image.copy())[0] == image_url
+    # A retry sends the downscaled image again
+    assert encoder.encode(downscaled)[0] == image_url
+    assert encoder.stats() == {"hits": 2, "misses": 1}
+
+
+def test_quality_format_and_low_detail():
+    image = noisy_image(1000, 500)
+    high = ImageEncoder(format="jpg", quality=95, cache=MemoryCache())
+    low = ImageEncoder(format="jpeg", quality=20, detail="low", cache=MemoryCache())
+
+    high_url, _ = high.encode(image)
+    low_url, downscaled = low.encode(image)
+
+    assert high_url["url"].startswith("data:image/jpeg;base64,")
+    assert "detail" not in high_url
+    assert low_url["detail"] == "low"
+    assert decode(low_url["url"]).size == downscaled.size == (512, 256)
+    assert len(low_url["url"]) < len(high_url["url"]) / 4
+
+
+def test_pipeline_uses_the_model_encoder(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+    model.image_encoder = ImageEncoder(format="webp", max_edge=100, cache=MemoryCache())
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    def count_shapes(first: PIL.Image, second: PIL.Image) -> int:
+        """Count the shapes of both images."""
+        return emulate(pipeline=pipeline)
+
+    def count_colors(image: PIL.Image) -> int:
+        """Count the colors of the image."""
+        return emulate(pipeline=pipeline)
+
+    first, second = noisy_image(300, 200, seed=1), noisy_image(150, 300, seed=2)
+    assert count_shapes(first, second) == 42
+    assert count_colors(first) == 42
+
+    images = sent_images(stub_server.bodies[0])
+    assert [decode(image["url"]).size for image in images] == [(100, 66), (50, 100)]
+    assert all(image["url"].startswith("data:image/webp;base64,") for image in images)
+    assert sent_images(stub_server.bodies[1]) == images[:1]
+    assert model.image_encoder.stats() == {"hits": 1, "misses": 2}
+
+
+def test_pipeline_default_encoder_follows_image_size_limit(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+    pipeline.image_size_limit = 80
+
+    def describe(image: PIL.Image) -> int:
+        """Describe the image."""
+        return emulate(pipeline=pipeline)
+
+    assert describe(noisy_image(160, 40)) == 42
+
+    image_url, = sent_images(stub_server.bodies[0])
+    assert image_url["url"].startswith("data:image/png;base64,")
+    assert decode(image_url["url"]).size == (80, 20)
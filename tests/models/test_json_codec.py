@@ -0,0 +1,49 @@
+from array import array
+
+import pytest
+
+from OpenHosta.core import json_codec
+from OpenHosta.core.cache import EmbeddingCache
+from OpenHosta.core.json_codec import OrjsonJSONCodec, StdlibJSONCodec, get_json_codec, set_json_codec
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+from stub_server import stub_embedding
+
+MESSAGES = [{"role": "user", "content": "héllo"}]
+
+
+@pytest.fixture(params=["json", "orjson"])
+def codec(request):
+    if request.param == "orjson" and json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    codec = StdlibJSONCodec() if request.param == "json" else OrjsonJSONCodec()
+    previous = get_json_codec()
+    set_json_codec(codec)
+    yield codec
+    set_json_codec(previous)
+
+
+def test_round_trip(codec):
+    payload = {"text": "é   \"q\"", "values": [1, 2.5, None, True], "big": 2 ** 70}
+    assert codec.loads(codec.dumps(payload)) == payload
+    assert codec.loads(codec.dumps(payload).decode("utf-8")) == payload
+
+
+def test_models_use_the_codec(stub_server, codec):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0,
+                                  embedding_cache=EmbeddingCache())
+
+    assert model.get_response_content(model.generate(MESSAGES)) == "42"
+    assert "".join(model.generate_stream(MESSAGES)) == "42"
+    assert stub_server.bodies[0]["messages"] == MESSAGES
+    assert model.embed(["a", "b"]) == [stub_embedding("a"), stub_embedding("b")]
+
+
+def test_base64_embeddings(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0,
+                                  embedding_cache=EmbeddingCache(), embedding_encoding_format="base64")
+
+    vectors = model.embed(["a", "b"])
+
+    assert stub_server.bodies[-1]["encoding_format"] == "base64"
+    assert vectors == [array("f", stub_embedding(text)).tolist() for text in ("a", "b")]
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+from stub_server import StubLLMServer
+
+from OpenHosta.core.cache import EmbeddingCache
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.load_balancer import LoadBalancer
+from OpenHosta.core.retry_policy import RetryPolicy
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def replicas():
+    servers = [StubLLMServer(reply=f"replica {i}").start() for i in range(3)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def make_model(servers, balancer=None, **kwargs):
+    balancer = balancer or LoadBalancer([server.base_url for server in servers])
+    return OpenAICompatibleModel(model_name="stub", base_url=servers[0].base_url, retry_delay=0,
+                                 load_balancer=balancer, **kwargs)
+
+
+def test_round_robin_spreads_generate_stream_and_embed(replicas):
+    model = make_model(replicas, embedding_cache=EmbeddingCache())
+
+    answers = [model.get_response_content(model.generate(MESSAGES)) for _ in range(3)]
+    chunks = ["".join(model.generate_stream(MESSAGES)) for _ in range(3)]
+    for i in range(3):
+        model.embed([f"text {i}"])
+
+    assert answers == ["replica 0", "replica 1", "replica 2"]
+    assert chunks == ["replica 0", "replica 1", "replica 2"]
+    assert [server.requests for server in replicas] == [3, 3, 3]
+    stats = model.load_balancer.stats()
+    assert [s["requests"] for s in stats.values()] == [3, 3, 3]
+    assert all(s["in_flight"] == 0 and s["p50_latency"] is not None for s in stats.values())
+
+
+def test_async_calls_are_balanced(replicas):
+    model = make_model(replicas)
+
+    async def main():
+        answers = await asyncio.gather(*[model.generate_async(MESSAGES) for _ in range(6)])
+        streamed = [chunk async for chunk in model.generate_stream_async(MESSAGES)]
+        return answers, streamed
+
+    answers, streamed = asyncio.run(main())
+
+    assert sorted(model.get_response_content(a) for a in answers) == ["replica 0"] * 2 + ["replica 1"] * 2 + ["replica 2"] * 2
+    assert "".join(streamed) == "replica 0"
+
+
+def test_failing_endpoint_is_ejected_and_retried_elsewhere(replicas):
+    dead = StubLLMServer().start()
+    dead_url = dead.base_url
+    dead.stop()
+    balancer = LoadBalancer([dead_url, replicas[0].base_url], max_consecutive_errors=2)
+    model = make_model(replicas, balancer, retry_policy=RetryPolicy(max_attempts=3, initial_delay=0))
+
+    for _ in range(5):
+        assert model.get_response_content(model.generate(MESSAGES)) == "replica 0"
+
+    stats = balancer.stats()[balancer.endpoints[0].url]
+    assert stats["errors"] == 2 and stats["ejected"]
+    assert replicas[0].requests == 5
+
+
+def test_ejected_endpoint_comes_back_after_a_trial():
+    balancer = LoadBalancer(["http://a:8000", "http://b:8000"], max_consecutive_errors=2, ejection_time=0.05)
+    a = balancer.endpoints[0]
+    for _ in range(2):
+        a.in_flight += 1
+        balancer.release(a, error=RequestError("down", status_code=503))
+    assert a.is_ejected()
+    assert {balancer.acquire() for _ in range(4)} == {balancer.endpoints[1]}
+
+    time.sleep(0.06)
+    picked = [balancer.acquire() for _ in range(4)]
+    # A single trial request while it is on probation
+    assert picked.count(a) == 1 and a.probing
+    balancer.release(a, latency=0.01)
+    assert not a.probing and a.ejections == 0 and not a.is_ejected()
+
+
+def test_request_errors_do_not_eject():
+    balancer = LoadBalancer(["http://a:8000"], max_consecutive_errors=1)
+    endpoint = balancer.acquire()
+    balancer.release(endpoint, error=RequestError("bad request", status_code=400))
+
+    assert not endpoint.is_ejected() and endpoint.errors == 0
+
+
+def test_least_outstanding_and_latency_weighted_picks():
+    balancer = LoadBalancer(["http://a:8000", "http://b:8000", "http://c:8000"], strategy="least_outstanding")
+    held = [balancer.acquire() for _ in range(3)]
+    assert len(set(held)) == 3
+    balancer.release(held[1], latency=0.01)
+    assert balancer.acquire() is held[1]
+
+    balancer = LoadBalancer(["http://fast:8000", "http://slow:8000"], strategy="latency_weighted")
+    balancer._random.seed(0)
+    fast, slow = balancer.endpoints
+    fast.ewma_latency, slow.ewma_latency = 0.01, 0.1
+    picks = [balancer._pick(balancer.endpoints) for _ in range(1000)]
+    assert picks.count(fast) > 850
+
+
+def test_retry_after_ejects_only_the_replica(replicas):
+    replicas[0].failures = [(429, {"Retry-After": "30"})]
+    model = make_model(replicas[:2], retry_policy=RetryPolicy(max_attempts=2, initial_delay=0, max_delay=0))
+
+    assert model.get_response_content(model.generate(MESSAGES)) == "replica 1"
+    assert model.delay_next_api_call_until == 0
+    assert model.load_balancer.endpoints[0].is_ejected()
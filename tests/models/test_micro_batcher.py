@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from OpenHosta.core.cache import EmbeddingCache
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.metrics import Histogram
+from OpenHosta.core.micro_batcher import EmbeddingBatcher
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+
+def make_model(stub_server, batcher, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0,
+                                 embedding_cache=EmbeddingCache(), embedding_batcher=batcher, **kwargs)
+
+
+def test_threads_share_one_request(stub_server):
+    model = make_model(stub_server, EmbeddingBatcher(max_wait=0.2, max_batch_size=64))
+    reference = make_model(stub_server, None)
+    barrier = threading.Barrier(16)
+
+    def lookup(i):
+        barrier.wait()
+        return model.embed([f"key {i}"])[0]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        vectors = list(executor.map(lookup, range(16)))
+
+    assert stub_server.requests == 1
+    assert len(stub_server.bodies[0]["input"]) == 16
+    assert vectors == reference.embed([f"key {i}" for i in range(16)])
+
+
+def test_full_batches_are_sent_without_waiting(stub_server):
+    model = make_model(stub_server, EmbeddingBatcher(max_wait=5, max_batch_size=4))
+    barrier = threading.Barrier(8)
+
+    def lookup(i):
+        barrier.wait()
+        return model.embed([f"key {i}"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lookup, range(8)))
+
+    assert time.perf_counter() - start < 2
+    assert [len(body["input"]) for body in stub_server.bodies] == [4, 4]
+    assert model.embedding_batcher.batch_sizes.snapshot()["buckets"]["4"] == 2
+
+
+def test_coroutines_share_one_request(stub_server):
+    batcher = EmbeddingBatcher(max_wait=0.05, max_batch_size=64)
+    model = make_model(stub_server, batcher)
+
+    async def main():
+        return await asyncio.gather(*[model.embed_async([f"key {i}"]) for i in range(20)])
+
+    vectors = asyncio.run(main())
+
+    assert stub_server.requests == 1
+    assert len(vectors) == 20 and all(len(v) == 1 for v in vectors)
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["calls"] == 20 and stats["mean_batch_size"] == 20
+    assert stats["p50_latency"] >= 0.05
+    batcher.close()
+
+
+def test_large_calls_and_cache_hits_skip_the_batcher(stub_server):
+    model = make_model(stub_server, EmbeddingBatcher(max_wait=1, max_batch_size=4))
+
+    start = time.perf_counter()
+    model.embed([f"key {i}" for i in range(10)])
+    model.embed(["key 1"])
+
+    assert time.perf_counter() - start < 0.5
+    assert stub_server.requests == 1
+
+
+def test_errors_reach_every_caller(stub_server):
+    stub_server.failures = [400]
+    model = make_model(stub_server, EmbeddingBatcher(max_wait=0.1))
+    barrier = threading.Barrier(4)
+
+    def lookup(i):
+        barrier.wait()
+        with pytest.raises(RequestError):
+            model.embed([f"key {i}"])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lookup, range(4)))
+
+    assert stub_server.requests == 1
+
+
+def test_histogram():
+    histogram = Histogram([1, 2, 4])
+    for value in [0.5, 1, 1.5, 3, 10]:
+        histogram.observe(value)
+
+    assert histogram.snapshot()["buckets"] == {"1": 2, "2": 1, "4": 1, "+Inf": 1}
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(1) == 10
+    assert histogram.mean() == pytest.approx(3.2)
@@ -0,0 +1,114 @@
+import pytest
+
+from stub_server import StubLLMServer
+
+from OpenHosta import closure, emulate
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.model_router import ModelRouter, RoutingPolicy
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+@pytest.fixture
+def slow_and_fast():
+    servers = [StubLLMServer(reply="1", latency=0.1).start(), StubLLMServer(reply="2").start()]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def make_model(server, name):
+    return OpenAICompatibleModel(model_name=name, base_url=server.base_url, retry_delay=0)
+
+
+def test_lowest_latency_after_exploration(slow_and_fast):
+    slow, fast = slow_and_fast
+    router = ModelRouter(min_samples=2)
+    pipeline = OneTurnConversationPipeline(model_list=[make_model(slow, "slow"), make_model(fast, "fast")], router=router)
+
+    def pick(text: str) -> int:
+        """Pick a number."""
+        return emulate(pipeline=pipeline, force_llm_args={"routing_policy": "lowest_latency"})
+
+    answers = [pick("a") for _ in range(6)]
+
+    # Each model is measured before the fastest one is kept
+    assert answers[-2:] == [2, 2]
+    assert slow.requests == 2
+    assert "routing_policy" not in fast.bodies[-1]
+    stats = router.stats()
+    assert stats["slow"]["p50_latency"] > stats["fast"]["p50_latency"]
+    assert stats["fast"]["tokens_per_second"] > 0
+
+
+def test_policy_per_function_and_default_first(slow_and_fast):
+    slow, fast = slow_and_fast
+    router = ModelRouter(prices={"slow": (0.1, 0.1), "fast": (5.0, 15.0)})
+    pipeline = OneTurnConversationPipeline(model_list=[make_model(fast, "fast"), make_model(slow, "slow")], router=router)
+
+    def batch_job(text: str) -> int:
+        """Pick a number."""
+        return emulate(pipeline=pipeline)
+
+    def interactive(text: str) -> int:
+        """Pick a number."""
+        return emulate(pipeline=pipeline)
+
+    batch_job.force_llm_args = {"routing_policy": "lowest_cost"}
+
+    assert batch_job("a") == 1
+    assert interactive("a") == 2
+
+
+def test_latency_slo_keeps_the_cheapest_fast_enough_model(slow_and_fast):
+    slow, fast = slow_and_fast
+    cheap_slow, pricey_fast = make_model(slow, "slow"), make_model(fast, "fast")
+    router = ModelRouter(prices={"slow": (0.1, 0.1), "fast": (5.0, 15.0)}, min_samples=1)
+    for _ in range(3):
+        router.record(cheap_slow, 3.0, {"prompt_tokens": 10, "completion_tokens": 5})
+        router.record(pricey_fast, 0.5, {"prompt_tokens": 10, "completion_tokens": 5})
+
+    assert router.choose([pricey_fast, cheap_slow], "lowest_cost") is cheap_slow
+    assert router.choose([cheap_slow, pricey_fast], RoutingPolicy("cost", latency_slo=1.0)) is pricey_fast
+    assert router.choose([cheap_slow, pricey_fast], RoutingPolicy("cost", latency_slo=5.0)) is cheap_slow
+    # Nobody meets the SLO: the fastest
+    assert router.choose([cheap_slow, pricey_fast], RoutingPolicy("cost", latency_slo=0.1)) is pricey_fast
+    with pytest.raises(ValueError):
+        RoutingPolicy("cheapest")
+
+
+def test_failing_model_is_avoided(stub_server):
+    with StubLLMServer(reply="3") as backup_server:
+        primary, backup = make_model(stub_server, "primary"), make_model(backup_server, "backup")
+        router = ModelRouter(prices={"primary": (0.1, 0.1), "backup": (1.0, 1.0)}, default_policy="lowest_cost")
+        pipeline = OneTurnConversationPipeline(model_list=[primary, backup], router=router)
+
+        def pick(text: str) -> int:
+            """Pick a number."""
+            return emulate(pipeline=pipeline)
+
+        stub_server.failures = [400, 500]
+        for _ in range(2):
+            with pytest.raises(RequestError):
+                pick("a")
+
+        # The 400 is an error of the request, not of the provider
+        stats = router.stats()["primary"]
+        assert stats["calls"] == 1 and stats["error_rate"] == 1.0
+        assert pick("a") == 3
+        assert stub_server.requests == 2
+
+
+def test_call_options_are_not_sent(stub_server):
+    stub_server.reply = "4"
+    model = make_model(stub_server, "primary")
+    pipeline = OneTurnConversationPipeline(model_list=[model], router=ModelRouter())
+
+    pick = closure("Pick a number.", pipeline=pipeline, force_return_type=int,
+                   force_llm_args={"routing_policy": RoutingPolicy("cost", latency_slo=2.0)})
+    assert pick() == 4
+    model.generate([{"role": "user", "content": "Pick a number."}], routing_policy="lowest_latency", response_cache=False)
+
+    assert stub_server.requests == 2
+    for body in stub_server.bodies:
+        assert not {"routing_policy", "response_cache", "retry_policy"} & body.keys()
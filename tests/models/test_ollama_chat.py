@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from typing import Iterator
+
+import pytest
+
+from OpenHosta import ask_stream, emulate
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.ndjson import NDJSONDeltaDecoder
+from OpenHosta.models.OllamaCompatible import OllamaModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+MESSAGES = [
+    {"role": "system", "content": [{"type": "text", "text": "You are a function."}]},
+    {"role": "user", "content": [
+        {"type": "text", "text": "Describe it."},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+    ]},
+]
+
+
+def make_model(server, **kwargs):
+    return OllamaModel(model_name="stub", base_url=server.base_url.replace("/v1", ""), **kwargs)
+
+
+def test_decoder_handles_any_byte_boundaries():
+    lines = [{"message": {"role": "assistant", "content": d}, "done": False} for d in ["Hé", "", "\n😀"]]
+    lines.append({"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 3})
+    stream = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+
+    for size in (1, 5, len(stream)):
+        decoder = NDJSONDeltaDecoder("message")
+        received = []
+        for i in range(0, len(stream), size):
+            received += decoder.feed(stream[i:i + size])
+        assert received == ["Hé", "\n😀"]
+        assert decoder.done and decoder.final["eval_count"] == 3
+
+    with pytest.raises(RequestError, match="out of memory"):
+        NDJSONDeltaDecoder("response").feed(b'{"response":"a","done":false}\n{"error":"out of memory"}\n')
+
+
+def test_chat_endpoint_and_keep_alive(stub_server):
+    model = make_model(stub_server, keep_alive="30m", embedding_batch_size=2)
+
+    response = model.generate(MESSAGES)
+    model.embed(["a", "b", "c"])
+    model.preload()
+
+    body = stub_server.bodies[0]
+    assert body["messages"] == [
+        {"role": "system", "content": "You are a function."},
+        {"role": "user", "content": "Describe it.", "images": ["AAAA"]},
+    ]
+    assert body["stream"] is False and body["keep_alive"] == "30m"
+    assert model.get_response_content(response) == "42"
+    assert response["usage"] == {"total_tokens": 15, "prompt_tokens": 10, "completion_tokens": 5}
+    assert [body["keep_alive"] for body in stub_server.bodies[1:]] == ["30m", "30m", "30m"]
+    assert stub_server.bodies[-1] == {"model": "stub", "keep_alive": "30m", "messages": []}
+
+
+def test_generate_endpoint_without_chat_url(stub_server):
+    model = make_model(stub_server, chat_url=None)
+
+    assert model.get_response_content(model.generate(MESSAGES)) == "42"
+    assert "".join(model.generate_stream(MESSAGES)) == "42"
+    assert stub_server.bodies[0]["prompt"] == "You are a function.\nDescribe it."
+    assert stub_server.bodies[0]["images"] == ["AAAA"]
+
+
+def test_streaming_generators_and_ask_stream(stub_server):
+    stub_server.stream = ["```python\n", "1\n``", "`\n```py", "thon\n2\n```\n", "```python\n3\n"]
+    stub_server.events_per_write = 2
+    model = make_model(stub_server)
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    def numbers(count: int) -> Iterator[int]:
+        """Return `count` numbers."""
+        return emulate(pipeline=pipeline)
+
+    assert list(numbers(3)) == [1, 2, 3]
+    assert "".join(ask_stream("Count", model=model, interval_ms=0)) == "".join(stub_server.stream)
+    assert all(body["stream"] is True for body in stub_server.bodies)
+
+    async def collect():
+        return [delta async for delta in model.generate_stream_async(MESSAGES)]
+
+    assert model.supports_native_async()
+    assert "".join(asyncio.run(collect())) == "".join(stub_server.stream)
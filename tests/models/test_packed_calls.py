@@ -0,0 +1,97 @@
+import re
+
+from enum import Enum
+
+import pytest
+
+from OpenHosta.core.analizer import hosta_analyze
+from OpenHosta.core.inspection import Inspection
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+class Sentiment(Enum):
+    POSITIVE = "positive"
+    NEGATIVE = "negative"
+
+
+def classify(review: str) -> Sentiment:
+    """Return the sentiment of the review."""
+
+
+def is_short(review: str) -> bool:
+    """Tell whether the review is short."""
+
+
+def make_inspections(function, reviews):
+    inspections = []
+    for review in reviews:
+        analyse = hosta_analyze(function_pointer=function)
+        analyse.args[0].value = review
+        inspections.append(Inspection(function_pointer=function, frame=None, analyse=analyse))
+    return inspections
+
+
+def sentiment_of(review: str) -> str:
+    return "Sentiment.NEGATIVE" if "bad" in review else "Sentiment.POSITIVE"
+
+
+def packed_reply(body):
+    """Answer each listed call, in reverse order, or a single call."""
+    text = body["messages"][-1]["content"][0]["text"]
+    calls = re.findall(r"# Call (\d+)\nclassify\(review = '([^']*)'\)", text)
+    if not calls:
+        return "```python\n" + sentiment_of(re.search(r"review = '([^']*)'", text).group(1)) + "\n```"
+    blocks = [f"```python\n# {number}\n{'???' if 'broken' in review else sentiment_of(review)}\n```" for number, review in calls]
+    return "Here you are:\n" + "\n".join(reversed(blocks))
+
+
+def make_pipeline(server, **kwargs):
+    server.reply = packed_reply
+    model = OpenAICompatibleModel(model_name="stub", base_url=server.base_url, retry_delay=0, **kwargs)
+    return OneTurnConversationPipeline(model_list=[model])
+
+
+def test_calls_answered_by_packs(stub_server):
+    pipeline = make_pipeline(stub_server)
+    reviews = ["good", "bad", "very good", "bad again", "fine"]
+
+    results = pipeline.execute_packed(make_inspections(classify, reviews), max_pack_size=4)
+
+    assert results == [Sentiment.POSITIVE, Sentiment.NEGATIVE, Sentiment.POSITIVE, Sentiment.NEGATIVE, Sentiment.POSITIVE]
+    # A pack of 4 calls, the last one alone
+    assert stub_server.requests == 2
+    packed = stub_server.bodies[0]["messages"]
+    assert packed[0]["content"][0]["text"].startswith("You will act as a simulator")
+    assert "Answer each of the 4 calls" in packed[1]["content"][0]["text"]
+
+
+def test_failed_calls_go_to_smaller_packs(stub_server):
+    pipeline = make_pipeline(stub_server)
+    reviews = ["good", "broken", "bad", "good", "also broken", "bad"]
+
+    results = pipeline.execute_packed(make_inspections(classify, reviews))
+
+    assert results == [Sentiment.POSITIVE, Sentiment.POSITIVE, Sentiment.NEGATIVE,
+                       Sentiment.POSITIVE, Sentiment.POSITIVE, Sentiment.NEGATIVE]
+    # The 6 calls, the 2 broken ones in a pack, then each of them alone
+    assert stub_server.requests == 4
+    assert "Answer each of the 2 calls" in stub_server.bodies[1]["messages"][1]["content"][0]["text"]
+
+
+def test_pack_size_follows_the_context_window(stub_server):
+    pipeline = make_pipeline(stub_server)
+    model = pipeline.model_list[0]
+    calls_messages = [pipeline.push(inspection) for inspection in make_inspections(classify, ["good " * 100, "bad " * 100, "good", "bad"])]
+    model.context_window = len(calls_messages[0][0]["content"][0]["text"]) // 4 + 200
+
+    assert pipeline.split_packs(model, calls_messages, 32, 32, {}) == [[0], [1, 2], [3]]
+    assert pipeline.split_packs(model, calls_messages[2:], 32, 32, {}) == [[0, 1]]
+    assert pipeline.split_packs(model, calls_messages[2:], 32, 32, {"max_tokens": 32}) == [[0], [1]]
+
+
+def test_calls_of_different_functions_are_refused(stub_server):
+    pipeline = make_pipeline(stub_server)
+
+    with pytest.raises(ValueError, match="system prompt"):
+        pipeline.execute_packed(make_inspections(classify, ["good"]) + make_inspections(is_short, ["good"]))
@@ -0,0 +1,56 @@
+from enum import Enum
+from typing import Dict, List
+
+from OpenHosta import emulate, track_costs
+from OpenHosta.core.json_codec import get_json_codec
+from OpenHosta.models.AnthropicModel import AnthropicModel
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+def test_system_prefix_is_byte_stable(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    def score(text: str, colors: List[Color], weights: Dict[str, float]) -> int:
+        """Score the text."""
+        return emulate(pipeline=pipeline)
+
+    with track_costs() as tracker:
+        score("a", [Color.RED], {"x": 1.0})
+        score("b" * 500, [Color.BLUE, Color.RED], {})
+        score("c", [], {"y": 2.5})
+
+    codec = get_json_codec()
+    prefixes = {codec.dumps(body["messages"][0]) for body in stub_server.bodies}
+    assert len(prefixes) == 1
+    assert len({codec.dumps(body["messages"][1]) for body in stub_server.bodies}) == 3
+    assert tracker.cached_tokens == 16 and tracker.prompt_tokens == 30
+    assert "cached_tokens=16" in str(tracker)
+
+
+def test_anthropic_cache_control_on_system_prompt(stub_server):
+    model = AnthropicModel(model_name="stub", base_url=stub_server.base_url, api_key="key", retry_delay=0)
+    messages = [{"role": "system", "content": [{"type": "text", "text": "You are a function."}]},
+                {"role": "user", "content": [{"type": "text", "text": "translate('a')"}]}]
+
+    with track_costs() as tracker:
+        for _ in range(2):
+            tracker.add_usage(model.generate(messages)["usage"])
+
+    system = stub_server.bodies[0]["system"]
+    assert system == [{"type": "text", "text": "You are a function.", "cache_control": {"type": "ephemeral"}}]
+    assert stub_server.bodies[1]["system"] == system
+    # Cache written by the first call, read by the second one
+    assert tracker.cache_creation_tokens == 8 and tracker.cached_tokens == 8
+    assert tracker.prompt_tokens == 20
+    assert tracker.cached_token_ratio == 0.4
+
+    model.prompt_caching = False
+    model.generate(messages)
+    assert stub_server.bodies[-1]["system"] == "You are a function."
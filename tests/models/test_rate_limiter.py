@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from OpenHosta.core.rate_limiter import RateLimiter, TokenBucket
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+
+def test_token_bucket_returns_wait_time_once_empty():
+    bucket = TokenBucket(rate_per_second=10, capacity=2)
+
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.01)
+    # Reservations queue up behind each other
+    assert bucket.reserve(1) == pytest.approx(0.2, abs=0.01)
+
+
+def test_estimate_and_usage_correction():
+    limiter = RateLimiter(tokens_per_minute=60_000)
+    messages = [{"role": "user", "content": [{"type": "text", "text": "a" * 400}]}]
+
+    assert limiter.estimate_tokens(messages) == 100 + 1 + 256
+    assert limiter.estimate_tokens(messages, {"max_tokens": 10}) == 100 + 1 + 10
+    assert limiter.estimate_tokens(["a" * 40, "b" * 40]) == 20 + 1
+
+    limiter.acquire(900)
+    level = limiter.tokens_bucket.level
+    limiter.record_usage(900, {"total_tokens": 100})
+    assert limiter.tokens_bucket.level >= level + 800
+    assert limiter.stats()["actual_tokens"] == 100
+
+
+def test_threads_stay_under_server_quota(stub_server):
+    stub_server.requests_per_second_quota = 10
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0,
+                                  rate_limiter=RateLimiter(requests_per_minute=480, burst_seconds=0.25))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: model.generate([{"role": "user", "content": "hi"}]), range(12)))
+
+    assert stub_server.rejected == 0
+    stats = model.rate_limiter.stats()
+    assert stats["calls"] == 12
+    assert stats["delayed_calls"] > 0
+    assert stats["actual_tokens"] == 12 * 15
+
+
+@pytest.mark.asyncio
+async def test_async_calls_share_the_limiter(stub_server):
+    pytest.importorskip("httpx")
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                  rate_limiter=RateLimiter(requests_per_minute=600, burst_seconds=0.2))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[model.generate_async([{"role": "user", "content": "hi"}]) for _ in range(6)])
+    duration = time.perf_counter() - start
+
+    # 2 calls in the burst, then one every 0.1s
+    assert duration >= 0.35
+    assert model.rate_limiter.stats()["calls"] == 6
+    await model.aclose()
+
+
+def test_threads_and_coroutines_share_the_same_budget(stub_server):
+    pytest.importorskip("httpx")
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=0.2)
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, rate_limiter=limiter)
+
+    def thread_call(_):
+        model.generate([{"role": "user", "content": "thread"}])
+
+    async def coroutine_calls():
+        async def call():
+            await model.generate_async([{"role": "user", "content": "coroutine"}])
+        await asyncio.gather(*[call() for _ in range(5)])
+        await model.aclose()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        threads = executor.map(thread_call, range(5))
+        asyncio.run(coroutine_calls())
+        list(threads)
+
+    # 10 calls at 10 per second with a burst of 2: the last one waits ~0.8s, whoever sends it
+    assert time.perf_counter() - start >= 0.7
+    assert limiter.stats()["calls"] == 10
+    assert limiter.stats()["delayed_calls"] >= 7
+    bodies = [body["messages"][0]["content"] for body in stub_server.bodies]
+    assert bodies.count("thread") == 5 and bodies.count("coroutine") == 5
+
+
+def test_failed_attempts_give_their_tokens_back(stub_server):
+    from OpenHosta.core.retry_policy import RetryPolicy
+
+    stub_server.failures = [503, 503]
+    limiter = RateLimiter(tokens_per_minute=60_000)
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, rate_limiter=limiter,
+                                  retry_policy=RetryPolicy(initial_delay=0.01, max_delay=0.02))
+
+    model.generate([{"role": "user", "content": "hi"}])
+
+    # Only the successful attempt is charged, with its real usage (15 tokens).
+    # Refill can only raise the level, and ~270 estimated tokens per failed attempt were given back.
+    assert limiter.tokens_bucket.level >= limiter.tokens_bucket.capacity - 15 - 1
+
+
+def test_streamed_calls_are_corrected_at_the_end(stub_server):
+    stub_server.reply = "x" * 400
+    limiter = RateLimiter(tokens_per_minute=60_000)
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, rate_limiter=limiter)
+
+    assert len("".join(model.generate_stream([{"role": "user", "content": "hi"}]))) == 400
+
+    # Estimated with 256 completion tokens, corrected to 100 streamed tokens
+    assert limiter.stats()["actual_tokens"] == 1 + 100
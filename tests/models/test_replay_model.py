@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from typing import Iterator
+
+import pytest
+
+from OpenHosta import emulate
+from OpenHosta.core.cache import EmbeddingCache
+from OpenHosta.core.errors import ReplayMissError
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.models.ReplayModel import ReplayModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_model(server):
+    return OpenAICompatibleModel(model_name="stub", base_url=server.base_url, retry_delay=0,
+                                 embedding_cache=EmbeddingCache())
+
+
+def run_calls(pipeline):
+    def pick(text: str) -> int:
+        """Pick a number."""
+        return emulate(pipeline=pipeline)
+
+    def numbers(count: int) -> Iterator[int]:
+        """Return `count` numbers."""
+        return emulate(pipeline=pipeline)
+
+    return pick("a"), list(numbers(2))
+
+
+def test_record_then_replay_offline(stub_server, tmp_path):
+    cassette = str(tmp_path / "cassette.jsonl")
+    stub_server.stream = ["```python\n1\n```\n", "```python\n2\n```\n"]
+    recorder = ReplayModel(make_model(stub_server), cassette, mode="record")
+
+    recorded = run_calls(OneTurnConversationPipeline(model_list=[recorder]))
+    vectors = recorder.embed(["a", "b"])
+    requests = stub_server.requests
+
+    # Nothing listens there any more
+    offline = make_model(stub_server)
+    stub_server.stop()
+    player = ReplayModel(offline, cassette)
+    assert run_calls(OneTurnConversationPipeline(model_list=[player])) == recorded == (42, [1, 2])
+    assert player.embed(["b", "a"]) == vectors[::-1]
+    assert asyncio.run(player.embed_async(["a"])) == vectors[:1]
+    assert requests == 3
+
+
+def test_logprobs_and_repeated_requests(stub_server, tmp_path):
+    cassette = str(tmp_path / "cassette.jsonl")
+    answers = iter(["1", "2"])
+
+    def chat_response(body):
+        return {"choices": [{"message": {"content": next(answers)},
+                             "logprobs": {"content": [{"token": "1", "logprob": -0.1, "top_logprobs": []}]}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}}
+
+    stub_server.chat_response = chat_response
+    recorder = ReplayModel(make_model(stub_server), cassette, mode="record")
+    first, second = recorder.generate(MESSAGES), recorder.generate(MESSAGES)
+
+    player = ReplayModel(make_model(stub_server), cassette)
+    # Recordings of one request are served in turn
+    assert [player.generate(MESSAGES) for _ in range(3)] == [first, second, first]
+    assert player.generate(MESSAGES)["choices"][0]["logprobs"]["content"][0]["logprob"] == -0.1
+    with pytest.raises(ReplayMissError):
+        player.generate(MESSAGES, temperature=0.5)
+
+
+def test_auto_mode_and_simulated_throughput(stub_server, tmp_path):
+    cassette = str(tmp_path / "cassette.jsonl")
+    stub_server.stream = ["abcd" * 5] * 4
+    model = ReplayModel(make_model(stub_server), cassette, mode="auto", latency=0.05, tokens_per_second=400)
+
+    recorded = list(model.generate_stream(MESSAGES))
+    start = time.perf_counter()
+    assert list(model.generate_stream(MESSAGES)) == recorded
+    # 50 ms of latency, then 4 chunks of 5 tokens at 400 tokens per second
+    assert time.perf_counter() - start >= 0.05 + 0.04
+
+    async def collect():
+        return [chunk async for chunk in model.generate_stream_async(MESSAGES)]
+
+    assert asyncio.run(collect()) == recorded
+    assert stub_server.requests == 1
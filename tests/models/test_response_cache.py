@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import pytest
+
+from OpenHosta import emulate
+from OpenHosta.core.cache import CACHE_HIT_KEY, DiskCache, MemoryCache, ResponseCache
+from OpenHosta.core.cost_tracker import track_costs
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_model(stub_server, cache=None, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                 response_cache=cache or ResponseCache(), **kwargs)
+
+
+def test_hits_skip_the_network(stub_server):
+    model = make_model(stub_server, api_parameters={"temperature": 0})
+
+    first = model.generate(MESSAGES)
+    second = model.generate(MESSAGES)
+
+    assert stub_server.requests == 1
+    assert second["choices"] == first["choices"]
+    assert second[CACHE_HIT_KEY] is True and CACHE_HIT_KEY not in first
+    assert model.response_cache.stats() == {"hits": 1, "misses": 1, "skipped": 0}
+
+
+def test_only_deterministic_calls_are_cached(stub_server):
+    model = make_model(stub_server)
+
+    model.generate(MESSAGES)
+    model.generate(MESSAGES)
+    assert stub_server.requests == 2
+    assert model.response_cache.stats()["skipped"] == 2
+
+    model.generate(MESSAGES, seed=1)
+    model.generate(MESSAGES, seed=1)
+    model.generate(MESSAGES, seed=2)
+    assert stub_server.requests == 4
+
+    # Parameters and messages are part of the key
+    model.generate(MESSAGES, temperature=0)
+    model.generate([{"role": "user", "content": "hello"}], temperature=0)
+    assert stub_server.requests == 6
+
+
+def test_per_call_bypass_and_force(stub_server):
+    model = make_model(stub_server, api_parameters={"seed": 7})
+
+    model.generate(MESSAGES)
+    model.generate(MESSAGES, response_cache=False)
+    assert stub_server.requests == 2
+    assert "response_cache" not in stub_server.bodies[-1]
+
+    # Forced on a sampled call
+    model.api_parameters = {}
+    model.generate(MESSAGES, response_cache=True)
+    model.generate(MESSAGES, response_cache=True)
+    assert stub_server.requests == 3
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryCache(max_entries=2, ttl=0.1)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    time.sleep(0.15)
+    assert cache.get("a") is None
+
+
+def test_disk_cache_survives_the_model(stub_server, tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+
+    make_model(stub_server, ResponseCache(DiskCache(path))).generate(MESSAGES, temperature=0)
+    response = make_model(stub_server, ResponseCache(DiskCache(path))).generate(MESSAGES, temperature=0)
+
+    assert stub_server.requests == 1
+    assert response["choices"][0]["message"]["content"] == "42"
+
+    store = DiskCache(path, max_entries=1)
+    store.set("other", b"x")
+    assert len(store) == 1
+    store.close()
+
+
+def test_streams_are_replayed(stub_server):
+    model = make_model(stub_server, api_parameters={"temperature": 0})
+
+    # An interrupted stream is not stored
+    next(iter(model.generate_stream(MESSAGES)))
+    assert "".join(model.generate_stream(MESSAGES)) == "42"
+    assert "".join(model.generate_stream(MESSAGES)) == "42"
+
+    assert stub_server.requests == 2
+
+
+def test_async_calls_use_the_cache(stub_server):
+    pytest.importorskip("httpx")
+    model = make_model(stub_server, api_parameters={"temperature": 0})
+
+    async def main():
+        await model.generate_async(MESSAGES)
+        response = await model.generate_async(MESSAGES)
+        chunks = [chunk async for chunk in model.generate_stream_async(MESSAGES)]
+        chunks += [chunk async for chunk in model.generate_stream_async(MESSAGES)]
+        await model.aclose()
+        return response, chunks
+
+    response, chunks = asyncio.run(main())
+
+    assert response[CACHE_HIT_KEY] is True
+    assert "".join(chunks) == "4242"
+    assert stub_server.requests == 2
+
+
+def test_cached_answers_flow_through_pull(stub_server):
+    model = make_model(stub_server, api_parameters={"seed": 1})
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    def answer() -> int:
+        """Return the answer."""
+        return emulate(pipeline=pipeline)
+
+    with track_costs() as tracker:
+        assert answer() == 42
+        assert answer() == 42
+
+    assert stub_server.requests == 1
+    assert tracker.calls == 1 and tracker.cache_hits == 1
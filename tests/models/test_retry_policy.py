@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from OpenHosta.core.errors import RateLimitError, RequestError
+from OpenHosta.core.retry_policy import RetryPolicy, parse_duration, parse_retry_after
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+FAST = RetryPolicy(max_attempts=4, initial_delay=0.01, max_delay=0.05)
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_second_429_is_retried(stub_server):
+    stub_server.failures = [429, 429]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_policy=FAST)
+
+    response = model.generate(MESSAGES)
+
+    assert response["choices"][0]["message"]["content"] == "42"
+    assert stub_server.requests == 3
+
+
+def test_server_errors_are_retried_but_not_client_errors(stub_server):
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_policy=FAST)
+
+    stub_server.failures = [503, 500]
+    assert model.generate(MESSAGES)["choices"][0]["message"]["content"] == "42"
+    assert stub_server.requests == 3
+
+    stub_server.failures = [400]
+    with pytest.raises(RequestError) as error:
+        model.generate(MESSAGES)
+    assert error.value.status_code == 400
+    assert stub_server.requests == 4
+
+
+def test_connection_reset_is_retried(stub_server):
+    stub_server.failures = ["reset"]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_policy=FAST)
+
+    assert model.generate(MESSAGES)["choices"][0]["message"]["content"] == "42"
+    assert stub_server.requests == 2
+
+
+def test_streams_are_retried_before_the_first_chunk(stub_server):
+    stub_server.failures = [502]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_policy=FAST)
+
+    assert "".join(model.generate_stream(MESSAGES)) == "42"
+    assert stub_server.requests == 2
+
+
+def test_retry_delay_zero_disables_retries(stub_server):
+    stub_server.failures = [429]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+
+    with pytest.raises(RateLimitError):
+        model.generate(MESSAGES)
+    assert stub_server.requests == 1
+
+
+def test_per_call_policy_is_not_sent_to_the_api(stub_server):
+    stub_server.failures = [429, 429]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+
+    model.generate(MESSAGES, retry_policy=FAST)
+
+    assert stub_server.requests == 3
+    assert "retry_policy" not in stub_server.bodies[-1]
+
+
+def test_retry_after_is_honored_and_clamped(stub_server):
+    stub_server.failures = [(429, {"Retry-After": "0.2"}), (429, {"x-ratelimit-reset-tokens": "6m0s"})]
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                  retry_policy=RetryPolicy(initial_delay=0.01, max_delay=0.3))
+
+    start = time.perf_counter()
+    model.generate(MESSAGES)
+    duration = time.perf_counter() - start
+
+    # 0.2s requested, then 6 minutes clamped to max_delay
+    assert 0.5 <= duration < 1.5
+    assert stub_server.requests == 3
+
+
+def test_jitter_bounds():
+    policy = RetryPolicy(initial_delay=1, max_delay=10)
+    error = RequestError("boom", status_code=503)
+
+    delays = [policy.next_delay(error, 1, 0) for _ in range(200)]
+    assert all(1 <= d <= 3 for d in delays)
+    assert len(set(delays)) > 1
+
+    delays = [policy.next_delay(error, 2, 5) for _ in range(200)]
+    assert all(1 <= d <= 10 for d in delays)
+
+    limited = RateLimitError("slow down", status_code=429, retry_after=4)
+    delays = [policy.next_delay(limited, 1, 0) for _ in range(200)]
+    assert all(4 <= d <= 5 for d in delays)
+
+    assert policy.next_delay(error, 4, 1) is None
+    assert policy.next_delay(RequestError("bad", status_code=400), 1, 0) is None
+
+
+def test_rate_limit_headers_parsing():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1h2m3.5s") == pytest.approx(3723.5)
+    assert parse_duration("soon") is None
+
+    assert parse_retry_after({"Retry-After": "3"}) == 3
+    # Exceeded budget unknown: the earliest reset
+    assert parse_retry_after({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"}) == 1
+    assert parse_retry_after({
+        "x-ratelimit-reset-requests": "1s", "x-ratelimit-remaining-requests": "12",
+        "x-ratelimit-reset-tokens": "6m0s", "x-ratelimit-remaining-tokens": "0",
+    }) == 360
+    assert parse_retry_after({}) is None
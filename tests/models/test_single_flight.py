@@ -0,0 +1,93 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from OpenHosta.core.errors import RequestError
+from OpenHosta.core.single_flight import SingleFlight
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_model(stub_server, **kwargs):
+    return OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url,
+                                 single_flight=SingleFlight(), **kwargs)
+
+
+def test_identical_threaded_calls_are_coalesced(stub_server):
+    stub_server.latency = 0.2
+    model = make_model(stub_server)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: model.generate(MESSAGES), range(8)))
+
+    assert stub_server.requests == 1
+    assert all(r["choices"][0]["message"]["content"] == "42" for r in responses)
+    # Each caller gets its own copy
+    assert len({id(r) for r in responses}) == 8
+    assert model.single_flight.stats() == {"calls": 8, "coalesced": 7, "in_flight": 0}
+
+
+def test_different_calls_are_not_coalesced(stub_server):
+    stub_server.latency = 0.1
+    model = make_model(stub_server)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda i: model.generate(MESSAGES, seed=i % 2), range(4)))
+
+    assert stub_server.requests == 2
+
+
+def test_errors_are_shared(stub_server):
+    stub_server.latency = 0.2
+    stub_server.failures = [400]
+    model = make_model(stub_server)
+
+    def call(_):
+        with pytest.raises(RequestError):
+            model.generate(MESSAGES)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(call, range(4)))
+
+    assert stub_server.requests == 1
+    # Nothing is left in flight: the next call goes to the API
+    model.generate(MESSAGES)
+    assert stub_server.requests == 2
+
+
+def test_identical_coroutines_are_coalesced(stub_server):
+    pytest.importorskip("httpx")
+    stub_server.latency = 0.2
+    model = make_model(stub_server)
+
+    async def main():
+        responses = await asyncio.gather(*[model.generate_async(MESSAGES) for _ in range(8)])
+        await model.aclose()
+        return responses
+
+    responses = asyncio.run(main())
+
+    assert stub_server.requests == 1
+    assert len(responses) == 8
+    assert model.single_flight.stats()["coalesced"] == 7
+
+
+def test_threads_wait_for_a_coroutine_in_flight(stub_server):
+    pytest.importorskip("httpx")
+    stub_server.latency = 0.3
+    model = make_model(stub_server)
+
+    async def main():
+        leader = asyncio.ensure_future(model.generate_async(MESSAGES))
+        await asyncio.sleep(0.05)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            followers = [asyncio.wrap_future(executor.submit(model.generate, MESSAGES)) for _ in range(3)]
+            await asyncio.gather(leader, *followers)
+        await model.aclose()
+
+    asyncio.run(main())
+
+    assert stub_server.requests == 1
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from typing import Iterator
+
+from OpenHosta import emulate
+from OpenHosta.core.sse import SSEDeltaDecoder
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+from OpenHosta.pipelines.simple_pipeline import CodeBlockScanner
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def sse_event(delta: dict, **dumps_kwargs) -> bytes:
+    chunk = {"id": "c", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+    return b"data: " + json.dumps(chunk, **dumps_kwargs).encode("utf-8") + b"\n\n"
+
+
+def test_decoder_handles_any_byte_boundaries():
+    deltas = ["Hé", ' "quoted" \\ ', "line\nbreak", "", "😀 ok"]
+    stream = sse_event({"role": "assistant"}) + b"".join(
+        sse_event({"content": d}, ensure_ascii=False, separators=(",", ":")) for d in deltas[:2]) + b"".join(
+        sse_event({"content": d}) for d in deltas[2:]) + b": keep-alive\r\n" + b"data: [DONE]\n\n" + sse_event({"content": "after"})
+
+    for size in (1, 3, 7, len(stream)):
+        decoder = SSEDeltaDecoder()
+        received = []
+        for i in range(0, len(stream), size):
+            received += decoder.feed(stream[i:i + size])
+        assert received == [d for d in deltas if d]
+        assert decoder.done
+
+
+def test_decoder_falls_back_on_unusual_layouts():
+    decoder = SSEDeltaDecoder()
+    logprobs_first = b'data: {"choices":[{"logprobs":{"content":[{"token":"x"}]},"delta":{"content":"x"}}]}\n'
+    no_delta = b'data: {"choices":[{"text":"y"}]}\n'
+    null_content = b'data: {"choices":[{"delta":{"content":null,"tool_calls":[]}}]}\n'
+    assert decoder.feed(logprobs_first + no_delta + null_content + b"data: not json\n") == ["x"]
+
+
+def test_stream_of_items_through_the_server(stub_server):
+    stub_server.stream = ["```python\n", "1\n``", "`\n```py", "thon\n2\n```\n", "```python\n3\n"]
+    stub_server.events_per_write = 2
+    model = OpenAICompatibleModel(model_name="stub", base_url=stub_server.base_url, retry_delay=0)
+    pipeline = OneTurnConversationPipeline(model_list=[model])
+
+    def numbers(count: int) -> Iterator[int]:
+        """Return `count` numbers."""
+        return emulate(pipeline=pipeline)
+
+    assert list(numbers(3)) == [1, 2, 3]
+
+    async def collect():
+        return [delta async for delta in model.generate_stream_async(MESSAGES)]
+
+    assert "".join(asyncio.run(collect())) == "".join(stub_server.stream)
+
+
+def test_scanner_matches_whole_text_whatever_the_chunks():
+    text = "intro ```python\n1\n``` text ```python\n[2, 3]\n``````python\n4\n```tail ```python\n5"
+    for size in (1, 2, 5, len(text)):
+        scanner = CodeBlockScanner()
+        blocks = []
+        for i in range(0, len(text), size):
+            blocks += scanner.feed(text[i:i + size])
+        assert [b.strip() for b in blocks] == ["1", "[2, 3]", "4"]
+        assert scanner.flush().strip() == "5"
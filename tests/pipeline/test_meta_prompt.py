@@ -0,0 +1,32 @@
+from jinja2 import Template
+
+from OpenHosta.core.meta_prompt import EMULATE_META_PROMPT, MetaPrompt, collapse_blank_lines
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+
+
+def test_blank_lines_are_collapsed_by_the_template():
+    source = "{% if a %}A{% endif %}\n\n  \n{{ b }}\n\n\t\n\nend\n"
+
+    assert collapse_blank_lines("\n\nx\n \n\t\ny\n\n") == "\nx\n \ny\n"
+    assert MetaPrompt(source).render(a=False, b="B") == "\nB\n\nend"
+    assert MetaPrompt(source).template.render(a=True, b="\n\n") == "A\n\nend"
+    assert MetaPrompt(source, keep_trailing_newline=True).render(a=True, b="B") == "A\n\nB\n\nend\n"
+    # Other delimiters
+    assert MetaPrompt("<% if a %>A<% endif %>\n\n\nB", "<%", "%>").render(a=False) == "\nB"
+
+
+def test_templates_are_compiled_once():
+    model = OpenAICompatibleModel(model_name="stub", base_url="http://localhost:1/v1")
+    pipelines = [OneTurnConversationPipeline(model_list=[model]) for _ in range(3)]
+
+    assert all(p.emulate_meta_prompt.template is EMULATE_META_PROMPT.template for p in pipelines)
+    assert MetaPrompt("Hi {{ name }}").template is MetaPrompt("    Hi {{ name }}").template
+    assert MetaPrompt("Hi {{ name }}").template is not MetaPrompt("Hi {{ name }}", trim_blocks=True).template
+
+    # Copies are independent
+    prompt = pipelines[0].emulate_meta_prompt
+    prompt.source = "Bye {{ name }}"
+    assert prompt.render(name="you") == "Bye you" and prompt.variables == {"name"}
+    assert pipelines[1].emulate_meta_prompt.source == EMULATE_META_PROMPT.source
+    assert isinstance(EMULATE_META_PROMPT.template, Template)
@@ -0,0 +1,88 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from OpenHosta.core.analizer import hosta_analyze
+from OpenHosta.core.inspection import Inspection
+from OpenHosta.core.meta_prompt import MetaPrompt
+from OpenHosta.models.OpenAICompatible import OpenAICompatibleModel
+from OpenHosta.pipelines import OneTurnConversationPipeline
+from OpenHosta.pipelines import simple_pipeline
+
+
+class Item(BaseModel):
+    name: str
+    tags: List[str]
+
+
+def classify(text: str, hint: Optional[Item]) -> List[Item]:
+    """Classify the text."""
+
+
+def make_inspection(text: str) -> Inspection:
+    analyse = hosta_analyze(function_pointer=classify)
+    analyse.args[0].value = text
+    analyse.args[1].value = None
+    return Inspection(function_pointer=classify, frame=None, analyse=analyse)
+
+
+def make_pipeline() -> OneTurnConversationPipeline:
+    return OneTurnConversationPipeline(model_list=[OpenAICompatibleModel(model_name="stub", base_url="http://localhost:1/v1")])
+
+
+def texts(messages):
+    return [message["content"][0]["text"] for message in messages]
+
+
+def test_signature_encoded_once_and_system_rendered_once(monkeypatch):
+    calls = []
+    encode = simple_pipeline.encode_function_signature
+    monkeypatch.setattr(simple_pipeline, "encode_function_signature", lambda analyse: calls.append(1) or encode(analyse))
+    pipeline = make_pipeline()
+    renders = []
+    render = pipeline.emulate_meta_prompt.render
+    pipeline.emulate_meta_prompt.render = lambda data: renders.append(1) or render(data)
+
+    first = texts(pipeline.push(make_inspection("first")))
+    second = texts(pipeline.push(make_inspection("second")))
+
+    assert len(calls) == 1 and len(renders) == 1
+    assert first[0] == second[0] and "Item" in first[0]
+    assert "'first'" in first[1] and "'second'" in second[1]
+    # Same prompts as without any cache
+    fresh = make_pipeline()
+    fresh.prompt_cache_size = 0
+    assert texts(fresh.push(make_inspection("second"))) == second
+
+
+def test_cache_invalidation():
+    pipeline = make_pipeline()
+    system = texts(pipeline.push(make_inspection("a")))[0]
+
+    classify.force_template_data = {"chain_of_thought": "Step 1: read the text."}
+    try:
+        with_steps = texts(pipeline.push(make_inspection("a")))[0]
+    finally:
+        del classify.force_template_data
+    assert "Step 1: read the text." in with_steps
+    assert texts(pipeline.push(make_inspection("a")))[0] == system
+
+    pipeline.emulate_meta_prompt.source = "Emulate {{ function_name }}."
+    assert texts(pipeline.push(make_inspection("a")))[0] == "Emulate classify."
+    pipeline.emulate_meta_prompt = MetaPrompt("Act as {{ function_name }}.")
+    assert texts(pipeline.push(make_inspection("a")))[0] == "Act as classify."
+
+    # Templates reading the argument values are rendered on each call
+    pipeline.emulate_meta_prompt = MetaPrompt("{{ function_name }}({{ function_call_arguments }})")
+    assert texts(pipeline.push(make_inspection("b")))[0] == "classify(text = 'b', hint = None)"
+    assert texts(pipeline.push(make_inspection("c")))[0] == "classify(text = 'c', hint = None)"
+
+
+def test_streaming_prompt_is_cached_apart():
+    pipeline = make_pipeline()
+
+    streaming = texts(pipeline.push_streaming(make_inspection("a"), Item))[0]
+    plain = texts(pipeline.push(make_inspection("a")))[0]
+
+    assert "STREAMING MODE" in streaming and "STREAMING MODE" not in plain
+    assert texts(pipeline.push_streaming(make_inspection("b"), Item))[0] == streaming